@@ -0,0 +1,288 @@
+#
+# Several accounts, each with its own transactions, index and undo history. The accounts are spread over worker
+# processes (shards) by a hash of their name. Every command runs in the process that holds its account; queries over
+# all accounts are sent to every shard at once, each shard answers for its own accounts in parallel with the others,
+# and the partial answers are merged. There is no user interaction in this file.
+#
+import heapq
+import multiprocessing
+import zlib
+from functions import *
+from server import run_captured
+from storage import MUTATING_COMMANDS
+
+DEFAULT_ACCOUNT = 'main'
+
+
+def check_account(name):
+    '''
+    Checks if an account name is made of letters, digits, - and _, otherwise raises exception.
+    :param name: name to check
+    :return: -
+    '''
+    if name == '' or not name.replace('-', '').replace('_', '').isalnum():
+        raise ValueError('Account names should contain only letters, digits, - and _!')
+
+
+def create_account():
+    '''
+    Creates an empty account.
+    :return: dictionary with the transactions, history of changes and index of the account
+    '''
+    transactions = []
+    return {'transactions': transactions, 'history': [], 'index': create_index(transactions)}
+
+
+def get_account_balance(account):
+    '''
+    Gets the balance of an account after all its transactions.
+    :param account: account to use
+    :return: balance of the account
+    '''
+    return account['index']['months']['carried'] + fenwick_sum(account['index']['balances']['net'], DAYS)
+
+
+def find_largest_out(account, count):
+    '''
+    Finds the largest -out- transactions of an account, going down the transactions sorted by amount.
+    :param account: account to search
+    :param count: number of transactions to find
+    :return: list of at most count transactions, largest first
+    '''
+    return find_top(account['index'], count, 'out', True)
+
+
+def run_account_handler(account, handle, command, parameters):
+    '''
+    Runs the handler of a command on an account. If a command that modifies the account fails in a batch, the batch
+    is rolled back.
+    :param account: account to use
+    :param handle: function that handles the command
+    :param command: command to run
+    :param parameters: parameters of the command
+    :return: -
+    '''
+    try:
+        handle(account['transactions'], parameters, account['history'], account['index'])
+    except ValueError as ve:
+        if command not in MUTATING_COMMANDS or account['index']['batch'] is None:
+            raise
+        raise rollback_failed_batch(account['transactions'], account['history'], account['index'], ve)
+
+
+def answer_request(accounts, commands, request):
+    '''
+    Answers a request sent to a shard.
+    :param accounts: dictionary from name to account, for the accounts of the shard
+    :param commands: dictionary from command to the function that handles it
+    :param request: tuple whose first element is the kind of request and the others its parameters
+    :return: answer to the request
+    '''
+    kind = request[0]
+    if kind == 'command':
+        name, command, parameters = request[1:]
+        if command not in commands:
+            return 'error: Invalid command!\n'
+        if name not in accounts:
+            accounts[name] = create_account()
+        account = accounts[name]
+        return run_captured(lambda command, parameters: run_account_handler(account, commands[command], command,
+                                                                            parameters), command, parameters)
+    if kind == 'names':
+        return [(name, len(account['transactions'])) for name, account in accounts.items()]
+    if kind == 'balances':
+        balances = [0] * DAYS
+        found = False
+        for account in accounts.values():
+            if len(account['transactions']) > 0:
+                found = True
+                for day, balance in list_balances(account['transactions'], account['index']):
+                    balances[day - 1] += balance
+        return balances if found else None
+    if kind == 'below':
+        balances = [(name, get_account_balance(account)) for name, account in accounts.items()]
+        return [(name, balance) for name, balance in balances if balance < request[1]]
+    if kind == 'largest':
+        found = [(get_amount(transaction), name, transaction) for name, account in accounts.items()
+                 for transaction in find_largest_out(account, request[1])]
+        return heapq.nlargest(request[1], found, key=lambda candidate: candidate[0])
+
+
+def run_shard(connection, commands):
+    '''
+    Answers the requests sent to a shard until it is stopped.
+    :param connection: connection the requests are received from and the answers sent to
+    :param commands: dictionary from command to the function that handles it
+    :return: -
+    '''
+    accounts = {}
+    while True:
+        request = connection.recv()
+        if request[0] == 'stop':
+            break
+        connection.send(answer_request(accounts, commands, request))
+    connection.close()
+
+
+def start_shards(count, commands):
+    '''
+    Starts the worker processes that hold the accounts.
+    :param count: number of worker processes
+    :param commands: dictionary from command to the function that handles it, run by the workers
+    :return: dictionary that represents the accounts, with the shards and the account in use
+    '''
+    if count < 1:
+        raise ValueError('There should be at least one shard!')
+    shards = []
+    for i in range(count):
+        connection, worker_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=run_shard, args=(worker_connection, commands), daemon=True)
+        process.start()
+        worker_connection.close()
+        shards.append({'connection': connection, 'process': process})
+    return {'shards': shards, 'current': DEFAULT_ACCOUNT}
+
+
+def stop_shards(accounts):
+    '''
+    Stops the worker processes that hold the accounts.
+    :param accounts: accounts to stop
+    :return: -
+    '''
+    for shard in accounts['shards']:
+        shard['connection'].send(('stop',))
+    for shard in accounts['shards']:
+        shard['process'].join()
+        shard['connection'].close()
+
+
+def get_shard(accounts, name):
+    '''
+    Gets the shard that holds an account.
+    :param accounts: accounts to use
+    :param name: name of the account
+    :return: shard of the account
+    '''
+    return accounts['shards'][zlib.crc32(name.encode()) % len(accounts['shards'])]
+
+
+def ask_all(accounts, request):
+    '''
+    Sends a request to every shard before waiting for any answer, so that the shards work on it at the same time.
+    :param accounts: accounts to use
+    :param request: request to send
+    :return: list of the answers of the shards
+    '''
+    for shard in accounts['shards']:
+        shard['connection'].send(request)
+    return [shard['connection'].recv() for shard in accounts['shards']]
+
+
+def use_account(accounts, name):
+    '''
+    Makes an account the one the commands apply to. The account is created by its first command.
+    :param accounts: accounts to use
+    :param name: name of the account
+    :return: -
+    '''
+    check_account(name)
+    accounts['current'] = name
+
+
+def run_in_account(accounts, command, parameters):
+    '''
+    Runs a command on the account in use, in the process that holds it.
+    :param accounts: accounts to use
+    :param command: command to run
+    :param parameters: parameters of the command
+    :return: what the command printed
+    '''
+    shard = get_shard(accounts, accounts['current'])
+    shard['connection'].send(('command', accounts['current'], command, parameters))
+    answer = shard['connection'].recv()
+    if answer.startswith('error: '):
+        raise ValueError(answer[len('error: '):-1])
+    return answer[:-len('ok\n')]
+
+
+def list_accounts(accounts):
+    '''
+    Lists the accounts of all shards.
+    :param accounts: accounts to use
+    :return: list of (name, number of transactions) pairs, sorted by name
+    '''
+    return sorted(name for names in ask_all(accounts, ('names',)) for name in names)
+
+
+def get_total_balances(accounts):
+    '''
+    Adds up the balances of all accounts at the end of every day of the month.
+    :param accounts: accounts to use
+    :return: list of (day, balance) pairs for days 1 to DAYS
+    '''
+    partials = [balances for balances in ask_all(accounts, ('balances',)) if balances is not None]
+    if len(partials) == 0:
+        raise ValueError('There are no transactions!')
+    return [(day, sum(balances[day - 1] for balances in partials)) for day in range(1, DAYS + 1)]
+
+
+def get_accounts_below(accounts, amount):
+    '''
+    Finds the accounts whose balance is below an amount.
+    :param accounts: accounts to use
+    :param amount: amount to compare with
+    :return: list of (name, balance) pairs, sorted by name
+    '''
+    return sorted(found for below in ask_all(accounts, ('below', int(amount))) for found in below)
+
+
+def get_largest_out(accounts, count):
+    '''
+    Finds the largest -out- transactions of all accounts.
+    :param accounts: accounts to use
+    :param count: number of transactions to find
+    :return: list of at most count (name, transaction) pairs, largest first
+    '''
+    partials = ask_all(accounts, ('largest', int(count)))
+    largest = heapq.nlargest(int(count), (found for partial in partials for found in partial),
+                             key=lambda candidate: candidate[0])
+    return [(name, transaction) for amount, name, transaction in largest]
+
+
+def test_accounts():
+    accounts = start_shards(2, {'insert': handle_insert, 'undo': handle_undo, 'remove': handle_remove})
+    try:
+        run_in_account(accounts, 'insert', '5 100 in salary')
+        run_in_account(accounts, 'insert', '6 30 out pizza')
+        use_account(accounts, 'savings')
+        run_in_account(accounts, 'insert', '2 70 out rent')
+        run_in_account(accounts, 'insert', '3 40 out coffee')
+        run_in_account(accounts, 'undo', '')
+        use_account(accounts, 'other')
+        try:
+            run_in_account(accounts, 'undo', '')
+            assert False
+        except ValueError as ve:
+            assert str(ve) == 'Cannot undo anymore!'
+        try:
+            run_in_account(accounts, 'list', '')
+            assert False
+        except ValueError as ve:
+            assert str(ve) == 'Invalid command!'
+        assert list_accounts(accounts) == [('main', 2), ('other', 0), ('savings', 1)]
+        balances = get_total_balances(accounts)
+        assert len(balances) == DAYS and balances[-1] == (DAYS, 0)
+        assert balances[0] == (1, 0) and balances[1] == (2, -70) and balances[4] == (5, 30) and balances[5] == (6, 0)
+        assert get_accounts_below(accounts, 1) == [('other', 0), ('savings', -70)]
+        assert get_largest_out(accounts, 1) == [('savings', create_transaction(2, 70, 'out', 'rent'))]
+        try:
+            use_account(accounts, 'bad name')
+            assert False
+        except ValueError:
+            pass
+    finally:
+        stop_shards(accounts)
+
+
+def accounts_tests():
+    test_accounts()
@@ -0,0 +1,189 @@
+#
+# Analytics mode for large ledgers, built on NumPy arrays. The columns of the closed months (see freeze_month) are
+# read as arrays without being copied, so their month-end reports are computed by vectorized operations instead of
+# going through the transactions one at a time. The amounts and types of the open month are held as arrays, built
+# when they are first needed and kept in the index until the transactions change, so that filters remove the
+# transactions selected by a boolean mask. The open month's balances and totals are kept up to date by the index and
+# need no arrays. NumPy is optional: without it the analytics mode cannot be turned on and everything else works as
+# usual. The results are the same as those of the functions they replace. There is no user interaction in this file.
+#
+import random
+from array import array
+from functions import *
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def check_analytics():
+    '''
+    Checks if the analytics mode can be used, otherwise raises exception.
+    :return: -
+    '''
+    if numpy is None:
+        raise ValueError('The analytics mode needs NumPy, install it with: pip install numpy')
+
+
+def get_columns(transactions, index):
+    '''
+    Gets the amount and the type of the transactions as NumPy arrays in list order, building them if the
+    transactions changed since they were last built.
+    :param transactions: list of current transactions
+    :param index: index of the current transactions
+    :return: dictionary with the amounts and the types (True for -in-) as arrays, None if an amount does not fit in
+    64 bits
+    '''
+    if index['columns'] is None:
+        count = len(transactions)
+        try:
+            amounts = numpy.fromiter(map(get_amount, transactions), dtype=numpy.int64, count=count)
+        except OverflowError:
+            return None
+        index['columns'] = {'amounts': amounts,
+                            'types': numpy.fromiter((get_type(transaction) == 'in' for transaction in transactions),
+                                                    dtype=bool, count=count)}
+    return index['columns']
+
+
+def get_partition_columns(partition):
+    '''
+    Reads the amounts and the types of a closed month as NumPy arrays that share the memory of the partition. The
+    columns of archived months are strided views of the mapped archive, which NumPy reads in place as well.
+    :param partition: partition of the closed month
+    :return: dictionary with the amounts and the types (True for -in-) as arrays, None if the amounts did not fit in
+    64 bits when the month was closed
+    '''
+    if isinstance(partition['amounts'], memoryview):
+        return {'amounts': numpy.asarray(partition['amounts']), 'types': numpy.asarray(partition['types']).view(bool)}
+    if not isinstance(partition['amounts'], array):
+        return None
+    return {'amounts': numpy.frombuffer(partition['amounts'], dtype=numpy.int64),
+            'types': numpy.frombuffer(partition['types'], dtype=bool)}
+
+
+def get_vectorized_histogram(amounts, width):
+    '''
+    Counts amounts by ranges of equal width. When the ranges are few compared to the amounts they are counted
+    directly, otherwise the amounts are sorted.
+    :param amounts: array of amounts
+    :param width: width of the ranges, the k-th range going from k * width to (k + 1) * width - 1
+    :return: list of (lowest amount of the range, number of amounts) pairs, for the ranges that have any
+    '''
+    if len(amounts) == 0:
+        return []
+    ranges = amounts // width
+    first = int(amounts.min()) // width
+    if int(amounts.max()) // width - first <= len(ranges):
+        counts = numpy.bincount(ranges - first if first != 0 else ranges)
+        found = numpy.flatnonzero(counts)
+        return [((first + int(low)) * width, int(counts[low])) for low in found]
+    ranges, counts = numpy.unique(ranges, return_counts=True)
+    return [(int(low) * width, int(count)) for low, count in zip(ranges, counts)]
+
+
+def get_vectorized_closed_month_report(index, month, width):
+    '''
+    Gathers the month-end report of a closed month from the arrays of its partition (see get_closed_month_report).
+    :param index: index of the current transactions
+    :param month: closed month
+    :param width: width of the ranges of the histogram
+    :return: dictionary with the balances, the aggregate of all transactions and the histogram
+    '''
+    columns = get_partition_columns(get_closed_partition(index, month))
+    if columns is None:
+        return get_closed_month_report(index, month, width)
+    types = columns['types']
+    amounts = columns['amounts']
+    incoming = int(numpy.count_nonzero(types))
+    total = int((amounts * types).sum())
+    summary = {'counts': {'in': incoming, 'out': len(types) - incoming},
+               'totals': {'in': total, 'out': int(amounts.sum()) - total}}
+    return {'balances': get_closed_balances(index, month), 'summary': summary,
+            'histogram': get_vectorized_histogram(amounts, width)}
+
+
+def get_filter_mask(columns, type, amount):
+    '''
+    Computes which transactions a filter removes: those of the other type and, if there is an amount, those whose
+    amount is not smaller than it.
+    :param columns: arrays of the transactions
+    :param type: type to keep
+    :param amount: amount to take into account, None for none
+    :return: boolean array, True for the transactions to remove
+    '''
+    mask = columns['types'] != (type == 'in')
+    if amount is not None and int(amount) <= numpy.iinfo(numpy.int64).max:
+        mask |= columns['amounts'] >= int(amount)
+    return mask
+
+
+def vectorized_filter(transactions, type, amount, history, index):
+    '''
+    Filters the transactions with a boolean mask computed on the arrays (see filter_type and filter_type_and_amount).
+    :param transactions: list of current transactions
+    :param type: type to keep
+    :param amount: amount to take into account, None for none
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: -
+    '''
+    columns = get_columns(transactions, index)
+    if columns is None:
+        if amount is None:
+            filter_type(transactions, type, history, index)
+        else:
+            filter_type_and_amount(transactions, type, amount, history, index)
+        return
+    if not remove_selected(transactions, get_filter_mask(columns, type, amount).tolist(), history, index):
+        raise ValueError('The transactions are already filtered!')
+
+
+def handle_vectorized_filter(transactions, parameters, history, index):
+    '''
+    Handles the filter command in the analytics mode.
+    :param transactions: list of current transactions
+    :param parameters: parameters for filter command
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: -
+    '''
+    type, amount = parse_filter(parameters)
+    vectorized_filter(transactions, type, amount, history, index)
+
+
+def test_analytics():
+    if numpy is None:
+        return
+    generator = random.Random(1)
+    transactions = [create_transaction(generator.randint(1, 30), generator.randint(1, 1000),
+                                       generator.choice(TYPES), generator.choice(DESCRIPTIONS)) for i in range(2000)]
+    copy = [dict(transaction) for transaction in transactions]
+    history = []
+    index = create_index(transactions)
+    copy_history = []
+    copy_index = create_index(copy)
+    vectorized_filter(transactions, 'in', '600', history, index)
+    filter_type_and_amount(copy, 'in', '600', copy_history, copy_index)
+    assert transactions == copy
+    handle_undo(transactions, '', history, index)
+    handle_vectorized_filter(transactions, 'out', history, index)
+    handle_undo(copy, '', copy_history, copy_index)
+    filter_type(copy, 'out', copy_history, copy_index)
+    assert transactions == copy
+    try:
+        vectorized_filter(transactions, 'out', None, history, index)
+        assert False
+    except ValueError as ve:
+        assert str(ve) == 'The transactions are already filtered!'
+    handle_undo(transactions, '', history, index)
+    month = index['months']['open']
+    close_month(transactions, history, index)
+    for width in [1, 75, 10 ** 6]:
+        assert get_vectorized_closed_month_report(index, month, width) == get_closed_month_report(index, month, width)
+    assert get_vectorized_histogram(numpy.array([5, 10 ** 12], dtype=numpy.int64), 10) == [(0, 1), (10 ** 12, 1)]
+
+
+def analytics_tests():
+    test_analytics()
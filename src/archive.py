@@ -0,0 +1,282 @@
+#
+# Archives of closed months, kept in a binary file of fixed-width records that is read in place. Every transaction is
+# a record of RECORD.size bytes (amount, number of its description in the string table, day and type), the records are
+# sorted by month and day, a directory gives for every month its first record and the number of transactions and the
+# balance up to every day, and a string table at the end holds the descriptions. An opened archive is mapped into
+# memory and its months become partitions (see freeze_month) whose columns are memoryview slices that take each field
+# from the records where they are, so opening an archive only reads its directory and string table, whatever its size,
+# and queries only load the pages they read. There is no user interaction in this file.
+#
+import mmap
+import os
+import struct
+import tempfile
+from functions import *
+
+MAGIC = b'LEDGARC1'
+# Magic, number of records, number of months, offset of the string table.
+HEADER = struct.Struct('<8sQQQ')
+# Amount, number of the description, day, type (1 for -in-), padding to a multiple of 8 bytes.
+RECORD = struct.Struct('<qIBBxx')
+# Month, first record, then the number of transactions and the balance up to every day.
+MONTH = struct.Struct('<8sQ' + str(DAYS + 1) + 'q' + str(DAYS + 1) + 'q')
+LENGTH = struct.Struct('<I')
+
+
+def write_archive(path, index):
+    '''
+    Writes the closed months to an archive. The archive is written to a temporary file first, so a failure never
+    leaves a partial archive behind.
+    :param path: path of the archive
+    :param index: index of the current transactions, which holds the closed months
+    :return: number of archived transactions
+    '''
+    months = sorted(index['months']['closed'])
+    if len(months) == 0:
+        raise ValueError('There are no closed months to archive!')
+    partitions = [index['months']['closed'][month] for month in months]
+    strings = sorted(set(description for partition in partitions for description in partition['strings']))
+    numbers = {description: number for number, description in enumerate(strings)}
+    count = sum(len(partition['days']) for partition in partitions)
+    try:
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    except OSError as error:
+        raise ValueError('Cannot write file: ' + str(error))
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, 0, 0, 0))
+            for partition in partitions:
+                renumbered = [numbers[description] for description in partition['strings']]
+                file.writelines(RECORD.pack(amount, renumbered[number], day, type) for amount, number, day, type
+                                in zip(partition['amounts'], partition['descriptions'], partition['days'],
+                                       partition['types']))
+            first = 0
+            for month, partition in zip(months, partitions):
+                file.write(MONTH.pack(month.encode(), first, *partition['counts'], *partition['balances']))
+                first += len(partition['days'])
+            strings_offset = file.tell()
+            for description in strings:
+                encoded = description.encode()
+                file.write(LENGTH.pack(len(encoded)) + encoded)
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, count, len(months), strings_offset))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+    except (OSError, struct.error) as error:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        if isinstance(error, struct.error):
+            raise ValueError('Amounts and balances should fit in 64 bits to be archived!')
+        raise ValueError('Cannot write file: ' + str(error))
+    return count
+
+
+def read_directory(mapped):
+    '''
+    Reads the header, the directory and the string table of a mapped archive, checking that they fit in the file,
+    otherwise raises exception.
+    :param mapped: mapped archive
+    :return: (number of records, list of (month, first record, counts, balances) tuples, string table) tuple
+    '''
+    damaged = ValueError('The file is not an archive or it is damaged!')
+    try:
+        magic, count, months, strings_offset = HEADER.unpack_from(mapped, 0)
+        directory_offset = HEADER.size + count * RECORD.size
+        if magic != MAGIC or directory_offset + months * MONTH.size != strings_offset or strings_offset > len(mapped):
+            raise damaged
+        directory = []
+        for number in range(months):
+            fields = MONTH.unpack_from(mapped, directory_offset + number * MONTH.size)
+            counts = list(fields[2:DAYS + 3])
+            directory.append((fields[0].rstrip(b'\0').decode(), fields[1], counts, list(fields[DAYS + 3:])))
+            if fields[1] + counts[DAYS] > count:
+                raise damaged
+        strings = []
+        offset = strings_offset
+        while offset < len(mapped):
+            length, = LENGTH.unpack_from(mapped, offset)
+            strings.append(mapped[offset + LENGTH.size:offset + LENGTH.size + length].decode())
+            offset += LENGTH.size + length
+    except (struct.error, UnicodeDecodeError):
+        raise damaged
+    return count, directory, strings
+
+
+def map_partition(archive, first, count, counts, balances):
+    '''
+    Makes a partition of the records of a month, whose columns are memoryview slices that step over the records and
+    take one field from each.
+    :param archive: opened archive
+    :param first: first record of the month
+    :param count: number of records of the month
+    :param counts: number of transactions up to every day
+    :param balances: balance up to every day
+    :return: dictionary that represents the partition
+    '''
+    size = RECORD.size
+    end = first + count
+    records = archive['records']
+    return {'days': records[first * size + 12:end * size:size], 'types': records[first * size + 13:end * size:size],
+            'amounts': archive['words'][first * 2:end * 2:2],
+            'descriptions': archive['numbers'][first * 4 + 2:end * 4:4], 'strings': archive['strings'],
+            'balances': balances, 'counts': counts, 'archive': archive['path']}
+
+
+def open_archive(path):
+    '''
+    Opens an archive by mapping it into memory. Only its directory and string table are read.
+    :param path: path of the archive
+    :return: dictionary that represents the archive, with a partition for every month
+    '''
+    try:
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as error:
+        raise ValueError('Cannot open archive: ' + str(error))
+    try:
+        count, directory, strings = read_directory(mapped)
+    except ValueError:
+        mapped.close()
+        raise
+    records = memoryview(mapped)[HEADER.size:HEADER.size + count * RECORD.size]
+    archive = {'path': path, 'mapped': mapped, 'records': records, 'words': records.cast('q'),
+               'numbers': records.cast('I'), 'strings': strings, 'months': {}}
+    for month, first, counts, balances in directory:
+        archive['months'][month] = map_partition(archive, first, counts[DAYS], counts, balances)
+    return archive
+
+
+def attach_archive(index, archive, replace=False):
+    '''
+    Adds the months of an archive to the closed months, read-only. They must come before the open month. A month that
+    is also a closed month of the ledger must be the same month, archived from it. The ledger keeps its own copy of
+    such a month, unless replace is set: then the archived one replaces it, and the ledger no longer keeps it.
+    :param index: index of the current transactions
+    :param archive: opened archive
+    :param replace: True to replace the closed months of the ledger that the archive holds, False to keep them
+    :return: number of months held by both the ledger and the archive
+    '''
+    closed = index['months']['closed']
+    for month, partition in archive['months'].items():
+        if month >= index['months']['open']:
+            raise ValueError('The archived month ' + month + ' is not before the open month!')
+        if month in closed and (closed[month]['counts'] != partition['counts']
+                                or closed[month]['balances'] != partition['balances']):
+            raise ValueError('The month ' + month + ' of the archive differs from the one of the ledger!')
+    shared = 0
+    for month, partition in archive['months'].items():
+        if month in closed:
+            shared += 1
+            if not replace:
+                continue
+            index['months']['carried'] -= closed[month]['balances'][DAYS]
+        closed[month] = partition
+        index['months']['carried'] += partition['balances'][DAYS]
+    return shared
+
+
+def is_archived(partition):
+    '''
+    Checks if a partition is read from an archive, rather than kept with the ledger.
+    :param partition: partition of a closed month
+    :return: True if the partition is read from an archive, False otherwise
+    '''
+    return 'archive' in partition
+
+
+def close_archive(index, archive):
+    '''
+    Removes the months of an archive from the closed months and unmaps it.
+    :param index: index of the current transactions
+    :param archive: opened archive
+    :return: -
+    '''
+    for month, partition in archive['months'].items():
+        if index['months']['closed'].get(month) is partition:
+            del index['months']['closed'][month]
+            index['months']['carried'] -= partition['balances'][DAYS]
+        for column in ['days', 'types', 'amounts', 'descriptions']:
+            partition[column].release()
+    archive['months'] = {}
+    for view in ['numbers', 'words', 'records']:
+        archive[view].release()
+    archive['mapped'].close()
+
+
+def handle_archive(transactions, parameters, history, index):
+    '''
+    Handles the archive command.
+    :param transactions: list of current transactions
+    :param parameters: parameters for archive command
+    :param history: history of changes
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if parameters == '':
+        raise ValueError('Invalid number of parameters for archive command!')
+    write_archive(parameters, index)
+
+
+def test_archive():
+    transactions = [{'day': 3, 'amount': 10, 'type': 'out', 'description': 'pizza'},
+                    {'day': 3, 'amount': 200, 'type': 'in', 'description': 'salary'},
+                    {'day': 5, 'amount': 40, 'type': 'out', 'description': 'coffee'},
+                    {'day': 1, 'amount': 70, 'type': 'in', 'description': 'pizza'}]
+    history = []
+    index = create_index(transactions)
+    index['months']['open'] = '2026-01'
+    close_month(transactions, history, index)
+    insert_to_day(transactions, '4', '5', 'out', 'soda', history, index)
+    close_month(transactions, history, index)
+    descriptor, path = tempfile.mkstemp(suffix='.archive')
+    os.close(descriptor)
+    try:
+        assert write_archive(path, index) == 5
+        expected = {'list': list(list_between_dates(transactions, ('2026-01', 1), ('2026-02', 30), index)),
+                    'balance': list_balance_date(transactions, '2026-01', 4, index),
+                    'report': get_closed_month_report(index, '2026-01', 50)}
+        later = create_index([])
+        later['months']['open'] = '2026-02'
+        archive = open_archive(path)
+        try:
+            attach_archive(later, archive)
+            assert False
+        except ValueError as ve:
+            assert str(ve) == 'The archived month 2026-02 is not before the open month!'
+        later['months']['open'] = '2026-03'
+        assert attach_archive(later, archive) == 0
+        assert list(list_between_dates([], ('2026-01', 1), ('2026-02', 30), later)) == expected['list']
+        assert list_balance_date([], '2026-01', 4, later) == expected['balance']
+        assert get_closed_month_report(later, '2026-01', 50) == expected['report']
+        assert list_balances([{}], later)[0] == (1, 215)
+        assert list(list_between_dates([], ('2026-01', 1), ('2026-01', 30), later, 'out', '>', '20')) == \
+            [('2026-01', create_transaction(5, 40, 'out', 'coffee'))]
+        assert count_between_dates([], ('2026-01', 1), ('2026-02', 30), later, 'in') == 2
+        close_archive(later, archive)
+        assert later['months']['closed'] == {} and later['months']['carried'] == 0
+        archive = open_archive(path)
+        assert attach_archive(index, archive) == 2
+        assert not is_archived(index['months']['closed']['2026-01']) and index['months']['carried'] == 215
+        close_archive(index, archive)
+        assert len(index['months']['closed']) == 2 and index['months']['carried'] == 215
+        archive = open_archive(path)
+        assert attach_archive(index, archive, True) == 2
+        assert is_archived(index['months']['closed']['2026-01']) and is_archived(index['months']['closed']['2026-02'])
+        assert list(list_between_dates([], ('2026-01', 1), ('2026-02', 30), index)) == expected['list']
+        assert index['months']['carried'] == 215
+        close_archive(index, archive)
+        assert index['months']['closed'] == {}
+        with open(path, 'r+b') as file:
+            file.write(b'damaged!')
+        try:
+            open_archive(path)
+            assert False
+        except ValueError as ve:
+            assert str(ve) == 'The file is not an archive or it is damaged!'
+    finally:
+        os.remove(path)
+
+
+def archive_tests():
+    test_archive()
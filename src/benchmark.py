@@ -0,0 +1,294 @@
+#
+# Benchmarks for every command of the program. Ledgers of configurable size are generated from a seed, every command
+# path is timed on them and the results are written as JSON, so that runs can be compared to catch regressions.
+# Run it with: python benchmark.py --sizes 1000 100000 --output results.json [--baseline previous.json]. Batches are
+# also timed on a ledger of a million transactions (see --batch-size).
+#
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from analytics import *
+from archive import *
+from functions import *
+from query import *
+
+DISTRIBUTIONS = ['uniform', 'zipf']
+
+
+def get_weights(count, distribution):
+    '''
+    Gets the weights used to choose between a number of values.
+    :param count: number of values
+    :param distribution: -uniform- (all values equally likely) or -zipf- (the k-th value has weight 1 / k)
+    :return: list of weights
+    '''
+    if distribution == 'uniform':
+        return [1] * count
+    return [1 / k for k in range(1, count + 1)]
+
+
+def generate_transactions(count, seed, day_distribution='uniform', description_distribution='uniform', in_ratio=0.5,
+                          descriptions=DESCRIPTIONS, max_amount=1000):
+    '''
+    Generates a reproducible list of random transactions.
+    :param count: number of transactions to generate
+    :param seed: seed of the random generator
+    :param day_distribution: distribution of the days (see get_weights)
+    :param description_distribution: distribution of the descriptions (see get_weights)
+    :param in_ratio: fraction of -in- transactions
+    :param descriptions: descriptions to choose from
+    :param max_amount: largest amount generated
+    :return: list of transactions generated
+    '''
+    generator = random.Random(seed)
+    days = generator.choices(range(1, 31), get_weights(30, day_distribution), k=count)
+    chosen = generator.choices(descriptions, get_weights(len(descriptions), description_distribution), k=count)
+    transactions = []
+    for i in range(count):
+        type = 'in' if generator.random() < in_ratio else 'out'
+        transactions.append(create_transaction(days[i], generator.randint(1, max_amount), type, chosen[i]))
+    return transactions
+
+
+def measure(results, size, command, function, operations=1):
+    '''
+    Times a command and adds the result to a list of results.
+    :param results: list of results to add to
+    :param size: number of transactions of the ledger
+    :param command: name of the command
+    :param function: function without parameters that runs the command the given number of times
+    :param operations: number of times the function runs the command
+    :return: -
+    '''
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    results.append({'command': command, 'size': size, 'operations': operations, 'seconds': seconds,
+                    'seconds_per_operation': seconds / operations})
+
+
+def consume(transactions):
+    '''
+    Goes through all listed transactions, formatting each one as the list command does.
+    :param transactions: iterable of transactions
+    :return: number of transactions
+    '''
+    count = 0
+    for transaction in transactions:
+        to_string(transaction)
+        count += 1
+    return count
+
+
+def consume_dated(found):
+    '''
+    Goes through all transactions listed between two dates, formatting each one as the list command does.
+    :param found: iterable of (month, transaction) pairs
+    :return: number of transactions
+    '''
+    count = 0
+    for month, transaction in found:
+        to_date_string(month, transaction)
+        count += 1
+    return count
+
+
+def benchmark_ledger(transactions, operations):
+    '''
+    Times every command path on a ledger. Commands that modify the ledger are undone after being timed, so every
+    command runs on the same transactions.
+    :param transactions: list of transactions to run the commands on
+    :param operations: number of times the cheap commands (add, insert, replace, undo) are repeated
+    :return: list of results
+    '''
+    results = []
+    size = len(transactions)
+    history = []
+    index = create_index(transactions)
+    measure(results, size, 'index', lambda: create_index(transactions))
+    day, type, description = get_key(transactions[0])
+
+    def repeat(parameters, handle):
+        return lambda: [handle(transactions, parameters, history, index) for i in range(operations)]
+
+    measure(results, size, 'add', repeat('100 out pizza', handle_add), operations)
+    measure(results, size, 'undo add', repeat('', handle_undo), operations)
+    measure(results, size, 'insert', repeat('5 100 in salary', handle_insert), operations)
+    measure(results, size, 'undo insert', repeat('', handle_undo), operations)
+    replace = str(day) + ' ' + type + ' ' + description + ' with 7'
+    measure(results, size, 'replace', repeat(replace, handle_replace), operations)
+    measure(results, size, 'undo replace', repeat('', handle_undo), operations)
+    measure(results, size, 'replace all', repeat('all ' + replace, handle_replace), operations)
+    measure(results, size, 'undo replace all', repeat('', handle_undo), operations)
+    for command, parameters, handle in [('remove day', '15', handle_remove), ('remove range', '5 to 10', handle_remove),
+                                        ('remove type', 'in', handle_remove), ('filter type', 'in', handle_filter),
+                                        ('filter type amount', 'in 500', handle_filter)]:
+        measure(results, size, command, lambda: handle(transactions, parameters, history, index))
+        measure(results, size, 'undo ' + command, lambda: handle_undo(transactions, '', history, index))
+    measure(results, size, 'list', lambda: consume(list_all(transactions)))
+    measure(results, size, 'list type', lambda: consume(list_type(transactions, 'in', index)))
+    measure(results, size, 'list count type', lambda: count_type(transactions, 'in', index))
+    for condition, amount in [('<', 500), ('=', get_amount(transactions[0])), ('>', 500)]:
+        measure(results, size, 'list ' + condition,
+                lambda: consume(list_condition_amount(transactions, condition, amount, index)))
+    measure(results, size, 'list range', lambda: consume(list_between_amounts(transactions, 250, 750, index)))
+    measure(results, size, 'list count range', lambda: count_between_amounts(transactions, 250, 750, index))
+    measure(results, size, 'search', lambda: [consume(search_transactions(index, 'izz', False))
+                                              for i in range(operations)], operations)
+    measure(results, size, 'search prefix type amount',
+            lambda: [consume(search_transactions(index, 'gro', True, 'out', '>', 500)) for i in range(operations)],
+            operations)
+    measure(results, size, 'search count', lambda: [count_search(transactions, 'a', False, index)
+                                                    for i in range(operations)], operations)
+    measure(results, size, 'list balance', lambda: [list_balance_day(transactions, 15, index)
+                                                    for i in range(operations)], operations)
+    measure(results, size, 'query', lambda: consume(list_query(transactions, ['type=in', 'amount>900', 'day=5..10'],
+                                                               index)))
+    measure(results, size, 'query count', lambda: count_query(transactions, ['desc~piz*', 'type=out'], index))
+    measure(results, size, 'top', lambda: [list_top(transactions, 10, 'out', True, index) for i in range(operations)],
+            operations)
+    measure(results, size, 'top descriptions', lambda: list_top_descriptions(transactions, 10, True, index))
+    measure(results, size, 'summary', lambda: [get_summary(transactions, index) for i in range(operations)],
+            operations)
+    measure(results, size, 'summary by description', lambda: get_summary_by_description(transactions, index))
+    measure(results, size, 'list balances', lambda: list_balances(transactions, index))
+    measure(results, size, 'report', lambda: get_month_report(transactions, 100, index))
+    closed = [dict(transaction) for transaction in transactions]
+    closed_index = create_index(closed)
+    month = closed_index['months']['open']
+    close_month(closed, [], closed_index)
+    measure(results, size, 'report closed month', lambda: get_closed_month_report(closed_index, month, 100))
+    if numpy is not None:
+        measure(results, size, 'vectorized report closed month',
+                lambda: get_vectorized_closed_month_report(closed_index, month, 100))
+    dates = ((month, 1), (month, DAYS))
+    measure(results, size, 'list closed month >',
+            lambda: consume_dated(list_between_dates([], *dates, closed_index, None, '>', 900)))
+    descriptor, path = tempfile.mkstemp(suffix='.archive')
+    os.close(descriptor)
+    try:
+        measure(results, size, 'write archive', lambda: write_archive(path, closed_index))
+        archive_index = create_index([])
+        archive_index['months']['open'] = get_next_month(month)
+        opened = []
+        measure(results, size, 'open archive', lambda: opened.append(open_archive(path)))
+        archive = opened[0]
+        attach_archive(archive_index, archive)
+        measure(results, size, 'list archived month >',
+                lambda: consume_dated(list_between_dates([], *dates, archive_index, None, '>', 900)))
+        measure(results, size, 'list archived month balance',
+                lambda: [list_balance_date([], month, 15, archive_index) for i in range(operations)], operations)
+        if numpy is not None:
+            measure(results, size, 'vectorized report archived month',
+                    lambda: get_vectorized_closed_month_report(archive_index, month, 100))
+        close_archive(archive_index, archive)
+    finally:
+        os.remove(path)
+    if numpy is not None:
+        measure(results, size, 'vectorized columns', lambda: get_columns(transactions, index))
+        measure(results, size, 'vectorized filter type amount',
+                lambda: vectorized_filter(transactions, 'in', 500, history, index))
+        measure(results, size, 'undo vectorized filter type amount',
+                lambda: handle_undo(transactions, '', history, index))
+    results.extend(benchmark_batch(transactions, history, index, operations))
+    undo_chain = min(operations, size)
+    for i in range(undo_chain):
+        handle_insert(transactions, '1 1 in chain', history, index)
+    measure(results, size, 'undo chain', repeat('', handle_undo), undo_chain)
+    return results
+
+
+def benchmark_batch(transactions, history, index, operations):
+    '''
+    Times a batch of inserts and its undo, which bring the list sorted by amount up to date once each.
+    :param transactions: list of transactions to run the commands on
+    :param history: history of changes
+    :param index: index of the transactions
+    :param operations: number of inserts in the batch
+    :return: list of results
+    '''
+    results = []
+    size = len(transactions)
+
+    def run_batch():
+        handle_begin(transactions, '', history, index)
+        for i in range(operations):
+            handle_insert(transactions, '5 100 in salary', history, index)
+        handle_commit(transactions, '', history, index)
+
+    measure(results, size, 'batch insert', run_batch, operations)
+    measure(results, size, 'undo batch', lambda: handle_undo(transactions, '', history, index))
+    return results
+
+
+def compare_results(results, baseline, tolerance):
+    '''
+    Compares results with the results of a previous run.
+    :param results: list of results
+    :param baseline: list of results of the previous run
+    :param tolerance: largest accepted ratio between the new and the old time of a command
+    :return: list of (command, size, ratio) for the commands that became slower than the tolerance allows
+    '''
+    previous = {(result['command'], result['size']): result['seconds_per_operation'] for result in baseline}
+    regressions = []
+    for result in results:
+        key = (result['command'], result['size'])
+        if key in previous and previous[key] > 0:
+            ratio = result['seconds_per_operation'] / previous[key]
+            if ratio > tolerance:
+                regressions.append((result['command'], result['size'], ratio))
+    return regressions
+
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description='Benchmark every command on generated ledgers.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='ledger sizes')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the generated ledgers')
+    parser.add_argument('--days', choices=DISTRIBUTIONS, default='uniform', help='distribution of the days')
+    parser.add_argument('--descriptions', choices=DISTRIBUTIONS, default='uniform',
+                        help='distribution of the descriptions')
+    parser.add_argument('--in-ratio', type=float, default=0.5, help='fraction of in transactions')
+    parser.add_argument('--operations', type=int, default=1000, help='repetitions of the cheap commands')
+    parser.add_argument('--batch-size', type=int, default=1000000,
+                        help='also time batches on a ledger of this size, 0 to skip')
+    parser.add_argument('--output', help='write the results to this file instead of the standard output')
+    parser.add_argument('--baseline', help='compare the results with the results of a previous run')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='accepted slowdown against the baseline')
+    return parser.parse_args(arguments)
+
+
+def main(arguments):
+    arguments = parse_arguments(arguments)
+    results = []
+    for size in arguments.sizes:
+        transactions = generate_transactions(size, arguments.seed, arguments.days, arguments.descriptions,
+                                             arguments.in_ratio)
+        results.extend(benchmark_ledger(transactions, arguments.operations))
+    if arguments.batch_size > 0 and arguments.batch_size not in arguments.sizes:
+        transactions = generate_transactions(arguments.batch_size, arguments.seed, arguments.days,
+                                             arguments.descriptions, arguments.in_ratio)
+        results.extend(benchmark_batch(transactions, [], create_index(transactions), arguments.operations))
+    report = {'python': platform.python_version(), 'seed': arguments.seed, 'days': arguments.days,
+              'descriptions': arguments.descriptions, 'in_ratio': arguments.in_ratio, 'results': results}
+    if arguments.output is None:
+        print(json.dumps(report, indent=1))
+    else:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=1)
+    if arguments.baseline is not None:
+        with open(arguments.baseline, 'r') as file:
+            regressions = compare_results(results, json.load(file)['results'], arguments.tolerance)
+        for command, size, ratio in regressions:
+            print(command + ' (' + str(size) + ' transactions) is ' + str(round(ratio, 2)) + ' times slower',
+                  file=sys.stderr)
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -2,389 +2,1997 @@
 # The program's functions are implemented here. There is no user interaction in this file, therefore no input/print statements. Functions here
 # communicate via function parameters, the return statement and raising of exceptions. 
 #
-import copy
+import heapq
+import itertools
+import operator
 import random
+import sys
+from array import array
+from bisect import bisect_left, bisect_right, insort
 from datetime import date
+from journal import close_journal, create_journal, is_spilled, load_spilled, update_journal
 
+# Days typed in are checked to be between 1 and 30, but transactions added to the current day can also fall on day 31,
+# so days read back from files or used in queries are checked against DAYS.
+DAYS = 31
+TYPES = ['in', 'out']
+DESCRIPTIONS = ['pizza', 'salary', 'coffee', 'jeans', 'ticket', 'groceries', 'gift', 'bills', 'shirt', 'shoes', 'soda',
+                'water', 'bread', 'internet', 'candle']
+# Longest pieces of the descriptions kept in the search index.
+GRAM = 3
 
-def check_day(day):
+
+def check_day(day, last=30):
     '''
-    Checks if day is an integer between 1 and 30, otherwise raises exception.
+    Checks if day is an integer between 1 and a last day, otherwise raises exception.
     :param day: day to check
+    :param last: last day accepted
+    :return: -
+    '''
+    if not str(day).isnumeric():
+        raise ValueError('Day should be of type integer!')
+    if int(day) < 1 or int(day) > last:
+        raise ValueError('Day should be between 1 and ' + str(last) + '!')
+
+
+def check_amount(amount):
+    '''
+    Checks if amount is a positive integer, otherwise raises exception.
+    :param amount: amount to check
+    :return: -
+    '''
+    if not str(amount).isnumeric():
+        raise ValueError('Amount should be of type integer!')
+    if int(amount) < 0:
+        raise ValueError('Amount should be positive!')
+
+
+def check_type(type):
+    '''
+    Checks if type is -in- or -out-, otherwise raises exception.
+    :param type:
+    :return:
+    '''
+    if type != 'in' and type != 'out':
+        raise ValueError('Type should be in or out!')
+
+
+def create_transaction(day, amount, type, description):
+    '''
+    Creates a new transaction. Day and amount are stored as integers, so they are parsed only once, and type and
+    description are interned, so transactions with the same type or description share a single string.
+    :param day: day to use
+    :param amount: amount to use
+    :param type: type to use
+    :param description: description to use
+    :return: dictionary that represents a transaction
+    '''
+    return {'day': int(day), 'amount': int(amount), 'type': sys.intern(type), 'description': sys.intern(description)}
+
+
+def get_day(transaction):
+    return transaction['day']
+
+
+def get_amount(transaction):
+    return transaction['amount']
+
+
+def get_type(transaction):
+    return transaction['type']
+
+
+def get_description(transaction):
+    return transaction['description']
+
+
+def set_day(transaction, day):
+    transaction['day'] = int(day)
+
+
+def set_amount(transaction, amount):
+    transaction['amount'] = int(amount)
+
+
+def set_type(transaction, type):
+    transaction['type'] = sys.intern(type)
+
+
+def set_description(transaction, description):
+    transaction['description'] = sys.intern(description)
+
+
+def to_string(transaction):
+    '''
+    Transforms a transaction to a string form.
+    :param transaction: transaction to convert
+    :return: string formed by transaction
+    '''
+    return 'day: %d   amount: %d   type: %s   description: %s' % (get_day(transaction), get_amount(transaction),
+                                                                 get_type(transaction), get_description(transaction))
+
+
+def to_date_string(month, transaction):
+    '''
+    Transforms a transaction to a string form that shows its full date.
+    :param month: month of the transaction
+    :param transaction: transaction to convert
+    :return: string formed by transaction
+    '''
+    return 'date: %s-%02d   amount: %d   type: %s   description: %s' % (month, get_day(transaction),
+                                                                       get_amount(transaction), get_type(transaction),
+                                                                       get_description(transaction))
+
+
+def startup_transactions():
+    '''
+    Generates 10 random transactions for program startup.
+    :return: list of transactions generated
+    '''
+    transactions = []
+    for i in range(0, 10):
+        day = random.randint(1, 30)
+        amount = random.randint(1, 100)
+        type = random.choice(TYPES)
+        description = random.choice(DESCRIPTIONS)
+        transaction = create_transaction(day, amount, type, description)
+        transactions.append(transaction)
+    return transactions
+
+
+def split_text(text):
+    '''
+    Splits text into command (first word) and parameters (rest of words).
+    :param text: text to split
+    :return: command and parameters
+    '''
+    words = text.strip().split(' ', 1)
+    command = words[0].strip()
+    if len(words) == 1:
+        parameters = ''
+    else:
+        parameters = words[1].strip()
+    return command, parameters
+
+
+def create_buckets():
+    '''
+    Creates the buckets of transactions by day, by (day, type, description) key and by description. Each bucket keeps
+    its transactions in list order, so commands only look at the transactions they need.
+    :return: dictionary with the buckets by day, by key and by description
+    '''
+    return {'days': {}, 'keys': {}, 'descriptions': {}}
+
+
+def create_balances():
+    '''
+    Creates the Fenwick trees over the days of the net amount and of the number of transactions, so balances and counts
+    up to a day are computed without a scan.
+    :return: dictionary with the trees of the net amounts and of the counts
+    '''
+    return {'net': [0] * (DAYS + 1), 'counts': [0] * (DAYS + 1)}
+
+
+def create_amounts():
+    '''
+    Creates the list of transactions sorted by amount, for binary searches on amounts, and room for the changes to it
+    that a batch defers (see defer_amounts).
+    :return: dictionary with the sorted list and the deferred changes
+    '''
+    return {'sorted': [], 'deferred': None}
+
+
+def create_summary():
+    '''
+    Creates the aggregates of all transactions, of every day and of every description (see get_summary).
+    :return: dictionary with the aggregates
+    '''
+    return {'all': create_aggregate(), 'days': [create_aggregate() for day in range(DAYS + 1)], 'descriptions': {}}
+
+
+def create_months():
+    '''
+    Creates the months of the ledger: the open month, which the transactions belong to, the partitions of the closed
+    months (see close_month) and the balance they carry into the open month.
+    :return: dictionary with the open month, the closed months and the carried balance
+    '''
+    return {'open': get_current_month(), 'closed': {}, 'carried': 0}
+
+
+def create_index(transactions):
+    '''
+    Creates the index of a list of transactions: buckets, balances, amounts, summary and months (see their create
+    functions), the pieces of up to GRAM characters of the descriptions (see find_descriptions), the start of the open
+    batch (see begin_batch), the columns of the analytics mode, dropped whenever the transactions change, and the
+    number of transactions visited by the listing, search and filter commands (see scan_transactions).
+    :param transactions: list of transactions to index
+    :return: dictionary that represents the index
+    '''
+    index = {'buckets': create_buckets(), 'balances': create_balances(), 'amounts': create_amounts(),
+             'summary': create_summary(), 'months': create_months(), 'grams': {}, 'batch': None, 'columns': None,
+             'scanned': 0}
+    index_add_all(index, transactions)
+    return index
+
+
+def fenwick_add(tree, day, value):
+    '''
+    Adds a value to a day in a Fenwick tree.
+    :param tree: Fenwick tree to update
+    :param day: day to add to
+    :param value: value to add
+    :return: -
+    '''
+    while day < len(tree):
+        tree[day] += value
+        day += day & -day
+
+
+def fenwick_sum(tree, day):
+    '''
+    Computes the sum of the values of all days up to and including a day in a Fenwick tree.
+    :param tree: Fenwick tree to query
+    :param day: last day of the sum
+    :return: calculated sum
+    '''
+    total = 0
+    day = min(day, len(tree) - 1)
+    while day > 0:
+        total += tree[day]
+        day -= day & -day
+    return total
+
+
+def create_aggregate():
+    '''
+    Creates the number and the total amount of a group of transactions, for each type, with no transactions yet.
+    :return: dictionary with the counts and the totals by type
+    '''
+    return {'counts': {'in': 0, 'out': 0}, 'totals': {'in': 0, 'out': 0}}
+
+
+def get_aggregate_count(aggregate, type=None):
+    '''
+    Gets the number of transactions of a group.
+    :param aggregate: aggregate of the group
+    :param type: type to count, None for both types
+    :return: number of transactions
+    '''
+    if type is None:
+        return aggregate['counts']['in'] + aggregate['counts']['out']
+    return aggregate['counts'][type]
+
+
+def get_aggregate_total(aggregate, type):
+    return aggregate['totals'][type]
+
+
+def get_aggregate_net(aggregate):
+    return aggregate['totals']['in'] - aggregate['totals']['out']
+
+
+def aggregate_add(aggregate, transaction, sign):
+    '''
+    Adds (sign 1) or subtracts (sign -1) a transaction to the count and the total of its type in an aggregate.
+    :param aggregate: aggregate to update
+    :param transaction: transaction to use
+    :param sign: 1 or -1
+    :return: -
+    '''
+    aggregate_add_group(aggregate, get_type(transaction), sign, sign * get_amount(transaction))
+
+
+def aggregate_add_group(aggregate, type, count, total):
+    '''
+    Adds the number and the total amount of a group of transactions of one type to an aggregate.
+    :param aggregate: aggregate to update
+    :param type: type of the transactions
+    :param count: number of transactions, negative to subtract them
+    :param total: total amount of the transactions, negative to subtract them
+    :return: -
+    '''
+    aggregate['counts'][type] += count
+    aggregate['totals'][type] += total
+
+
+def get_signed_amount(transaction):
+    '''
+    Gets the amount of a transaction as it affects the balance: positive for -in-, negative for -out-.
+    :param transaction: transaction to use
+    :return: signed amount
+    '''
+    if get_type(transaction) == 'in':
+        return get_amount(transaction)
+    return -get_amount(transaction)
+
+
+def update_balances(index, transaction, sign):
+    '''
+    Adds (sign 1) or subtracts (sign -1) a transaction to the balances, counts and aggregates kept by the index. Every
+    change of the transactions goes through here, so the aggregates are kept up to date at a constant cost per
+    transaction changed.
+    :param index: index of the current transactions
+    :param transaction: transaction to use
+    :param sign: 1 or -1
+    :return: -
+    '''
+    fenwick_add(index['balances']['net'], get_day(transaction), sign * get_signed_amount(transaction))
+    fenwick_add(index['balances']['counts'], get_day(transaction), sign)
+    index['columns'] = None
+    summary = index['summary']
+    aggregate_add(summary['all'], transaction, sign)
+    aggregate_add(summary['days'][get_day(transaction)], transaction, sign)
+    descriptions = summary['descriptions']
+    description = get_description(transaction)
+    if description not in descriptions:
+        descriptions[description] = create_aggregate()
+    aggregate_add(descriptions[description], transaction, sign)
+    if get_aggregate_count(descriptions[description]) == 0:
+        del descriptions[description]
+
+
+def update_balances_all(index, groups, sign):
+    '''
+    Adds (sign 1) or subtracts (sign -1) groups of transactions to the balances, counts and aggregates kept by the
+    index (see update_balances). All transactions of a group have the same day, type and description, so the Fenwick
+    trees and the aggregates are updated once per group rather than once per transaction.
+    :param index: index of the current transactions
+    :param groups: dictionary from (day, type, description) key to the transactions having it
+    :param sign: 1 or -1
+    :return: -
+    '''
+    index['columns'] = None
+    summary = index['summary']
+    descriptions = summary['descriptions']
+    for (day, type, description), group in groups.items():
+        count = sign * len(group)
+        total = sign * sum(map(get_amount, group))
+        fenwick_add(index['balances']['net'], day, total if type == 'in' else -total)
+        fenwick_add(index['balances']['counts'], day, count)
+        aggregate_add_group(summary['all'], type, count, total)
+        aggregate_add_group(summary['days'][day], type, count, total)
+        if description not in descriptions:
+            descriptions[description] = create_aggregate()
+        aggregate_add_group(descriptions[description], type, count, total)
+        if get_aggregate_count(descriptions[description]) == 0:
+            del descriptions[description]
+
+
+def group_transactions(transactions, get_group_key):
+    '''
+    Groups transactions by a key, in a single pass.
+    :param transactions: transactions to group
+    :param get_group_key: function that receives a transaction and returns the key of its group
+    :return: dictionary from key to the list of the transactions having it, in list order
+    '''
+    groups = {}
+    for transaction in transactions:
+        key = get_group_key(transaction)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = [transaction]
+        else:
+            group.append(transaction)
+    return groups
+
+
+def get_key(transaction):
+    '''
+    Gets the key under which a transaction is found by the replace command.
+    :param transaction: transaction to use
+    :return: (day, type, description) tuple
+    '''
+    return get_day(transaction), get_type(transaction), get_description(transaction)
+
+
+def get_day_bucket(index, day):
+    '''
+    Gets the transactions of a day from the index.
+    :param index: index of the current transactions
+    :param day: day to search for
+    :return: dictionary of the transactions of that day, in list order
+    '''
+    return index['buckets']['days'].get(day, {})
+
+
+def get_key_bucket(index, day, type, description):
+    '''
+    Gets the transactions having a certain day, type and description from the index.
+    :param index: index of the current transactions
+    :param day: day to search for
+    :param type: type to search for
+    :param description: description to search for
+    :return: dictionary of the transactions found, in list order
+    '''
+    return index['buckets']['keys'].get((int(day), type, description), {})
+
+
+def bucket_add(buckets, key, transaction):
+    '''
+    Adds a transaction at the end of a bucket.
+    :param buckets: dictionary of buckets
+    :param key: key of the bucket
+    :param transaction: transaction to add
+    :return: -
+    '''
+    buckets.setdefault(key, {})[id(transaction)] = transaction
+
+
+def bucket_add_all(buckets, groups):
+    '''
+    Adds groups of transactions at the end of their buckets.
+    :param buckets: dictionary of buckets
+    :param groups: dictionary from key to the transactions to add to its bucket, in list order
+    :return: -
+    '''
+    for key, group in groups.items():
+        buckets.setdefault(key, {}).update(zip(map(id, group), group))
+
+
+def bucket_remove(buckets, key, transaction):
+    '''
+    Removes a transaction from a bucket, dropping the bucket once it is empty.
+    :param buckets: dictionary of buckets
+    :param key: key of the bucket
+    :param transaction: transaction to remove
+    :return: -
+    '''
+    bucket = buckets[key]
+    del bucket[id(transaction)]
+    if len(bucket) == 0:
+        del buckets[key]
+
+
+def bucket_restore(buckets, get_bucket_key, transactions, restored):
+    '''
+    Adds back to buckets transactions that were put back in the list by undo. Buckets that still hold other
+    transactions are rebuilt from the list, so that they stay in list order.
+    :param buckets: dictionary of buckets
+    :param get_bucket_key: function that receives a transaction and returns the key of its bucket
+    :param transactions: list of current transactions, already containing the restored transactions
+    :param restored: restored transactions, in list order
+    :return: -
+    '''
+    rebuilt = set()
+    for transaction in restored:
+        if get_bucket_key(transaction) in buckets:
+            rebuilt.add(get_bucket_key(transaction))
+    for transaction in restored:
+        if get_bucket_key(transaction) not in rebuilt:
+            bucket_add(buckets, get_bucket_key(transaction), transaction)
+    if len(rebuilt) > 0:
+        for key in rebuilt:
+            buckets[key] = {}
+        for transaction in transactions:
+            if get_bucket_key(transaction) in rebuilt:
+                bucket_add(buckets, get_bucket_key(transaction), transaction)
+
+
+def get_grams(description):
+    '''
+    Gets the pieces of a description that lead to it in the search index.
+    :param description: description to split
+    :return: set of the pieces of 1 to GRAM consecutive characters of the description
+    '''
+    return set(description[start:start + length] for length in range(1, GRAM + 1)
+               for start in range(len(description) - length + 1))
+
+
+def description_add(index, transaction):
+    '''
+    Adds a transaction to the bucket of its description. The first transaction of a description adds the description
+    to the search index.
+    :param index: index of the current transactions
+    :param transaction: transaction to add
+    :return: -
+    '''
+    description = get_description(transaction)
+    if description not in index['buckets']['descriptions']:
+        for gram in get_grams(description):
+            index['grams'].setdefault(gram, set()).add(description)
+    bucket_add(index['buckets']['descriptions'], description, transaction)
+
+
+def description_add_all(index, groups):
+    '''
+    Adds groups of transactions to the buckets of their descriptions (see description_add).
+    :param index: index of the current transactions
+    :param groups: dictionary from description to the transactions to add, in list order
+    :return: -
+    '''
+    for description in groups:
+        if description not in index['buckets']['descriptions']:
+            for gram in get_grams(description):
+                index['grams'].setdefault(gram, set()).add(description)
+    bucket_add_all(index['buckets']['descriptions'], groups)
+
+
+def description_remove(index, transaction):
+    '''
+    Removes a transaction from the bucket of its description. The last transaction of a description removes the
+    description from the search index.
+    :param index: index of the current transactions
+    :param transaction: transaction to remove
+    :return: -
+    '''
+    description = get_description(transaction)
+    bucket_remove(index['buckets']['descriptions'], description, transaction)
+    if description not in index['buckets']['descriptions']:
+        for gram in get_grams(description):
+            descriptions = index['grams'][gram]
+            descriptions.discard(description)
+            if len(descriptions) == 0:
+                del index['grams'][gram]
+
+
+def description_restore(index, transactions, restored):
+    '''
+    Adds back to the buckets by description and to the search index transactions that were put back in the list by
+    undo.
+    :param index: index of the current transactions
+    :param transactions: list of current transactions, already containing the restored transactions
+    :param restored: restored transactions, in list order
+    :return: -
+    '''
+    added = set(get_description(transaction) for transaction in restored) - index['buckets']['descriptions'].keys()
+    bucket_restore(index['buckets']['descriptions'], get_description, transactions, restored)
+    for description in added:
+        for gram in get_grams(description):
+            index['grams'].setdefault(gram, set()).add(description)
+
+
+def find_amount_position(index, transaction):
+    '''
+    Finds the position of a transaction in the list of transactions sorted by amount.
+    :param index: index of the current transactions
+    :param transaction: transaction to search for
+    :return: position of the transaction
+    '''
+    amounts = index['amounts']['sorted']
+    return find_in_amounts(amounts, transaction, *get_equal_amounts(amounts, get_amount(transaction)))
+
+
+def get_equal_amounts(amounts, amount):
+    '''
+    Finds the transactions of an amount in a list of transactions sorted by amount with a binary search.
+    :param amounts: list of transactions sorted by amount
+    :param amount: amount to search for
+    :return: start and end (exclusive) positions of the transactions found
+    '''
+    start = bisect_left(amounts, amount, key=get_amount)
+    return start, bisect_right(amounts, amount, lo=start, key=get_amount)
+
+
+def find_in_amounts(amounts, transaction, start, end):
+    '''
+    Finds the position of a transaction among the transactions of equal amount, comparing identities only.
+    :param amounts: list of transactions sorted by amount
+    :param transaction: transaction to search for
+    :param start: first position of the transactions of its amount
+    :param end: position after the last one
+    :return: position of the transaction
+    '''
+    return start + list(map(operator.is_, amounts[start:end], itertools.repeat(transaction))).index(True)
+
+
+def remove_amounts(amounts, removed):
+    '''
+    Takes transactions out of a list of transactions sorted by amount. The transactions of each amount taken out are
+    found with a binary search and gone through once, and the list is copied once around the positions found. When
+    so many transactions are taken out that the searches would cost more than that, the whole list is gone through
+    once by itertools.compress instead.
+    :param amounts: list of transactions sorted by amount
+    :param removed: transactions to take out
+    :return: list of the other transactions, still sorted by amount
+    '''
+    if len(removed) * len(amounts).bit_length() > len(amounts):
+        ids = set(map(id, removed))
+        return list(itertools.compress(amounts, map(operator.not_, map(ids.__contains__, map(id, amounts)))))
+    groups = {}
+    for transaction in removed:
+        groups.setdefault(get_amount(transaction), []).append(transaction)
+    positions = []
+    for amount, found in groups.items():
+        start, end = get_equal_amounts(amounts, amount)
+        if len(found) <= 2:
+            positions.extend(find_in_amounts(amounts, transaction, start, end) for transaction in found)
+        else:
+            ids = set(map(id, found))
+            positions.extend(itertools.compress(range(start, end), map(ids.__contains__, map(id, amounts[start:end]))))
+    positions.sort()
+    kept = []
+    start = 0
+    for position in positions:
+        kept += amounts[start:position]
+        start = position + 1
+    kept += amounts[start:]
+    return kept
+
+
+def merge_amounts(amounts, added):
+    '''
+    Merges transactions into a list of transactions sorted by amount, each one after those of equal amount, as insort
+    does. Only the places of the added transactions are searched for, and the list is copied once.
+    :param amounts: list of transactions sorted by amount
+    :param added: transactions to merge, in any order
+    :return: merged list
+    '''
+    merged = []
+    start = 0
+    for transaction in sorted(added, key=get_amount):
+        end = bisect_right(amounts, get_amount(transaction), lo=start, key=get_amount)
+        merged += amounts[start:end]
+        merged.append(transaction)
+        start = end
+    merged += amounts[start:]
+    return merged
+
+
+def defer_amounts(index):
+    '''
+    Starts deferring the changes to the list of transactions sorted by amount, so that many changes cost a single
+    removal and merge instead of one insertion or deletion in the middle of the list each.
+    :param index: index of the current transactions
     :return: -
     '''
-    if not str(day).isnumeric():
-        raise ValueError('Day should be of type integer!')
-    if int(day) < 1 or int(day) > 30:
-        raise ValueError('Day should be between 1 and 30!')
+    index['amounts']['deferred'] = {'added': {}, 'removed': {}}
+
+
+def defer_remove(deferred, transaction):
+    '''
+    Records that a transaction has to leave the list sorted by amount. A transaction added since the changes are
+    deferred is not in the list, so it is only forgotten.
+    :param deferred: changes deferred
+    :param transaction: transaction to remove
+    :return: -
+    '''
+    if deferred['added'].pop(id(transaction), None) is None or id(transaction) in deferred['removed']:
+        deferred['removed'][id(transaction)] = transaction
+
+
+def defer_move(deferred, transaction):
+    '''
+    Records that a transaction whose amount changes has to move in the list sorted by amount.
+    :param deferred: changes deferred
+    :param transaction: transaction to move
+    :return: -
+    '''
+    if id(transaction) not in deferred['added']:
+        deferred['removed'][id(transaction)] = transaction
+        deferred['added'][id(transaction)] = transaction
+
+
+def get_sorted_amounts(index):
+    '''
+    Gets the list of transactions sorted by amount, first applying the changes that were deferred, if any: the
+    removed transactions are taken out at once and the added ones merged in at once (see remove_amounts and
+    merge_amounts), so only the deferred transactions are sorted. The deferred changes keep the transactions they
+    refer to, so their ids cannot be reused meanwhile.
+    :param index: index of the current transactions
+    :return: list of the transactions sorted by amount
+    '''
+    deferred = index['amounts']['deferred']
+    if deferred is not None and (len(deferred['added']) > 0 or len(deferred['removed']) > 0):
+        if len(deferred['removed']) > 0:
+            index['amounts']['sorted'] = remove_amounts(index['amounts']['sorted'], list(deferred['removed'].values()))
+        if len(deferred['added']) > 0:
+            index['amounts']['sorted'] = merge_amounts(index['amounts']['sorted'], list(deferred['added'].values()))
+        deferred['added'] = {}
+        deferred['removed'] = {}
+    return index['amounts']['sorted']
+
+
+def stop_deferring_amounts(index):
+    '''
+    Applies the deferred changes to the list of transactions sorted by amount and stops deferring them.
+    :param index: index of the current transactions
+    :return: -
+    '''
+    get_sorted_amounts(index)
+    index['amounts']['deferred'] = None
+
+
+def index_add(index, transaction):
+    '''
+    Adds a transaction to the index. The transaction must be the last one in the list.
+    :param index: index of the current transactions
+    :param transaction: transaction to add
+    :return: -
+    '''
+    bucket_add(index['buckets']['days'], get_day(transaction), transaction)
+    bucket_add(index['buckets']['keys'], get_key(transaction), transaction)
+    description_add(index, transaction)
+    update_balances(index, transaction, 1)
+    if index['amounts']['deferred'] is not None:
+        index['amounts']['deferred']['added'][id(transaction)] = transaction
+    else:
+        insort(index['amounts']['sorted'], transaction, key=get_amount)
+
+
+def index_add_all(index, added):
+    '''
+    Adds several transactions to the index, sorting the transactions by amount only once. The transactions are
+    grouped first, so buckets are filled a group at a time and the balances and aggregates are updated once per
+    group. The transactions must be the last ones in the list.
+    :param index: index of the current transactions
+    :param added: transactions to add, in list order
+    :return: -
+    '''
+    groups = group_transactions(added, get_key)
+    bucket_add_all(index['buckets']['days'], group_transactions(added, get_day))
+    bucket_add_all(index['buckets']['keys'], groups)
+    description_add_all(index, group_transactions(added, get_description))
+    update_balances_all(index, groups, 1)
+    if index['amounts']['deferred'] is not None:
+        index['amounts']['deferred']['added'].update((id(transaction), transaction) for transaction in added)
+    else:
+        index['amounts']['sorted'].extend(added)
+        index['amounts']['sorted'].sort(key=get_amount)
+
+
+def index_remove(index, transaction):
+    '''
+    Removes a transaction from the index.
+    :param index: index of the current transactions
+    :param transaction: transaction to remove
+    :return: -
+    '''
+    bucket_remove(index['buckets']['days'], get_day(transaction), transaction)
+    bucket_remove(index['buckets']['keys'], get_key(transaction), transaction)
+    description_remove(index, transaction)
+    update_balances(index, transaction, -1)
+    if index['amounts']['deferred'] is not None:
+        defer_remove(index['amounts']['deferred'], transaction)
+    else:
+        del index['amounts']['sorted'][find_amount_position(index, transaction)]
+
+
+def index_remove_all(index, removed):
+    '''
+    Removes several transactions from the index, rebuilding the list sorted by amount in a single pass.
+    :param index: index of the current transactions
+    :param removed: transactions to remove
+    :return: -
+    '''
+    for transaction in removed:
+        bucket_remove(index['buckets']['days'], get_day(transaction), transaction)
+        bucket_remove(index['buckets']['keys'], get_key(transaction), transaction)
+        description_remove(index, transaction)
+    update_balances_all(index, group_transactions(removed, get_key), -1)
+    if index['amounts']['deferred'] is not None:
+        for transaction in removed:
+            defer_remove(index['amounts']['deferred'], transaction)
+    else:
+        index['amounts']['sorted'] = remove_amounts(index['amounts']['sorted'], removed)
+
+
+def index_set_amount(index, transaction, amount):
+    '''
+    Changes the amount of an indexed transaction, keeping the index up to date.
+    :param index: index of the current transactions
+    :param transaction: transaction to modify
+    :param amount: new amount
+    :return: -
+    '''
+    update_balances(index, transaction, -1)
+    if index['amounts']['deferred'] is not None:
+        defer_move(index['amounts']['deferred'], transaction)
+        set_amount(transaction, amount)
+    else:
+        del index['amounts']['sorted'][find_amount_position(index, transaction)]
+        set_amount(transaction, amount)
+        insort(index['amounts']['sorted'], transaction, key=get_amount)
+    update_balances(index, transaction, 1)
+
+
+def index_set_amounts(index, changed, amounts):
+    '''
+    Changes the amounts of several indexed transactions, taking them out of the list sorted by amount in a single
+    pass and merging them back once.
+    :param index: index of the current transactions
+    :param changed: transactions to modify
+    :param amounts: new amounts, one for every transaction
+    :return: -
+    '''
+    if len(changed) == 1:
+        index_set_amount(index, changed[0], amounts[0])
+        return
+    for transaction in changed:
+        update_balances(index, transaction, -1)
+    if index['amounts']['deferred'] is not None:
+        for transaction in changed:
+            defer_move(index['amounts']['deferred'], transaction)
+    else:
+        index['amounts']['sorted'] = remove_amounts(index['amounts']['sorted'], changed)
+    for transaction, amount in zip(changed, amounts):
+        set_amount(transaction, amount)
+        update_balances(index, transaction, 1)
+    if index['amounts']['deferred'] is None:
+        index['amounts']['sorted'] = merge_amounts(index['amounts']['sorted'], changed)
+
+
+def index_restore(index, transactions, restored):
+    '''
+    Adds back to the index transactions that were put back in the list by undo.
+    :param index: index of the current transactions
+    :param transactions: list of current transactions, already containing the restored transactions
+    :param restored: restored transactions, in list order
+    :return: -
+    '''
+    bucket_restore(index['buckets']['days'], get_day, transactions, restored)
+    bucket_restore(index['buckets']['keys'], get_key, transactions, restored)
+    description_restore(index, transactions, restored)
+    update_balances_all(index, group_transactions(restored, get_key), 1)
+    if index['amounts']['deferred'] is not None:
+        index['amounts']['deferred']['added'].update((id(transaction), transaction) for transaction in restored)
+    else:
+        index['amounts']['sorted'].extend(restored)
+        index['amounts']['sorted'].sort(key=get_amount)
+
+
+def format_month(year, month):
+    return '%04d-%02d' % (year, month)
+
+
+def get_current_month():
+    '''
+    Gets the month of today's date.
+    :return: month as a -year-month- string
+    '''
+    today = date.today()
+    return format_month(today.year, today.month)
+
+
+def get_next_month(month):
+    '''
+    Gets the month that follows a month.
+    :param month: month as a -year-month- string
+    :return: next month as a -year-month- string
+    '''
+    year, number = int(month[:4]), int(month[5:])
+    return format_month(year + number // 12, number % 12 + 1)
+
+
+def parse_date(text, index):
+    '''
+    Parses a day of the open month (e.g. -15-) or a full date (e.g. -2026-10-15-), otherwise raises exception.
+    :param text: text to parse
+    :param index: index of the current transactions, which holds the open month
+    :return: (month, day) pair, the month as a -year-month- string
+    '''
+    if str(text).isnumeric():
+        check_day(text)
+        return index['months']['open'], int(text)
+    try:
+        parsed = date.fromisoformat(text)
+    except ValueError:
+        raise ValueError('Dates should be days of the open month or of the form year-month-day!')
+    return format_month(parsed.year, parsed.month), parsed.day
+
+
+def parse_month(text):
+    '''
+    Parses a month of the form -year-month- (e.g. -2026-10-), otherwise raises exception.
+    :param text: text to parse
+    :return: month as a -year-month- string
+    '''
+    try:
+        parsed = date.fromisoformat(text + '-01')
+    except ValueError:
+        raise ValueError('Months should be of the form year-month!')
+    return format_month(parsed.year, parsed.month)
+
+
+def check_open_month(index, month):
+    '''
+    Checks if a month is the open month, the only one whose transactions can change, otherwise raises exception.
+    :param index: index of the current transactions
+    :param month: month to check
+    :return: -
+    '''
+    if month < index['months']['open']:
+        raise ValueError('Closed months are read-only!')
+    if month > index['months']['open']:
+        raise ValueError('The open month is ' + index['months']['open'] + ', close it first!')
+
+
+def freeze_month(index):
+    '''
+    Packs the transactions of the open month into a compact read-only partition. The transactions are sorted by day
+    (in list order within a day) and kept as columns: a byte per day and per type, an array of amounts and an array of
+    numbers into the partition's table of descriptions. The balance and the number of transactions up to every day
+    are stored too, so balances need no scan.
+    :param index: index of the transactions of the open month
+    :return: dictionary that represents the partition
+    '''
+    ordered = [transaction for day in range(1, DAYS + 1) for transaction in get_day_bucket(index, day).values()]
+    strings = sorted(set(get_description(transaction) for transaction in ordered))
+    numbers = {description: number for number, description in enumerate(strings)}
+    amounts = [get_amount(transaction) for transaction in ordered]
+    try:
+        amounts = array('q', amounts)
+    except OverflowError:
+        pass
+    return {'days': bytes(get_day(transaction) for transaction in ordered), 'amounts': amounts,
+            'types': bytes(get_type(transaction) == 'in' for transaction in ordered),
+            'descriptions': array('I', (numbers[get_description(transaction)] for transaction in ordered)),
+            'strings': strings, 'balances': [fenwick_sum(index['balances']['net'], day) for day in range(DAYS + 1)],
+            'counts': [fenwick_sum(index['balances']['counts'], day) for day in range(DAYS + 1)]}
+
+
+def find_frozen_positions(partition, first, last, type=None, condition=None, amount=None):
+    '''
+    Finds the transactions of a closed month that have a certain type and satisfy an amount condition, checking the
+    columns in place, so no transaction is built for the others.
+    :param partition: partition of the closed month
+    :param first: first position to look at
+    :param last: position after the last one to look at
+    :param type: type to search for, None for both types
+    :param condition: condition on the amount (<, = or >), None for any amount
+    :param amount: amount to take into account
+    :return: generator of the positions found
+    '''
+    if type is None and condition is None:
+        yield from range(first, last)
+        return
+    incoming = type == TYPES[0]
+    for position, (value, kind) in enumerate(zip(partition['amounts'][first:last], partition['types'][first:last]),
+                                             first):
+        if (type is None or kind == incoming) and compare_amount(value, condition, amount):
+            yield position
+
+
+def get_frozen_transaction(partition, position):
+    '''
+    Gets a copy of a transaction of a closed month.
+    :param partition: partition of the closed month
+    :param position: position of the transaction in the partition
+    :return: dictionary that represents the transaction
+    '''
+    return {'day': partition['days'][position], 'amount': partition['amounts'][position],
+            'type': TYPES[0] if partition['types'][position] else TYPES[1],
+            'description': partition['strings'][partition['descriptions'][position]]}
+
+
+def get_frozen_range(partition, start, end):
+    '''
+    Finds the transactions of a closed month between two days with a binary search, as they are sorted by day.
+    :param partition: partition of the closed month
+    :param start: start day
+    :param end: end day
+    :return: (first position, position after the last) pair
+    '''
+    return bisect_left(partition['days'], start), bisect_right(partition['days'], end)
+
+
+def close_month(transactions, history, index):
+    '''
+    Closes the open month: its transactions are frozen into a read-only partition, the following month is opened
+    with no transactions and the history of changes is emptied, as closed months cannot be changed.
+    :param transactions: list of current transactions
+    :param history: history of changes
+    :param index: index of the current transactions
+    :return: -
+    '''
+    partition = freeze_month(index)
+    months = index['months']
+    if len(partition['days']) > 0:
+        months['closed'][months['open']] = partition
+    months['open'] = get_next_month(months['open'])
+    months['carried'] += partition['balances'][DAYS]
+    transactions[:] = []
+    index.clear()
+    index.update(create_index(transactions))
+    index['months'] = months
+    history.clear()
+
+
+def restore_months(index, month, closed):
+    '''
+    Gives an index the open month and the closed months of a ledger that was stored.
+    :param index: index of the transactions of the open month
+    :param month: open month
+    :param closed: dictionary from month to partition, for the closed months
+    :return: -
+    '''
+    index['months']['open'] = month
+    index['months']['closed'] = closed
+    index['months']['carried'] = sum(partition['balances'][DAYS] for partition in closed.values())
+
+
+def record_insert(history, position):
+    '''
+    Records in the history that a transaction was added at a position, so that undo only has to delete it.
+    :param history: history of changes to add to
+    :param position: position of the added transaction
+    :return: -
+    '''
+    history.append({'operation': 'insert', 'position': position})
+
+
+def record_append(history, position):
+    '''
+    Records in the history that several transactions were added at the end of the list, starting at a position.
+    :param history: history of changes to add to
+    :param position: position of the first added transaction
+    :return: -
+    '''
+    history.append({'operation': 'append', 'position': position})
+
+
+def record_remove(history, removed):
+    '''
+    Records in the history the transactions that were removed, together with the positions they occupied.
+    :param history: history of changes to add to
+    :param removed: list of (position, transaction) pairs, in increasing order of position
+    :return: -
+    '''
+    history.append({'operation': 'remove', 'removed': removed})
+
+
+def record_replace(history, key, amounts):
+    '''
+    Records in the history the amounts transactions had before they were replaced. The transactions are the first
+    ones of their key bucket, so the change refers to them by key and holds no transaction, which lets it be written
+    to disk and read back.
+    :param history: history of changes to add to
+    :param key: (day, type, description) key of the replaced transactions
+    :param amounts: old amounts, in bucket order
+    :return: -
+    '''
+    history.append({'operation': 'replace', 'key': key, 'amounts': amounts})
+
+
+def record_batch(history, changes):
+    '''
+    Records in the history the changes made by a batch as a single change, so that one undo reverses all of them.
+    :param history: history of changes to add to
+    :param changes: list of changes made by the batch, oldest first
+    :return: -
+    '''
+    history.append({'operation': 'batch', 'changes': changes})
+
+
+def undo_change(transactions, change, index):
+    '''
+    Reverses a single change recorded in the history. Changes are undone in reverse order, so the positions
+    recorded with a change are valid again when it is undone.
+    :param transactions: list of current transactions
+    :param change: change to reverse
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if change['operation'] == 'insert':
+        index_remove(index, transactions[change['position']])
+        del transactions[change['position']]
+    elif change['operation'] == 'append':
+        index_remove_all(index, transactions[change['position']:])
+        del transactions[change['position']:]
+    elif change['operation'] == 'remove':
+        kept = iter(transactions)
+        merged = []
+        for position, transaction in change['removed']:
+            while len(merged) < position:
+                merged.append(next(kept))
+            merged.append(transaction)
+        merged.extend(kept)
+        transactions[:] = merged
+        index_restore(index, transactions, [transaction for position, transaction in change['removed']])
+    elif change['operation'] == 'replace':
+        changed = list(get_key_bucket(index, *change['key']).values())[:len(change['amounts'])]
+        index_set_amounts(index, changed, change['amounts'])
+    elif change['operation'] == 'batch':
+        deferring = index['amounts']['deferred'] is None
+        if deferring:
+            defer_amounts(index)
+        for batch_change in reversed(change['changes']):
+            undo_change(transactions, batch_change, index)
+        if deferring:
+            stop_deferring_amounts(index)
+
+
+def begin_batch(transactions, history, index):
+    '''
+    Opens a batch: the changes made until it is committed become a single change in the history, and the list sorted
+    by amount is only brought up to date when it is needed or when the batch ends.
+    :param transactions: list of current transactions
+    :param history: history of changes
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if index['batch'] is not None:
+        raise ValueError('A batch is already open!')
+    index['batch'] = len(history)
+    defer_amounts(index)
+
+
+def commit_batch(transactions, history, index):
+    '''
+    Commits the open batch, replacing the changes it made with a single change in the history.
+    :param transactions: list of current transactions
+    :param history: history of changes
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if index['batch'] is None:
+        raise ValueError('There is no open batch!')
+    changes = history[index['batch']:]
+    del history[index['batch']:]
+    if len(changes) == 1:
+        history.append(changes[0])
+    elif len(changes) > 1:
+        record_batch(history, changes)
+    index['batch'] = None
+    stop_deferring_amounts(index)
+
+
+def rollback_batch(transactions, history, index):
+    '''
+    Rolls back the open batch, undoing all the changes it made.
+    :param transactions: list of current transactions
+    :param history: history of changes
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if index['batch'] is None:
+        raise ValueError('There is no open batch!')
+    while len(history) > index['batch']:
+        undo_change(transactions, history.pop(), index)
+    index['batch'] = None
+    stop_deferring_amounts(index)
+
+
+def rollback_failed_batch(transactions, history, index, error):
+    '''
+    Rolls back the open batch after one of its commands failed.
+    :param transactions: list of current transactions
+    :param history: history of changes
+    :param index: index of the current transactions
+    :param error: exception raised by the command
+    :return: exception to raise instead, which also tells that the batch was rolled back
+    '''
+    rollback_batch(transactions, history, index)
+    return ValueError(str(error) + ' The batch was rolled back!')
+
+
+def remove_if(transactions, condition, history, index):
+    '''
+    Removes, in a single pass, all transactions that satisfy a condition and records them as one change.
+    :param transactions: list of current transactions
+    :param condition: function that receives a transaction and returns True if it should be removed
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: True if at least one transaction was removed, False otherwise
+    '''
+    return remove_selected(transactions, list(map(condition, transactions)), history, index)
+
+
+def remove_selected(transactions, selected, history, index):
+    '''
+    Removes the transactions selected by a list of flags and records them as one change. The list of transactions is
+    only gone through by itertools.compress, so the flags can come from a vectorized condition.
+    :param transactions: list of current transactions
+    :param selected: list with a flag for every transaction, True if it should be removed
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: True if at least one transaction was removed, False otherwise
+    '''
+    index['scanned'] += len(selected)
+    removed = list(itertools.compress(enumerate(transactions), selected))
+    if len(removed) == 0:
+        return False
+    transactions[:] = list(itertools.compress(transactions, map(operator.not_, selected)))
+    index_remove_all(index, [transaction for position, transaction in removed])
+    record_remove(history, removed)
+    return True
+
+
+def append_transactions(transactions, added, history, index):
+    '''
+    Adds several transactions at the end of the list, as a single change.
+    :param transactions: list of current transactions
+    :param added: list of transactions to add
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: -
+    '''
+    record_append(history, len(transactions))
+    transactions.extend(added)
+    index_add_all(index, added)
+
+
+def add_to_current_day(transactions, amount, type, description, history, index):
+    '''
+    Adds a new transaction to the current day.
+    :param transactions: list of current transactions
+    :param amount: amount to add
+    :param type: type to add
+    :param description: description to add
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if get_current_month() != index['months']['open']:
+        raise ValueError('Today is not in the open month ' + index['months']['open'] + '!')
+    day = date.today().day
+    transaction = create_transaction(day, amount, type, description)
+    record_insert(history, len(transactions))
+    transactions.append(transaction)
+    index_add(index, transaction)
+
+
+def insert_to_day(transactions, day, amount, type, description, history, index):
+    '''
+    Inserts a new transaction to a day.
+    :param transactions: list of current transactions
+    :param day: day to add to
+    :param amount: amount to add
+    :param type: type to add
+    :param description: description to add
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: -
+    '''
+    transaction = create_transaction(day, amount, type, description)
+    record_insert(history, len(transactions))
+    transactions.append(transaction)
+    index_add(index, transaction)
+
+
+def remove_from_day(transactions, day, history, index):
+    '''
+    Removes all transactions from a day.
+    :param transactions: list of current transactions
+    :param day: day to remove from
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: -
+    '''
+    bucket = get_day_bucket(index, int(day))
+    if len(bucket) == 0:
+        raise ValueError('There are no transactions for that day!')
+    remove_if(transactions, lambda transaction: id(transaction) in bucket, history, index)
+
+
+def remove_between_start_and_end(transactions, start, end, history, index):
+    '''
+    Removes all transactions between two days.
+    :param transactions: list of current transactions
+    :param start: start day
+    :param end: end day
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: -
+    '''
+    found = set()
+    for day in range(int(start), int(end) + 1):
+        found.update(get_day_bucket(index, day))
+    if len(found) == 0:
+        raise ValueError('There are no transactions between those days!')
+    remove_if(transactions, lambda transaction: id(transaction) in found, history, index)
+
+
+def remove_between_dates(transactions, start, end, history, index):
+    '''
+    Removes all transactions between two dates. Only the open month can change, so the dates may reach into closed
+    months only where those have no transactions.
+    :param transactions: list of current transactions
+    :param start: (month, day) pair of the start date
+    :param end: (month, day) pair of the end date
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: -
+    '''
+    check_dates(start, end)
+    found = find_between_dates(index, start, end)
+    if any(month in index['months']['closed'] for month, first, last in found):
+        raise ValueError('Closed months are read-only!')
+    if len(found) == 0:
+        raise ValueError('There are no transactions between those days!')
+    month, first, last = found[0]
+    remove_between_start_and_end(transactions, first, last, history, index)
+
+
+def remove_from_type(transactions, type, history, index):
+    '''
+    Removes all transactions having a certain type.
+    :param transactions: list of current transactions
+    :param type: type to remove
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if not remove_if(transactions, lambda transaction: get_type(transaction) == type, history, index):
+        raise ValueError('There are no transactions of that type!')
+
+
+def replace_amount(transactions, day, type, description, amount, history, index):
+    '''
+    Replaces a transaction's amount with a new amount.
+    :param transactions: list of current transactions
+    :param day: day to search for
+    :param type: type to search for
+    :param description: description to search for
+    :param amount: amount to replace with
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: -
+    '''
+    bucket = get_key_bucket(index, day, type, description)
+    if len(bucket) == 0:
+        raise ValueError('The transaction does not exist!')
+    transaction = next(iter(bucket.values()))
+    record_replace(history, get_key(transaction), [get_amount(transaction)])
+    index_set_amount(index, transaction, amount)
+
+
+def replace_all_amounts(transactions, day, type, description, amount, history, index):
+    '''
+    Replaces the amount of all transactions having a certain day, type and description with a new amount.
+    :param transactions: list of current transactions
+    :param day: day to search for
+    :param type: type to search for
+    :param description: description to search for
+    :param amount: amount to replace with
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: -
+    '''
+    bucket = get_key_bucket(index, day, type, description)
+    if len(bucket) == 0:
+        raise ValueError('The transaction does not exist!')
+    replaced = list(bucket.values())
+    record_replace(history, get_key(replaced[0]), [get_amount(transaction) for transaction in replaced])
+    index_set_amounts(index, replaced, [amount] * len(replaced))
+
+
+def scan_transactions(index, transactions):
+    '''
+    Goes through transactions one at a time, counting every transaction visited in the index, so that the statistics
+    of a command hold the number of transactions it looked at.
+    :param index: index of the current transactions
+    :param transactions: iterable of the transactions to go through
+    :return: generator of the transactions
+    '''
+    for transaction in transactions:
+        index['scanned'] += 1
+        yield transaction
+
+
+def list_all(transactions):
+    '''
+    Lists all transactions.
+    :param transactions: list of current transactions
+    :return: list of all transactions
+    '''
+    if len(transactions) == 0:
+        raise ValueError('There are no transactions!')
+    else:
+        return transactions
+
+
+def count_type(transactions, type, index):
+    '''
+    Counts the transactions having a certain type.
+    :param transactions: list of current transactions
+    :param type: type to search for
+    :param index: index of the current transactions
+    :return: number of transactions found
+    '''
+    return get_aggregate_count(index['summary']['all'], type)
+
+
+def list_type(transactions, type, index):
+    '''
+    Lists all transactions having a certain type. The transactions are found while they are used.
+    :param transactions: list of current transactions
+    :param type: type to search for
+    :param index: index of the current transactions
+    :return: generator of the transactions found
+    '''
+    if count_type(transactions, type, index) == 0:
+        raise ValueError('There are no transactions of that type!')
+    else:
+        return (transaction for transaction in scan_transactions(index, transactions) if get_type(transaction) == type)
+
+
+def get_amount_range(index, condition, amount):
+    '''
+    Finds the transactions that are smaller, equal or greater than a certain amount in the list of transactions
+    sorted by amount.
+    :param index: index of the current transactions
+    :param condition: condition to take into account
+    :param amount: amount to take into account
+    :return: start and end (exclusive) positions of the transactions found in the sorted list
+    '''
+    amounts = get_sorted_amounts(index)
+    if condition == '<':
+        return 0, bisect_left(amounts, int(amount), key=get_amount)
+    elif condition == '=':
+        return bisect_left(amounts, int(amount), key=get_amount), bisect_right(amounts, int(amount), key=get_amount)
+    else:
+        return bisect_right(amounts, int(amount), key=get_amount), len(amounts)
+
+
+def get_amounts_between(index, start, end):
+    '''
+    Gets, one at a time, the transactions between two positions of the list of transactions sorted by amount.
+    :param index: index of the current transactions
+    :param start: first position
+    :param end: last position (exclusive)
+    :return: generator of the transactions
+    '''
+    amounts = get_sorted_amounts(index)
+    return scan_transactions(index, (amounts[position] for position in range(start, end)))
+
+
+def count_condition_amount(transactions, condition, amount, index):
+    '''
+    Counts the transactions that are smaller, equal or greater than a certain amount.
+    :param transactions: list of current transactions
+    :param condition: condition to take into account
+    :param amount: amount to take into account
+    :param index: index of the current transactions
+    :return: number of transactions found
+    '''
+    start, end = get_amount_range(index, condition, amount)
+    return end - start
 
 
-def check_amount(amount):
+def list_condition_amount(transactions, condition, amount, index):
     '''
-    Checks if amount is a positive integer, otherwise raises exception.
-    :param amount: amount to check
-    :return: -
+    Lists all transactions that are smaller, equal or greater than a certain amount, in increasing order of amount.
+    :param transactions: list of current transactions
+    :param condition: condition to take into account
+    :param amount: amount to take into account
+    :param index: index of the current transactions
+    :return: generator of the transactions found
     '''
-    if not str(amount).isnumeric():
-        raise ValueError('Amount should be of type integer!')
-    if int(amount) < 0:
-        raise ValueError('Amount should be positive!')
+    start, end = get_amount_range(index, condition, amount)
+    if start == end:
+        raise ValueError('There are no transactions that satisfy the condition!')
+    else:
+        return get_amounts_between(index, start, end)
 
 
-def check_type(type):
+def count_between_amounts(transactions, low, high, index):
     '''
-    Checks if type is -in- or -out-, otherwise raises exception.
-    :param type:
-    :return:
+    Counts the transactions having an amount between two amounts.
+    :param transactions: list of current transactions
+    :param low: smallest amount
+    :param high: largest amount
+    :param index: index of the current transactions
+    :return: number of transactions found
     '''
-    if type != 'in' and type != 'out':
-        raise ValueError('Type should be in or out!')
+    start = get_amount_range(index, '<', low)[1]
+    end = get_amount_range(index, '>', high)[0]
+    return max(end - start, 0)
 
 
-def create_transaction(day, amount, type, description):
+def list_between_amounts(transactions, low, high, index):
     '''
-    Creates a new transaction.
-    :param day: day to use
-    :param amount: amount to use
-    :param type: type to use
-    :param description: description to use
-    :return: dictionary that represents a transaction
+    Lists all transactions having an amount between two amounts, in increasing order of amount.
+    :param transactions: list of current transactions
+    :param low: smallest amount
+    :param high: largest amount
+    :param index: index of the current transactions
+    :return: generator of the transactions found
     '''
-    return {'day': day, 'amount': amount, 'type': type, 'description': description}
-
-
-def get_day(transaction):
-    return transaction['day']
+    start = get_amount_range(index, '<', low)[1]
+    end = get_amount_range(index, '>', high)[0]
+    if start >= end:
+        raise ValueError('There are no transactions between those amounts!')
+    else:
+        return get_amounts_between(index, start, end)
 
 
-def get_amount(transaction):
-    return transaction['amount']
+def get_summary(transactions, index):
+    '''
+    Summarizes the transactions of the open month, from the aggregates kept by the index.
+    :param transactions: list of current transactions
+    :param index: index of the current transactions
+    :return: (aggregate of all transactions, balance including the closed months) pair
+    '''
+    aggregate = index['summary']['all']
+    return aggregate, index['months']['carried'] + get_aggregate_net(aggregate)
 
 
-def get_type(transaction):
-    return transaction['type']
+def get_summary_by_day(transactions, index):
+    '''
+    Summarizes the transactions of every day that has any, from the aggregates kept by the index.
+    :param transactions: list of current transactions
+    :param index: index of the current transactions
+    :return: list of (day, aggregate) pairs, in order of day
+    '''
+    if len(transactions) == 0:
+        raise ValueError('There are no transactions!')
+    return [(day, aggregate) for day, aggregate in enumerate(index['summary']['days'])
+            if get_aggregate_count(aggregate) > 0]
 
 
-def get_description(transaction):
-    return transaction['description']
+def get_summary_by_description(transactions, index):
+    '''
+    Summarizes the transactions of every description, from the aggregates kept by the index.
+    :param transactions: list of current transactions
+    :param index: index of the current transactions
+    :return: list of (description, aggregate) pairs, in order of description
+    '''
+    if len(transactions) == 0:
+        raise ValueError('There are no transactions!')
+    return sorted(index['summary']['descriptions'].items())
 
 
-def set_day(transaction, day):
-    transaction['day'] = day
+def get_amount_histogram(transactions, width, index):
+    '''
+    Counts the transactions by ranges of amounts of equal width. Each range is found with a binary search in the list
+    of transactions sorted by amount, so the transactions are not gone through.
+    :param transactions: list of current transactions
+    :param width: width of the ranges, the k-th range going from k * width to (k + 1) * width - 1
+    :param index: index of the current transactions
+    :return: list of (lowest amount of the range, number of transactions) pairs, for the ranges that have any
+    '''
+    amounts = get_sorted_amounts(index)
+    histogram = []
+    position = 0
+    while position < len(amounts):
+        low = get_amount(amounts[position]) // width * width
+        end = bisect_left(amounts, low + width, lo=position, key=get_amount)
+        histogram.append((low, end - position))
+        position = end
+    return histogram
+
+
+def get_month_report(transactions, width, index):
+    '''
+    Gathers the month-end report of the open month from the index: the balance at the end of every day, the number
+    and the total amount of the transactions of each type and the histogram of the amounts.
+    :param transactions: list of current transactions
+    :param width: width of the ranges of the histogram
+    :param index: index of the current transactions
+    :return: dictionary with the balances (see list_balances), the aggregate of all transactions and the histogram
+    '''
+    return {'balances': list_balances(transactions, index), 'summary': get_summary(transactions, index)[0],
+            'histogram': get_amount_histogram(transactions, width, index)}
 
 
-def set_amount(transaction, amount):
-    transaction['amount'] = amount
+def get_closed_partition(index, month):
+    '''
+    Gets the partition of a closed month, otherwise raises exception.
+    :param index: index of the current transactions
+    :param month: closed month
+    :return: partition of the month
+    '''
+    if month not in index['months']['closed']:
+        raise ValueError('There are no transactions in that month!')
+    return index['months']['closed'][month]
 
 
-def set_type(transaction, type):
-    transaction['type'] = type
+def get_closed_balances(index, month):
+    '''
+    Lists the balance at the end of every day of a closed month, from the balances its partition keeps.
+    :param index: index of the current transactions
+    :param month: closed month
+    :return: list of (day, balance) pairs for days 1 to DAYS
+    '''
+    partition = get_closed_partition(index, month)
+    carried = sum(closed['balances'][DAYS] for closed_month, closed in index['months']['closed'].items()
+                  if closed_month < month)
+    return [(day, carried + partition['balances'][day]) for day in range(1, DAYS + 1)]
 
 
-def set_description(transaction, description):
-    transaction['description'] = description
+def get_closed_month_report(index, month, width):
+    '''
+    Gathers the month-end report of a closed month (see get_month_report). The totals and the histogram are not kept
+    by the partition, so its columns are gone through.
+    :param index: index of the current transactions
+    :param month: closed month
+    :param width: width of the ranges of the histogram
+    :return: dictionary with the balances, the aggregate of all transactions and the histogram
+    '''
+    partition = get_closed_partition(index, month)
+    amounts = partition['amounts']
+    incoming = bytes(partition['types']).count(1)
+    total = sum(itertools.compress(amounts, partition['types']))
+    summary = {'counts': {'in': incoming, 'out': len(amounts) - incoming},
+               'totals': {'in': total, 'out': sum(amounts) - total}}
+    counts = {}
+    for amount in amounts:
+        counts[amount // width] = counts.get(amount // width, 0) + 1
+    return {'balances': get_closed_balances(index, month), 'summary': summary,
+            'histogram': [(low * width, counts[low]) for low in sorted(counts)]}
+
+
+def find_top(index, count, type, largest):
+    '''
+    Finds the largest or smallest transactions by going down or up the list of transactions sorted by amount, so only
+    the transactions returned, and those of the other type skipped on the way, are looked at.
+    :param index: index of the current transactions
+    :param count: number of transactions to find
+    :param type: type to search for, None for both types
+    :param largest: True for the largest transactions, False for the smallest
+    :return: list of at most count transactions, largest (or smallest) first
+    '''
+    amounts = get_sorted_amounts(index)
+    found = []
+    for transaction in reversed(amounts) if largest else amounts:
+        if len(found) == count:
+            break
+        if type is None or get_type(transaction) == type:
+            found.append(transaction)
+    return found
 
 
-def to_string(transaction):
+def list_top(transactions, count, type, largest, index):
     '''
-    Transforms a transaction to a string form.
-    :param transaction: transaction to convert
-    :return: string formed by transaction
+    Lists the largest or smallest transactions (see find_top).
+    :param transactions: list of current transactions
+    :param count: number of transactions to list
+    :param type: type to search for, None for both types
+    :param largest: True for the largest transactions, False for the smallest
+    :param index: index of the current transactions
+    :return: list of at most count transactions, largest (or smallest) first
     '''
-    return 'day: ' + str(get_day(transaction)) + '   amount: ' + str(get_amount(transaction)) + '   type: ' \
-           + str(get_type(transaction)) + '   description: ' + str(get_description(transaction))
+    found = find_top(index, int(count), type, largest)
+    if len(found) == 0:
+        raise ValueError('There are no transactions of that type!' if type is not None else 'There are no transactions!')
+    return found
 
 
-def startup_transactions():
+def list_top_descriptions(transactions, count, largest, index):
     '''
-    Generates 10 random transactions for program startup.
-    :return: list of transactions generated
+    Lists the descriptions with the largest or smallest spend, the total amount of their -out- transactions. The
+    totals are kept by the index, so a heap of count descriptions is enough to find them.
+    :param transactions: list of current transactions
+    :param count: number of descriptions to list
+    :param largest: True for the largest spend, False for the smallest
+    :param index: index of the current transactions
+    :return: list of at most count (description, spend) pairs, largest (or smallest) spend first
     '''
-    transactions = []
-    types = ['in', 'out']
-    descriptions = ['pizza', 'salary', 'coffee', 'jeans', 'ticket', 'groceries', 'gift', 'bills', 'shirt', 'shoes',
-                    'soda', 'water', 'bread', 'internet', 'candle']
-    for i in range(0, 10):
-        day = str(random.randint(1, 30))
-        amount = str(random.randint(1, 100))
-        type = str(random.choice(types))
-        description = str(random.choice(descriptions))
-        transaction = create_transaction(day, amount, type, description)
-        transactions.append(transaction)
-    return transactions
+    spends = ((description, get_aggregate_total(aggregate, 'out'))
+              for description, aggregate in index['summary']['descriptions'].items()
+              if get_aggregate_count(aggregate, 'out') > 0)
+    select = heapq.nlargest if largest else heapq.nsmallest
+    found = select(int(count), spends, key=lambda spend: spend[1])
+    if len(found) == 0:
+        raise ValueError('There are no -out- transactions!')
+    return found
 
 
-def split_text(text):
+def find_descriptions(index, text, prefix):
     '''
-    Splits text into command (first word) and parameters (rest of words).
-    :param text: text to split
-    :return: command and parameters
+    Finds the descriptions that contain a text, or start with it, through the search index: a text of up to GRAM
+    characters leads to its descriptions directly, a longer one to the descriptions that contain all its pieces of
+    GRAM characters, which are then checked.
+    :param index: index of the current transactions
+    :param text: text to search for
+    :param prefix: True if the descriptions should start with the text, False if they should only contain it
+    :return: sorted list of the descriptions found
     '''
-    words = text.strip().split(' ', 1)
-    command = words[0].strip()
-    if len(words) == 1:
-        parameters = ''
+    if len(text) <= GRAM:
+        candidates = index['grams'].get(text, set())
     else:
-        parameters = words[1].strip()
-    return command, parameters
+        found = sorted((index['grams'].get(text[start:start + GRAM], set())
+                        for start in range(len(text) - GRAM + 1)), key=len)
+        candidates = found[0].intersection(*found[1:])
+    if prefix:
+        return sorted(description for description in candidates if description.startswith(text))
+    return sorted(description for description in candidates if text in description)
 
 
-def add_to_current_day(transactions, amount, type, description, history):
+def compare_amount(value, condition, amount):
     '''
-    Adds a new transaction to the current day.
-    :param transactions: list of current transactions
-    :param amount: amount to add
-    :param type: type to add
-    :param description: description to add
-    :param history: history of changes to add to
-    :return: -
+    Checks if an amount is smaller, equal or greater than a certain amount.
+    :param value: amount to check
+    :param condition: condition to take into account, None for any amount
+    :param amount: amount to take into account
+    :return: True if the condition holds, False otherwise
     '''
-    today = date.today()
-    day = today.strftime("%d")
-    transaction = create_transaction(day, amount, type, description)
-    cpy = copy.deepcopy(transactions)
-    history.append(cpy)
-    transactions.append(transaction)
+    if condition == '<':
+        return value < int(amount)
+    elif condition == '=':
+        return value == int(amount)
+    elif condition == '>':
+        return value > int(amount)
+    return True
 
 
-def insert_to_day(transactions, day, amount, type, description, history):
+def check_condition(transaction, condition, amount):
     '''
-    Inserts a new transaction to a day.
-    :param transactions: list of current transactions
-    :param day: day to add to
-    :param amount: amount to add
-    :param type: type to add
-    :param description: description to add
-    :param history: history of changes to add to
-    :return: -
+    Checks if the amount of a transaction is smaller, equal or greater than a certain amount.
+    :param transaction: transaction to check
+    :param condition: condition to take into account, None for any amount
+    :param amount: amount to take into account
+    :return: True if the condition holds, False otherwise
     '''
-    transaction = create_transaction(day, amount, type, description)
-    cpy = copy.deepcopy(transactions)
-    history.append(cpy)
-    transactions.append(transaction)
+    return compare_amount(get_amount(transaction), condition, amount)
 
 
-def remove_from_day(transactions, day, history):
+def search_transactions(index, text, prefix, type=None, condition=None, amount=None):
     '''
-    Removes all transactions from a day.
-    :param transactions: list of current transactions
-    :param day: day to remove from
-    :param history: history of changes to add to
-    :return: -
+    Finds the transactions whose description contains a text, or starts with it, and that have a certain type and
+    satisfy an amount condition. Only the transactions of the descriptions found are looked at.
+    :param index: index of the current transactions
+    :param text: text to search for
+    :param prefix: True if the descriptions should start with the text, False if they should only contain it
+    :param type: type to search for, None for both types
+    :param condition: condition on the amount (<, = or >), None for any amount
+    :param amount: amount to take into account
+    :return: list of the transactions found, in order of day (in list order within a description)
     '''
-    found = False
-    cpy = copy.deepcopy(transactions)
-    index = 0
-    while index < len(transactions):
-        if get_day(transactions[index]) == day:
-            transactions.remove(transactions[index])
-            found = True
-        else:
-            index += 1
-    if found:
-        history.append(cpy)
-    else:
-        raise ValueError('There are no transactions for that day!')
+    if text == '':
+        raise ValueError('The search text should not be empty!')
+    found = [transaction for description in find_descriptions(index, text, prefix)
+             for transaction in scan_transactions(index, index['buckets']['descriptions'][description].values())
+             if (type is None or get_type(transaction) == type) and check_condition(transaction, condition, amount)]
+    found.sort(key=get_day)
+    return found
 
 
-def remove_between_start_and_end(transactions, start, end, history):
+def count_search(transactions, text, prefix, index, type=None, condition=None, amount=None):
     '''
-    Removes all transactions between two days.
+    Counts the transactions found by a search (see search_transactions). Without type and amount constraints, only the
+    sizes of the buckets of the descriptions found are added.
     :param transactions: list of current transactions
-    :param start: start day
-    :param end: end day
-    :param history: history of changes to add to
-    :return: -
+    :param text: text to search for
+    :param prefix: True if the descriptions should start with the text, False if they should only contain it
+    :param index: index of the current transactions
+    :param type: type to search for, None for both types
+    :param condition: condition on the amount (<, = or >), None for any amount
+    :param amount: amount to take into account
+    :return: number of transactions found
     '''
-    found = False
-    cpy = copy.deepcopy(transactions)
-    index = 0
-    while index < len(transactions):
-        if int(start) <= int(get_day(transactions[index])) <= int(end):
-            transactions.remove(transactions[index])
-            found = True
-        else:
-            index += 1
-    if found:
-        history.append(cpy)
-    else:
-        raise ValueError('There are no transactions between those days!')
+    if type is None and condition is None:
+        if text == '':
+            raise ValueError('The search text should not be empty!')
+        return sum(len(index['buckets']['descriptions'][description])
+                   for description in find_descriptions(index, text, prefix))
+    return len(search_transactions(index, text, prefix, type, condition, amount))
 
 
-def remove_from_type(transactions, type, history):
+def list_search(transactions, text, prefix, index, type=None, condition=None, amount=None):
     '''
-    Removes all transactions having a certain type.
+    Lists the transactions found by a search (see search_transactions).
     :param transactions: list of current transactions
-    :param type: type to remove
-    :param history: history of changes to add to
-    :return: -
+    :param text: text to search for
+    :param prefix: True if the descriptions should start with the text, False if they should only contain it
+    :param index: index of the current transactions
+    :param type: type to search for, None for both types
+    :param condition: condition on the amount (<, = or >), None for any amount
+    :param amount: amount to take into account
+    :return: list of the transactions found
     '''
-    found = False
-    cpy = copy.deepcopy(transactions)
-    index = 0
-    while index < len(transactions):
-        if get_type(transactions[index]) == type:
-            transactions.remove(transactions[index])
-            found = True
-        else:
-            index += 1
-    if found:
-        history.append(cpy)
-    else:
-        raise ValueError('There are no transactions of that type!')
+    found = search_transactions(index, text, prefix, type, condition, amount)
+    if len(found) == 0:
+        raise ValueError('There are no transactions that match the search!')
+    return found
 
 
-def replace_amount(transactions, day, type, description, amount, history):
+def list_balance_day(transactions, day, index):
     '''
-    Replaces a transaction's amount with a new amount.
+    Lists the balance at the end of a certain day: the sum of all -in- transactions minus the sum of all -out-
+    transactions occurring before or on that day.
     :param transactions: list of current transactions
-    :param day: day to search for
-    :param type: type to search for
-    :param description: description to search for
-    :param amount: amount to replace with
-    :param history: history of changes to add to
-    :return: -
+    :param day: day to calculate balance for
+    :param index: index of the current transactions
+    :return: calculated balance
     '''
-    found = False
-    cpy = copy.deepcopy(transactions)
-    for transaction in transactions:
-        if get_day(transaction) == day and get_type(transaction) == type and get_description(
-                transaction) == description:
-            history.append(cpy)
-            set_amount(transaction, amount)
-            found = True
-            break
-    if not found:
-        raise ValueError('The transaction does not exist!')
+    day = int(day)
+    if fenwick_sum(index['balances']['counts'], day) == 0 and len(index['months']['closed']) == 0:
+        raise ValueError('There are no transactions until that day!')
+    return index['months']['carried'] + fenwick_sum(index['balances']['net'], day)
 
 
-def list_all(transactions):
+def list_balance_date(transactions, month, day, index):
     '''
-    Lists all transactions.
+    Lists the balance at the end of a date of any month. Closed months give their balance directly from their
+    partition, so only the month of the date is looked into.
     :param transactions: list of current transactions
-    :return: list of all transactions
+    :param month: month of the date
+    :param day: day of the date
+    :param index: index of the current transactions
+    :return: calculated balance
+    '''
+    if month == index['months']['open']:
+        return list_balance_day(transactions, day, index)
+    if month > index['months']['open']:
+        return list_balance_day(transactions, DAYS, index)
+    balance = 0
+    count = 0
+    for closed_month, partition in index['months']['closed'].items():
+        if closed_month < month:
+            balance += partition['balances'][DAYS]
+            count += partition['counts'][DAYS]
+        elif closed_month == month:
+            balance += partition['balances'][int(day)]
+            count += partition['counts'][int(day)]
+    if count == 0:
+        raise ValueError('There are no transactions until that day!')
+    return balance
+
+
+def list_balances(transactions, index):
+    '''
+    Lists the balance at the end of every day of the month.
+    :param transactions: list of current transactions
+    :param index: index of the current transactions
+    :return: list of (day, balance) pairs for days 1 to DAYS
     '''
     if len(transactions) == 0:
         raise ValueError('There are no transactions!')
-    else:
-        return transactions
+    return [(day, index['months']['carried'] + fenwick_sum(index['balances']['net'], day))
+            for day in range(1, DAYS + 1)]
 
 
-def list_type(transactions, type):
+def get_month_days(month, start, end):
     '''
-    Lists all transactions having a certain type.
-    :param transactions: list of current transactions
-    :param type: type to search for
-    :return: list of transactions found
+    Gets the days of a month that fall between two dates.
+    :param month: month to use
+    :param start: (month, day) pair of the start date
+    :param end: (month, day) pair of the end date
+    :return: (first day, last day) pair
     '''
-    new_transactions = []
-    for transaction in transactions:
-        if get_type(transaction) == type:
-            new_transactions.append(transaction)
-    if len(new_transactions) == 0:
-        raise ValueError('There are no transactions of that type!')
-    else:
-        return new_transactions
+    return start[1] if month == start[0] else 1, end[1] if month == end[0] else DAYS
+
+
+def find_between_dates(index, start, end):
+    '''
+    Finds the transactions between two dates, only looking into the months between them: closed months by a binary
+    search on their days and the open month through its day buckets.
+    :param index: index of the current transactions
+    :param start: (month, day) pair of the start date
+    :param end: (month, day) pair of the end date
+    :return: list of (month, first, last) tuples, which stand for the transactions of a closed month between two
+    positions, or for the transactions of the open month between two days
+    '''
+    found = []
+    for month in sorted(index['months']['closed']):
+        if start[0] <= month <= end[0]:
+            first, last = get_frozen_range(index['months']['closed'][month], *get_month_days(month, start, end))
+            if first < last:
+                found.append((month, first, last))
+    if start[0] <= index['months']['open'] <= end[0]:
+        found.append((index['months']['open'],) + get_month_days(index['months']['open'], start, end))
+    return found
+
+
+def check_dates(start, end):
+    '''
+    Checks if a start date is not after an end date, otherwise raises exception.
+    :param start: (month, day) pair of the start date
+    :param end: (month, day) pair of the end date
+    :return: -
+    '''
+    if start > end:
+        raise ValueError('Start date should not be after end date!')
 
 
-def list_condition_amount(transactions, condition, amount):
+def count_between_dates(transactions, start, end, index, type=None, condition=None, amount=None):
     '''
-    Lists all transactions that are smaller, equal or greater than a certain amount.
+    Counts the transactions between two dates.
     :param transactions: list of current transactions
-    :param condition: condition to take into account
+    :param start: (month, day) pair of the start date
+    :param end: (month, day) pair of the end date
+    :param index: index of the current transactions
+    :param type: type to search for, None for both types
+    :param condition: condition on the amount (<, = or >), None for any amount
     :param amount: amount to take into account
-    :return: list of transactions found
+    :return: number of transactions found
     '''
-    new_transactions = []
-    for transaction in transactions:
-        if condition == "<" and int(get_amount(transaction)) < int(amount):
-            new_transactions.append(transaction)
-        elif condition == "=" and get_amount(transaction) == amount:
-            new_transactions.append(transaction)
-        elif condition == ">" and int(get_amount(transaction)) > int(amount):
-            new_transactions.append(transaction)
-    if len(new_transactions) == 0:
-        raise ValueError('There are no transactions that satisfy the condition!')
-    else:
-        return new_transactions
+    check_dates(start, end)
+    count = 0
+    for month, first, last in find_between_dates(index, start, end):
+        if month in index['months']['closed']:
+            partition = index['months']['closed'][month]
+            if condition is not None or type is not None:
+                index['scanned'] += last - first
+            if condition is not None:
+                count += sum(1 for position in find_frozen_positions(partition, first, last, type, condition, amount))
+            elif type is None:
+                count += last - first
+            else:
+                count += bytes(partition['types'][first:last]).count(type == TYPES[0])
+        elif type is None and condition is None:
+            counts = index['balances']['counts']
+            count += fenwick_sum(counts, last) - fenwick_sum(counts, first - 1)
+        else:
+            count += sum(1 for day in range(first, last + 1)
+                         for transaction in scan_transactions(index, get_day_bucket(index, day).values())
+                         if (type is None or get_type(transaction) == type)
+                         and check_condition(transaction, condition, amount))
+    return count
 
 
-def list_balance_day(transactions, day):
+def list_between_dates(transactions, start, end, index, type=None, condition=None, amount=None):
     '''
-    Lists the balance for a certain day.
+    Lists the transactions between two dates, in order of date. The transactions are found while they are used; those
+    of closed months are only built once they are found.
     :param transactions: list of current transactions
-    :param day: day to calculate balance for
-    :return: calculated balance
+    :param start: (month, day) pair of the start date
+    :param end: (month, day) pair of the end date
+    :param index: index of the current transactions
+    :param type: type to search for, None for both types
+    :param condition: condition on the amount (<, = or >), None for any amount
+    :param amount: amount to take into account
+    :return: generator of (month, transaction) pairs
     '''
-    found = False
-    balance_in = 0
-    balance_out = 0
-    for transaction in transactions:
-        if get_day(transaction) == day:
-            found = True
-            if get_type(transaction) == 'in':
-                balance_in += int(get_amount(transaction))
+    if count_between_dates(transactions, start, end, index, type, condition, amount) == 0:
+        raise ValueError('There are no transactions between those dates!')
+    found = find_between_dates(index, start, end)
+
+    def generate():
+        for month, first, last in found:
+            if month in index['months']['closed']:
+                partition = index['months']['closed'][month]
+                if type is not None or condition is not None:
+                    index['scanned'] += last - first
+                for position in find_frozen_positions(partition, first, last, type, condition, amount):
+                    yield month, get_frozen_transaction(partition, position)
             else:
-                balance_out += int(get_amount(transaction))
-    if not found:
-        raise ValueError('There are no transactions for that day!')
-    else:
-        return balance_in - balance_out
+                for day in range(first, last + 1):
+                    for transaction in scan_transactions(index, get_day_bucket(index, day).values()):
+                        if (type is None or get_type(transaction) == type) \
+                                and check_condition(transaction, condition, amount):
+                            yield month, transaction
+    return generate()
 
 
-def filter_type(transactions, type, history):
+def list_months(transactions, index):
+    '''
+    Lists the closed months and the open month.
+    :param transactions: list of current transactions
+    :param index: index of the current transactions
+    :return: list of (month, number of transactions, balance at the end of the month, True if closed) tuples
+    '''
+    months = []
+    balance = 0
+    for month in sorted(index['months']['closed']):
+        partition = index['months']['closed'][month]
+        balance += partition['balances'][DAYS]
+        months.append((month, partition['counts'][DAYS], balance, True))
+    months.append((index['months']['open'], len(transactions),
+                   index['months']['carried'] + fenwick_sum(index['balances']['net'], DAYS), False))
+    return months
+
+
+def filter_type(transactions, type, history, index):
     '''
     Filters out all transactions that do not have a certain type.
     :param transactions: list of current transactions
     :param type: type to keep
     :param history: history of changes to add to
+    :param index: index of the current transactions
     :return: -
     '''
-    found = False
-    cpy = copy.deepcopy(transactions)
-    index = 0
-    while index < len(transactions):
-        if get_type(transactions[index]) != type:
-            transactions.remove(transactions[index])
-            found = True
-        else:
-            index += 1
-    if found:
-        history.append(cpy)
-    else:
+    if not remove_if(transactions, lambda transaction: get_type(transaction) != type, history, index):
         raise ValueError('The transactions are already filtered!')
 
 
-def filter_type_and_amount(transactions, type, amount, history):
+def filter_type_and_amount(transactions, type, amount, history, index):
     '''
     Filters out all transactions that do not have a certain type and an amount smaller than a certain amount.
     :param transactions: list of current transactions
     :param type: type to keep
     :param amount: amount to take into account
     :param history: history of changes to add to
+    :param index: index of the current transactions
     :return: -
     '''
-    found = False
-    cpy = copy.deepcopy(transactions)
-    index = 0
-    while index < len(transactions):
-        if get_type(transactions[index]) != type or int(get_amount(transactions[index])) >= int(amount):
-            transactions.remove(transactions[index])
-            found = True
-        else:
-            index += 1
-    if found:
-        history.append(cpy)
-    else:
+    amount = int(amount)
+
+    def condition(transaction):
+        return get_type(transaction) != type or get_amount(transaction) >= amount
+
+    if not remove_if(transactions, condition, history, index):
         raise ValueError('The transactions are already filtered!')
 
 
-def handle_add(transactions, parameters, history):
+def handle_add(transactions, parameters, history, index):
     '''
     Handles the add command.
     :param transactions: list of current transactions
     :param parameters: parameters for add command
     :param history: history of changes to add to
+    :param index: index of the current transactions
     :return: -
     '''
     parameters = parameters.split()
@@ -395,36 +2003,38 @@ def handle_add(transactions, parameters, history):
     type = parameters[1]
     check_type(type)
     description = parameters[2]
-    add_to_current_day(transactions, amount, type, description, history)
+    add_to_current_day(transactions, amount, type, description, history, index)
 
 
-def handle_insert(transactions, parameters, history):
+def handle_insert(transactions, parameters, history, index):
     '''
     Handles the insert command.
     :param transactions: list of current transactions
     :param parameters: parameters for insert command
     :param history: history of changes to add to
+    :param index: index of the current transactions
     :return: -
     '''
     parameters = parameters.split()
     if len(parameters) != 4:
         raise ValueError('Invalid number of parameters for insert command!')
-    day = parameters[0]
-    check_day(day)
+    month, day = parse_date(parameters[0], index)
+    check_open_month(index, month)
     amount = parameters[1]
     check_amount(amount)
     type = parameters[2]
     check_type(type)
     description = parameters[3]
-    insert_to_day(transactions, day, amount, type, description, history)
+    insert_to_day(transactions, day, amount, type, description, history, index)
 
 
-def handle_remove(transactions, parameters, history):
+def handle_remove(transactions, parameters, history, index):
     '''
     Handles the remove command.
     :param transactions: list of current transactions
     :param parameters: parameters for remove command
     :param history: history of changes to add to
+    :param index: index of the current transactions
     :return: -
     '''
     parameters = parameters.split()
@@ -432,107 +2042,249 @@ def handle_remove(transactions, parameters, history):
         if str(parameters[0]).isnumeric():
             day = parameters[0]
             check_day(day)
-            remove_from_day(transactions, day, history)
-        else:
+            remove_from_day(transactions, day, history, index)
+        elif parameters[0] in TYPES:
             type = parameters[0]
             check_type(type)
-            remove_from_type(transactions, type, history)
+            remove_from_type(transactions, type, history, index)
+        else:
+            month, day = parse_date(parameters[0], index)
+            check_open_month(index, month)
+            remove_from_day(transactions, day, history, index)
     elif len(parameters) == 3:
         if parameters[1] == 'to':
-            start = parameters[0]
-            check_day(start)
-            end = parameters[2]
-            check_day(end)
-            if int(start) > int(end):
-                raise ValueError('Start day should be smaller than end day!')
-            remove_between_start_and_end(transactions, start, end, history)
+            if str(parameters[0]).isnumeric() and str(parameters[2]).isnumeric():
+                start = parameters[0]
+                check_day(start)
+                end = parameters[2]
+                check_day(end)
+                if int(start) > int(end):
+                    raise ValueError('Start day should be smaller than end day!')
+                remove_between_start_and_end(transactions, start, end, history, index)
+            else:
+                remove_between_dates(transactions, parse_date(parameters[0], index), parse_date(parameters[2], index),
+                                     history, index)
         else:
             raise ValueError('-Remove- command should contain -to- keyword!')
     else:
         raise ValueError('Invalid number of parameters for any remove command!')
 
 
-def handle_replace(transactions, parameters, history):
+def handle_replace(transactions, parameters, history, index):
     '''
     Handles the remove command.
     :param transactions: list of current transactions
     :param parameters: parameters for remove command
     :param history: history of changes to add to
+    :param index: index of the current transactions
     :return: -
     '''
     parameters = parameters.split()
+    replace_all = len(parameters) > 0 and parameters[0] == 'all'
+    if replace_all:
+        parameters = parameters[1:]
     if len(parameters) != 5:
         raise ValueError('Invalid number of parameters for replace command!')
     if parameters[3] == 'with':
-        day = parameters[0]
-        check_day(day)
+        month, day = parse_date(parameters[0], index)
+        check_open_month(index, month)
         type = parameters[1]
         check_type(type)
         description = parameters[2]
         amount = parameters[4]
         check_amount(amount)
-        replace_amount(transactions, day, type, description, amount, history)
+        if replace_all:
+            replace_all_amounts(transactions, day, type, description, amount, history, index)
+        else:
+            replace_amount(transactions, day, type, description, amount, history, index)
     else:
         raise ValueError('-Replace- command should contain -with- keyword!')
 
 
-def handle_filter(transactions, parameters, history):
+def handle_filter(transactions, parameters, history, index):
     '''
     Handles the filter command.
     :param transactions: list of current transactions
     :param parameters: parameters for filter command
     :param history: history of changes to add to
+    :param index: index of the current transactions
     :return: -
     '''
+    type, amount = parse_filter(parameters)
+    if amount is None:
+        filter_type(transactions, type, history, index)
+    else:
+        filter_type_and_amount(transactions, type, amount, history, index)
+
+
+def parse_filter(parameters):
+    '''
+    Parses the parameters of the filter command.
+    :param parameters: parameters for filter command
+    :return: (type to keep, amount) pair, the amount being None if there is none
+    '''
     parameters = parameters.split()
     if len(parameters) == 1:
         type = parameters[0]
         check_type(type)
-        filter_type(transactions, type, history)
+        return type, None
     elif len(parameters) == 2:
         type = parameters[0]
         check_type(type)
         amount = parameters[1]
         check_amount(amount)
-        filter_type_and_amount(transactions, type, amount, history)
+        return type, amount
     else:
         raise ValueError('Invalid number of parameters for any filter command!')
 
 
-def handle_undo(transactions, parameters, history):
+def handle_close(transactions, parameters, history, index):
+    '''
+    Handles the close command.
+    :param transactions: list of current transactions
+    :param parameters: parameters for close command
+    :param history: history of changes
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if parameters.split() != []:
+        raise ValueError('Invalid number of parameters for close command!')
+    if index['batch'] is not None:
+        raise ValueError('A month cannot be closed in a batch!')
+    close_month(transactions, history, index)
+
+
+def handle_begin(transactions, parameters, history, index):
+    '''
+    Handles the begin command.
+    :param transactions: list of current transactions
+    :param parameters: parameters for begin command
+    :param history: history of changes
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if parameters.split() != []:
+        raise ValueError('Invalid number of parameters for begin command!')
+    begin_batch(transactions, history, index)
+
+
+def handle_commit(transactions, parameters, history, index):
+    '''
+    Handles the commit command.
+    :param transactions: list of current transactions
+    :param parameters: parameters for commit command
+    :param history: history of changes
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if parameters.split() != []:
+        raise ValueError('Invalid number of parameters for commit command!')
+    commit_batch(transactions, history, index)
+
+
+def handle_rollback(transactions, parameters, history, index):
+    '''
+    Handles the rollback command.
+    :param transactions: list of current transactions
+    :param parameters: parameters for rollback command
+    :param history: history of changes
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if parameters.split() != []:
+        raise ValueError('Invalid number of parameters for rollback command!')
+    rollback_batch(transactions, history, index)
+
+
+def handle_undo(transactions, parameters, history, index):
     '''
-    Handles the undo command.
+    Handles the undo command. Changes that were spilled to disk are read back when undo reaches them.
     :param transactions: list of current transactions
     :param parameters: parameters for undo command
     :param history: history of changes to add to
+    :param index: index of the current transactions
     :return: -
     '''
     parameters = parameters.split()
+    if index['batch'] is not None and len(history) == index['batch']:
+        raise ValueError('Cannot undo past the start of the batch!')
+    while len(history) > 0 and is_spilled(history[-1]):
+        history[-1:] = load_spilled(history[-1])
     if len(history) == 0:
         raise ValueError('Cannot undo anymore!')
     else:
         if len(parameters) == 0:
-            transactions.clear()
-            old_transactions = history.pop()
-            for transaction in old_transactions:
-                transactions.append(transaction)
+            undo_change(transactions, history.pop(), index)
         else:
             raise ValueError('Invalid number of parameters for undo command!')
 
 
+def test_remove_if():
+    transactions = [{'day': 7, 'amount': 23, 'type': 'out', 'description': 'pizza'},
+                    {'day': 4, 'amount': 50, 'type': 'in', 'description': 'salary'},
+                    {'day': 1, 'amount': 12, 'type': 'out', 'description': 'coffee'}]
+    history = []
+    index = create_index(transactions)
+    assert remove_if(transactions, lambda transaction: get_type(transaction) == 'out', history, index)
+    assert transactions == [{'day': 4, 'amount': 50, 'type': 'in', 'description': 'salary'}]
+    assert len(history) == 1
+    assert history[0] == {'operation': 'remove',
+                          'removed': [(0, {'day': 7, 'amount': 23, 'type': 'out', 'description': 'pizza'}),
+                                      (2, {'day': 1, 'amount': 12, 'type': 'out', 'description': 'coffee'})]}
+    assert not remove_if(transactions, lambda transaction: get_day(transaction) == 30, history, index)
+    assert len(transactions) == 1
+    assert len(history) == 1
+
+
+def test_scan_transactions():
+    transactions = [{'day': 7, 'amount': 23, 'type': 'out', 'description': 'pizza'},
+                    {'day': 4, 'amount': 50, 'type': 'in', 'description': 'salary'},
+                    {'day': 1, 'amount': 12, 'type': 'out', 'description': 'pizzeria'}]
+    index = create_index(transactions)
+    assert index['scanned'] == 0
+    assert len(list(list_type(transactions, 'in', index))) == 1
+    assert index['scanned'] == 3
+    assert len(list_search(transactions, 'pizz', True, index)) == 2
+    assert index['scanned'] == 5
+    assert len(list(list_condition_amount(transactions, '>', '20', index))) == 2
+    assert index['scanned'] == 7
+    assert count_between_dates(transactions, (index['months']['open'], 1), (index['months']['open'], 30), index) == 3
+    assert index['scanned'] == 7
+    filter_type(transactions, 'out', [], index)
+    assert index['scanned'] == 10
+
+
+def test_append_transactions():
+    transactions = [{'day': 7, 'amount': 23, 'type': 'out', 'description': 'pizza'}]
+    history = []
+    index = create_index(transactions)
+    added = [create_transaction('4', '50', 'in', 'salary'), create_transaction('7', '12', 'out', 'coffee')]
+    append_transactions(transactions, added, history, index)
+    assert len(transactions) == 3
+    assert transactions[1:] == [{'day': 4, 'amount': 50, 'type': 'in', 'description': 'salary'},
+                                {'day': 7, 'amount': 12, 'type': 'out', 'description': 'coffee'}]
+    assert len(history) == 1
+    assert history[0] == {'operation': 'append', 'position': 1}
+    assert list_balance_day(transactions, '30', index) == 15
+    handle_undo(transactions, '', history, index)
+    assert transactions == [{'day': 7, 'amount': 23, 'type': 'out', 'description': 'pizza'}]
+    assert index['amounts']['sorted'] == transactions
+    assert list_balance_day(transactions, '30', index) == -23
+
+
 def test_add_to_current_day():
     transactions = []
     amount = '23'
     type = 'out'
     description = 'pizza'
     history = []
-    add_to_current_day(transactions, amount, type, description, history)
+    index = create_index(transactions)
+    add_to_current_day(transactions, amount, type, description, history, index)
     assert len(transactions) == 1
-    today = date.today()
-    day = str(today.strftime("%d"))
-    assert transactions[0] == {'day': day, 'amount': '23', 'type': 'out', 'description': 'pizza'}
+    day = date.today().day
+    assert transactions[0] == {'day': day, 'amount': 23, 'type': 'out', 'description': 'pizza'}
     assert len(history) == 1
-    assert history[0] == []
+    assert history[0] == {'operation': 'insert', 'position': 0}
 
 
 def test_insert_to_day():
@@ -542,67 +2294,481 @@ def test_insert_to_day():
     type = 'out'
     description = 'pizza'
     history = []
-    insert_to_day(transactions, day, amount, type, description, history)
+    index = create_index(transactions)
+    insert_to_day(transactions, day, amount, type, description, history, index)
     assert len(transactions) == 1
-    assert transactions[0] == {'day': '1', 'amount': '23', 'type': 'out', 'description': 'pizza'}
+    assert transactions[0] == {'day': 1, 'amount': 23, 'type': 'out', 'description': 'pizza'}
     assert len(history) == 1
-    assert history[0] == []
+    assert history[0] == {'operation': 'insert', 'position': 0}
 
 
 def test_remove_from_day():
-    transactions = [{'day': '1', 'amount': '23', 'type': 'out', 'description': 'pizza'}]
+    transactions = [{'day': 1, 'amount': 23, 'type': 'out', 'description': 'pizza'}]
     day = '1'
     history = []
-    remove_from_day(transactions, day, history)
+    index = create_index(transactions)
+    remove_from_day(transactions, day, history, index)
     assert len(transactions) == 0
     assert len(history) == 1
-    assert history[0] == [{'day': '1', 'amount': '23', 'type': 'out', 'description': 'pizza'}]
+    assert history[0] == {'operation': 'remove',
+                          'removed': [(0, {'day': 1, 'amount': 23, 'type': 'out', 'description': 'pizza'})]}
 
 
 def test_remove_between_start_and_end():
-    transactions = [{'day': '7', 'amount': '23', 'type': 'out', 'description': 'pizza'},
-                    {'day': '4', 'amount': '23', 'type': 'out', 'description': 'pizza'},
-                    {'day': '1', 'amount': '23', 'type': 'out', 'description': 'pizza'}]
+    transactions = [{'day': 7, 'amount': 23, 'type': 'out', 'description': 'pizza'},
+                    {'day': 4, 'amount': 23, 'type': 'out', 'description': 'pizza'},
+                    {'day': 1, 'amount': 23, 'type': 'out', 'description': 'pizza'}]
     start = '1'
     end = '5'
     history = []
-    remove_between_start_and_end(transactions, start, end, history)
+    index = create_index(transactions)
+    remove_between_start_and_end(transactions, start, end, history, index)
     assert len(transactions) == 1
-    assert transactions[0] == {'day': '7', 'amount': '23', 'type': 'out', 'description': 'pizza'}
+    assert transactions[0] == {'day': 7, 'amount': 23, 'type': 'out', 'description': 'pizza'}
     assert len(history) == 1
-    assert history[0] == [{'day': '7', 'amount': '23', 'type': 'out', 'description': 'pizza'},
-                    {'day': '4', 'amount': '23', 'type': 'out', 'description': 'pizza'},
-                    {'day': '1', 'amount': '23', 'type': 'out', 'description': 'pizza'}]
+    assert history[0] == {'operation': 'remove',
+                          'removed': [(1, {'day': 4, 'amount': 23, 'type': 'out', 'description': 'pizza'}),
+                                      (2, {'day': 1, 'amount': 23, 'type': 'out', 'description': 'pizza'})]}
 
 
 def test_remove_from_type():
-    transactions = [{'day': '1', 'amount': '23', 'type': 'out', 'description': 'pizza'}]
+    transactions = [{'day': 1, 'amount': 23, 'type': 'out', 'description': 'pizza'}]
     type = 'out'
     history = []
-    remove_from_type(transactions, type, history)
+    index = create_index(transactions)
+    remove_from_type(transactions, type, history, index)
     assert len(transactions) == 0
     assert len(history) == 1
-    assert history[0] == [{'day': '1', 'amount': '23', 'type': 'out', 'description': 'pizza'}]
+    assert history[0] == {'operation': 'remove',
+                          'removed': [(0, {'day': 1, 'amount': 23, 'type': 'out', 'description': 'pizza'})]}
 
 
 def test_replace_amount():
-    transactions = [{'day': '1', 'amount': '23', 'type': 'out', 'description': 'pizza'}]
+    transactions = [{'day': 1, 'amount': 23, 'type': 'out', 'description': 'pizza'}]
     day = '1'
     type = 'out'
     description = 'pizza'
     amount = '25'
     history = []
-    replace_amount(transactions, day, type, description, amount, history)
+    index = create_index(transactions)
+    replace_amount(transactions, day, type, description, amount, history, index)
     assert len(transactions) == 1
-    assert transactions[0] == {'day': '1', 'amount': '25', 'type': 'out', 'description': 'pizza'}
+    assert transactions[0] == {'day': 1, 'amount': 25, 'type': 'out', 'description': 'pizza'}
+    assert len(history) == 1
+    assert history[0] == {'operation': 'replace', 'key': (1, 'out', 'pizza'), 'amounts': [23]}
+
+
+def test_replace_all_amounts():
+    transactions = [{'day': 1, 'amount': 23, 'type': 'out', 'description': 'pizza'},
+                    {'day': 1, 'amount': 12, 'type': 'in', 'description': 'pizza'},
+                    {'day': 1, 'amount': 40, 'type': 'out', 'description': 'pizza'}]
+    history = []
+    index = create_index(transactions)
+    replace_all_amounts(transactions, '1', 'out', 'pizza', '5', history, index)
+    assert [get_amount(transaction) for transaction in transactions] == [5, 12, 5]
     assert len(history) == 1
-    assert history[0] == [{'day': '1', 'amount': '23', 'type': 'out', 'description': 'pizza'}]
+    assert history[0] == {'operation': 'replace', 'key': (1, 'out', 'pizza'), 'amounts': [23, 40]}
+    handle_undo(transactions, '', history, index)
+    assert [get_amount(transaction) for transaction in transactions] == [23, 12, 40]
+    try:
+        replace_all_amounts(transactions, '2', 'out', 'pizza', '5', history, index)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_handle_undo():
+    transactions = [{'day': 7, 'amount': 23, 'type': 'out', 'description': 'pizza'},
+                    {'day': 4, 'amount': 50, 'type': 'in', 'description': 'salary'},
+                    {'day': 1, 'amount': 12, 'type': 'out', 'description': 'coffee'}]
+    original = [dict(transaction) for transaction in transactions]
+    history = []
+    index = create_index(transactions)
+    insert_to_day(transactions, '9', '30', 'in', 'gift', history, index)
+    replace_amount(transactions, '4', 'in', 'salary', '70', history, index)
+    remove_from_type(transactions, 'out', history, index)
+    remove_between_start_and_end(transactions, '4', '9', history, index)
+    assert transactions == []
+    handle_undo(transactions, '', history, index)
+    assert transactions == [{'day': 4, 'amount': 70, 'type': 'in', 'description': 'salary'},
+                            {'day': 9, 'amount': 30, 'type': 'in', 'description': 'gift'}]
+    handle_undo(transactions, '', history, index)
+    handle_undo(transactions, '', history, index)
+    handle_undo(transactions, '', history, index)
+    assert transactions == original
+    assert len(history) == 0
+
+
+def test_undo_spilled():
+    transactions = [{'day': 7, 'amount': 23, 'type': 'out', 'description': 'pizza'},
+                    {'day': 4, 'amount': 50, 'type': 'in', 'description': 'salary'},
+                    {'day': 1, 'amount': 12, 'type': 'out', 'description': 'coffee'}]
+    original = [dict(transaction) for transaction in transactions]
+    history = []
+    index = create_index(transactions)
+    journal = create_journal(budget=0, depth=4)
+    insert_to_day(transactions, '9', '30', 'in', 'gift', history, index)
+    update_journal(journal, history)
+    replace_amount(transactions, '4', 'in', 'salary', '70', history, index)
+    update_journal(journal, history)
+    remove_from_type(transactions, 'out', history, index)
+    update_journal(journal, history)
+    replace_all_amounts(transactions, '4', 'in', 'salary', '5', history, index)
+    update_journal(journal, history)
+    handle_insert(transactions, '2 8 out soda', history, index)
+    update_journal(journal, history)
+    assert all(is_spilled(change) for change in history)
+    for i in range(4):
+        handle_undo(transactions, '', history, index)
+    assert transactions == [original[0], original[1], original[2],
+                            {'day': 9, 'amount': 30, 'type': 'in', 'description': 'gift'}]
+    try:
+        handle_undo(transactions, '', history, index)
+        assert False
+    except ValueError:
+        pass
+    close_journal(journal, history)
+
+
+def test_batch():
+    transactions = [{'day': 3, 'amount': 10, 'type': 'in', 'description': 'pizza'},
+                    {'day': 5, 'amount': 40, 'type': 'out', 'description': 'coffee'}]
+    original = [dict(transaction) for transaction in transactions]
+    history = []
+    index = create_index(transactions)
+    handle_begin(transactions, '', history, index)
+    for i in range(50):
+        handle_insert(transactions, '7 ' + str(i) + ' in soda', history, index)
+    handle_replace(transactions, '3 in pizza with 60', history, index)
+    handle_remove(transactions, '5', history, index)
+    assert count_condition_amount(transactions, '>', 45, index) == 5
+    handle_insert(transactions, '8 1000 out rent', history, index)
+    handle_commit(transactions, '', history, index)
+    assert len(history) == 1 and history[0]['operation'] == 'batch'
+    assert index['amounts']['sorted'] == sorted(transactions, key=get_amount)
+    handle_undo(transactions, '', history, index)
+    assert transactions == original and history == []
+    assert index['amounts']['sorted'] == sorted(transactions, key=get_amount)
+    handle_begin(transactions, '', history, index)
+    handle_insert(transactions, '7 5 in soda', history, index)
+    try:
+        handle_undo(transactions, '', history, index)
+        handle_undo(transactions, '', history, index)
+        assert False
+    except ValueError as ve:
+        assert str(rollback_failed_batch(transactions, history, index, ve)) == \
+               'Cannot undo past the start of the batch! The batch was rolled back!'
+    assert transactions == original and index['batch'] is None and index['amounts']['deferred'] is None
+    handle_begin(transactions, '', history, index)
+    handle_insert(transactions, '7 5 in soda', history, index)
+    handle_rollback(transactions, '', history, index)
+    assert transactions == original and history == []
+    handle_begin(transactions, '', history, index)
+    handle_insert(transactions, '7 5 in soda', history, index)
+    handle_replace(transactions, '7 in soda with 70', history, index)
+    handle_insert(transactions, '9 8 out tea', history, index)
+    handle_undo(transactions, '', history, index)
+    handle_replace(transactions, '3 in pizza with 1', history, index)
+    handle_remove(transactions, '3', history, index)
+    handle_commit(transactions, '', history, index)
+    assert sorted(map(id, index['amounts']['sorted'])) == sorted(map(id, transactions))
+    assert list(map(get_amount, index['amounts']['sorted'])) == [40, 70]
+    handle_undo(transactions, '', history, index)
+    assert transactions == original
+    assert sorted(map(id, index['amounts']['sorted'])) == sorted(map(id, transactions))
+
+
+def test_index():
+    transactions = [{'day': 3, 'amount': 10, 'type': 'in', 'description': 'pizza'},
+                    {'day': 3, 'amount': 200, 'type': 'in', 'description': 'salary'},
+                    {'day': 5, 'amount': 40, 'type': 'out', 'description': 'coffee'},
+                    {'day': 3, 'amount': 15, 'type': 'in', 'description': 'pizza'}]
+    history = []
+    index = create_index(transactions)
+
+    def check_index():
+        rebuilt = create_index(transactions)
+        for day in range(1, 31):
+            assert list(get_day_bucket(index, day).values()) == list(get_day_bucket(rebuilt, day).values())
+        assert index['buckets']['keys'] == rebuilt['buckets']['keys']
+        for key in rebuilt['buckets']['keys']:
+            assert list(index['buckets']['keys'][key].values()) == list(rebuilt['buckets']['keys'][key].values())
+        assert index['grams'] == rebuilt['grams']
+        assert index['summary'] == rebuilt['summary']
+        assert index['balances'] == rebuilt['balances']
+        for description in rebuilt['buckets']['descriptions']:
+            assert list(index['buckets']['descriptions'][description].values()) == \
+                list(rebuilt['buckets']['descriptions'][description].values())
+
+    insert_to_day(transactions, '5', '60', 'in', 'gift', history, index)
+    assert list(get_day_bucket(index, 5).values()) == [transactions[2], transactions[4]]
+    filter_type_and_amount(transactions, 'in', '100', history, index)
+    assert list(get_day_bucket(index, 3).values()) == [transactions[0], transactions[1]]
+    check_index()
+    remove_from_day(transactions, '5', history, index)
+    assert len(get_day_bucket(index, 5)) == 0
+    check_index()
+    handle_undo(transactions, '', history, index)
+    check_index()
+    handle_undo(transactions, '', history, index)
+    check_index()
+    assert list(get_day_bucket(index, 3).values()) == [transactions[0], transactions[1], transactions[3]]
+    replace_amount(transactions, '3', 'in', 'pizza', '99', history, index)
+    assert get_amount(transactions[0]) == 99
+    handle_undo(transactions, '', history, index)
+    handle_undo(transactions, '', history, index)
+    check_index()
+    assert len(get_day_bucket(index, 5)) == 1
+
+
+def test_list_balance_day():
+    transactions = [{'day': 3, 'amount': 10, 'type': 'in', 'description': 'pizza'},
+                    {'day': 3, 'amount': 200, 'type': 'in', 'description': 'salary'},
+                    {'day': 5, 'amount': 40, 'type': 'out', 'description': 'coffee'}]
+    history = []
+    index = create_index(transactions)
+    assert list_balance_day(transactions, '4', index) == 210
+    assert list_balance_day(transactions, '30', index) == 170
+    replace_amount(transactions, '3', 'in', 'salary', '20', history, index)
+    insert_to_day(transactions, '1', '5', 'out', 'soda', history, index)
+    assert list_balance_day(transactions, '1', index) == -5
+    assert list_balance_day(transactions, '5', index) == -15
+    remove_from_day(transactions, '5', history, index)
+    assert list_balances(transactions, index)[29] == (30, 25)
+    handle_undo(transactions, '', history, index)
+    handle_undo(transactions, '', history, index)
+    handle_undo(transactions, '', history, index)
+    assert list_balances(transactions, index)[4] == (5, 170)
+    insert_to_day(transactions, '31', '100', 'in', 'salary', history, index)
+    assert list_balances(transactions, index)[-2:] == [(30, 170), (31, 270)]
+    assert get_summary(transactions, index)[1] == 270
+    handle_undo(transactions, '', history, index)
+    try:
+        remove_from_day(transactions, '3', history, index)
+        remove_from_day(transactions, '5', history, index)
+        list_balance_day(transactions, '30', index)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_close_month():
+    transactions = [{'day': 3, 'amount': 10, 'type': 'in', 'description': 'pizza'},
+                    {'day': 5, 'amount': 40, 'type': 'out', 'description': 'coffee'},
+                    {'day': 3, 'amount': 200, 'type': 'in', 'description': 'salary'}]
+    history = []
+    index = create_index(transactions)
+    restore_months(index, '2026-11', {})
+    handle_close(transactions, '', history, index)
+    assert transactions == [] and history == [] and index['months']['open'] == '2026-12'
+    partition = index['months']['closed']['2026-11']
+    assert [get_frozen_transaction(partition, position) for position in range(3)] == \
+           [{'day': 3, 'amount': 10, 'type': 'in', 'description': 'pizza'},
+            {'day': 3, 'amount': 200, 'type': 'in', 'description': 'salary'},
+            {'day': 5, 'amount': 40, 'type': 'out', 'description': 'coffee'}]
+    handle_insert(transactions, '2026-12-31 30 out gift', history, index)
+    handle_close(transactions, '', history, index)
+    handle_insert(transactions, '2 5 in soda', history, index)
+    assert index['months']['open'] == '2027-01' and len(index['months']['closed']) == 2
+    assert list_balance_day(transactions, '1', index) == 140
+    assert list_balance_date(transactions, '2026-11', 4, index) == 210
+    assert list_balance_date(transactions, '2027-01', 2, index) == 145
+    assert list_balance_date(transactions, '2027-05', 1, index) == 145
+    start = parse_date('2026-11-04', index)
+    end = parse_date('2', index)
+    assert end == ('2027-01', 2)
+    assert count_between_dates(transactions, start, end, index) == 3
+    assert count_between_dates(transactions, start, end, index, 'out') == 2
+    assert [to_date_string(month, transaction) for month, transaction in
+            list_between_dates(transactions, start, end, index, 'out')] == \
+           ['date: 2026-11-05   amount: 40   type: out   description: coffee',
+            'date: 2026-12-31   amount: 30   type: out   description: gift']
+    assert list_months(transactions, index) == [('2026-11', 3, 170, True), ('2026-12', 1, 140, True),
+                                                ('2027-01', 1, 145, False)]
+    for parameters in ['2026-12-31 to 2027-01-05', '2026-12-31']:
+        try:
+            handle_remove(transactions, parameters, history, index)
+            assert False
+        except ValueError as ve:
+            assert str(ve) == 'Closed months are read-only!'
+    handle_remove(transactions, '2027-01-01 to 2027-01-02', history, index)
+    assert transactions == []
+    try:
+        handle_insert(transactions, '2027-02-01 5 in soda', history, index)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_amount_index():
+    transactions = [{'day': 3, 'amount': 10, 'type': 'in', 'description': 'pizza'},
+                    {'day': 3, 'amount': 200, 'type': 'in', 'description': 'salary'},
+                    {'day': 5, 'amount': 40, 'type': 'out', 'description': 'coffee'},
+                    {'day': 6, 'amount': 10, 'type': 'out', 'description': 'soda'}]
+    history = []
+    index = create_index(transactions)
+    assert list(list_condition_amount(transactions, '=', '10', index)) == [transactions[0], transactions[3]]
+    assert list(list_condition_amount(transactions, '>', '10', index)) == [transactions[2], transactions[1]]
+    assert count_condition_amount(transactions, '>', '10', index) == 2
+    assert list(list_between_amounts(transactions, '10', '40', index)) == [transactions[0], transactions[3],
+                                                                           transactions[2]]
+    assert count_between_amounts(transactions, '11', '40', index) == 1
+    assert count_between_amounts(transactions, '50', '40', index) == 0
+    replace_amount(transactions, '3', 'in', 'salary', '5', history, index)
+    assert list(list_condition_amount(transactions, '<', '10', index)) == [transactions[1]]
+    assert list(list_type(transactions, 'out', index)) == [transactions[2], transactions[3]]
+    filter_type_and_amount(transactions, 'in', '8', history, index)
+    assert index['amounts']['sorted'] == transactions
+    handle_undo(transactions, '', history, index)
+    handle_undo(transactions, '', history, index)
+    assert [get_amount(transaction) for transaction in index['amounts']['sorted']] == [10, 10, 40, 200]
+    assert count_type(transactions, 'in', index) == 2
+    assert sorted(map(id, index['amounts']['sorted'])) == sorted(map(id, transactions))
+    generator = random.Random(1)
+    transactions = [create_transaction(1, generator.randint(1, 20), 'in', 'x') for i in range(2000)]
+    amounts = sorted(transactions, key=get_amount)
+    for removed in [transactions[:3] + transactions[500:530], transactions[::2]]:
+        ids = set(map(id, removed))
+        kept = remove_amounts(amounts, removed)
+        assert list(map(id, kept)) == [id(transaction) for transaction in amounts if id(transaction) not in ids]
+        expected = list(kept)
+        for transaction in removed:
+            insort(expected, transaction, key=get_amount)
+        assert list(map(id, merge_amounts(kept, removed))) == list(map(id, expected))
+
+
+def test_search():
+    transactions = [{'day': 7, 'amount': 10, 'type': 'out', 'description': 'pizza'},
+                    {'day': 3, 'amount': 200, 'type': 'in', 'description': 'salary'},
+                    {'day': 5, 'amount': 40, 'type': 'out', 'description': 'pizzeria'},
+                    {'day': 3, 'amount': 15, 'type': 'out', 'description': 'pizza'}]
+    history = []
+    index = create_index(transactions)
+    assert find_descriptions(index, 'izz', False) == ['pizza', 'pizzeria']
+    assert find_descriptions(index, 'pizze', False) == ['pizzeria']
+    assert find_descriptions(index, 'izz', True) == []
+    assert find_descriptions(index, 'a', True) == []
+    assert list_search(transactions, 'pizz', True, index) == [transactions[3], transactions[2], transactions[0]]
+    assert list_search(transactions, 'a', False, index, 'out', '<', '20') == [transactions[3], transactions[0]]
+    assert count_search(transactions, 'za', False, index) == 2
+    assert count_search(transactions, 'ria', False, index, 'in') == 0
+    remove_from_day(transactions, '5', history, index)
+    assert find_descriptions(index, 'izz', False) == ['pizza']
+    assert 'ria' not in index['grams']
+    handle_undo(transactions, '', history, index)
+    assert find_descriptions(index, 'e', False) == ['pizzeria']
+    insert_to_day(transactions, '9', '5', 'in', 'bread', history, index)
+    assert list_search(transactions, 'rea', False, index) == [transactions[4]]
+    try:
+        list_search(transactions, 'pasta', False, index)
+        assert False
+    except ValueError as ve:
+        assert str(ve) == 'There are no transactions that match the search!'
+    try:
+        count_search(transactions, '', True, index)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_summary():
+    transactions = [{'day': 3, 'amount': 10, 'type': 'out', 'description': 'pizza'},
+                    {'day': 3, 'amount': 200, 'type': 'in', 'description': 'salary'},
+                    {'day': 5, 'amount': 40, 'type': 'out', 'description': 'pizza'}]
+    history = []
+    index = create_index(transactions)
+    aggregate, balance = get_summary(transactions, index)
+    assert aggregate == {'counts': {'in': 1, 'out': 2}, 'totals': {'in': 200, 'out': 50}} and balance == 150
+    assert [(day, get_aggregate_net(aggregate)) for day, aggregate in get_summary_by_day(transactions, index)] == \
+        [(3, 190), (5, -40)]
+    replace_amount(transactions, '5', 'out', 'pizza', '45', history, index)
+    add_to_current_day(transactions, '7', 'out', 'soda', history, index)
+    filter_type(transactions, 'out', history, index)
+    summary = get_summary_by_description(transactions, index)
+    assert [description for description, aggregate in summary] == ['pizza', 'soda']
+    assert get_aggregate_count(summary[0][1], 'out') == 2 and get_aggregate_total(summary[0][1], 'out') == 55
+    assert get_summary(transactions, index)[1] == -62
+    for i in range(3):
+        handle_undo(transactions, '', history, index)
+    assert index['summary'] == create_index(transactions)['summary']
+    assert get_summary(transactions, index)[1] == 150
+    remove_from_type(transactions, 'out', history, index)
+    remove_from_type(transactions, 'in', history, index)
+    assert get_summary(transactions, index) == (create_aggregate(), 0)
+    try:
+        get_summary_by_day(transactions, index)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_month_report():
+    transactions = [{'day': 3, 'amount': 10, 'type': 'out', 'description': 'pizza'},
+                    {'day': 3, 'amount': 200, 'type': 'in', 'description': 'salary'},
+                    {'day': 5, 'amount': 40, 'type': 'out', 'description': 'pizza'},
+                    {'day': 6, 'amount': 19, 'type': 'in', 'description': 'gift'}]
+    index = create_index(transactions)
+    report = get_month_report(transactions, 20, index)
+    assert report['histogram'] == [(0, 2), (40, 1), (200, 1)]
+    assert report['balances'][4] == (5, 150) and report['balances'][29] == (30, 169)
+    assert report['summary'] == {'counts': {'in': 2, 'out': 2}, 'totals': {'in': 219, 'out': 50}}
+    assert get_amount_histogram(transactions, 1000, index) == [(0, 4)]
+    month = index['months']['open']
+    close_month(transactions, [], index)
+    closed = get_closed_month_report(index, month, 20)
+    assert closed == report
+    try:
+        get_closed_month_report(index, index['months']['open'], 20)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_top():
+    transactions = [{'day': 3, 'amount': 10, 'type': 'out', 'description': 'pizza'},
+                    {'day': 3, 'amount': 200, 'type': 'in', 'description': 'salary'},
+                    {'day': 5, 'amount': 40, 'type': 'out', 'description': 'pizza'},
+                    {'day': 6, 'amount': 45, 'type': 'out', 'description': 'bills'},
+                    {'day': 7, 'amount': 30, 'type': 'in', 'description': 'gift'}]
+    index = create_index(transactions)
+    assert list_top(transactions, 2, None, True, index) == [transactions[1], transactions[3]]
+    assert list_top(transactions, '2', 'out', True, index) == [transactions[3], transactions[2]]
+    assert list_top(transactions, 1, 'in', False, index) == [transactions[4]]
+    assert list_top(transactions, 10, 'in', False, index) == [transactions[4], transactions[1]]
+    assert list_top_descriptions(transactions, 1, True, index) == [('pizza', 50)]
+    assert list_top_descriptions(transactions, 5, False, index) == [('bills', 45), ('pizza', 50)]
+    remove_from_type(transactions, 'out', [], index)
+    try:
+        list_top(transactions, 1, 'out', True, index)
+        assert False
+    except ValueError as ve:
+        assert str(ve) == 'There are no transactions of that type!'
+    try:
+        list_top_descriptions(transactions, 1, True, index)
+        assert False
+    except ValueError:
+        pass
 
 
 def tests():
+    test_remove_if()
+    test_scan_transactions()
+    test_append_transactions()
     test_add_to_current_day()
     test_insert_to_day()
     test_remove_from_day()
     test_remove_between_start_and_end()
     test_remove_from_type()
     test_replace_amount()
+    test_replace_all_amounts()
+    test_handle_undo()
+    test_undo_spilled()
+    test_batch()
+    test_index()
+    test_list_balance_day()
+    test_close_month()
+    test_amount_index()
+    test_search()
+    test_summary()
+    test_month_report()
+    test_top()
@@ -0,0 +1,299 @@
+#
+# Bounds the memory used by the undo history. The newest changes stay in the history list; when they use more than
+# the memory budget, the oldest ones are written to a spill file and replaced in the list by a single -spilled- entry
+# that tells where they are. Undo reads them back when it reaches that entry. Changes beyond the maximum depth are
+# dropped. Dropped changes and changes read back by undo leave dead data in the spill file, so once most of it is dead
+# the changes still spilled are rewritten to a new spill file. There is no user interaction in this file.
+#
+import os
+import pickle
+import sys
+import tempfile
+
+# Size under which a spill file is never rewritten, however much of it is dead.
+COMPACT_BYTES = 1 << 20
+
+
+def create_journal(budget=None, depth=None, path=None):
+    '''
+    Creates the settings and bookkeeping of a bounded history.
+    :param budget: largest number of bytes used by the changes kept in memory, None for no limit
+    :param depth: largest number of changes that can be undone, None for no limit
+    :param path: path of the spill file, None for a temporary file removed when the journal is closed
+    :return: dictionary that represents the journal
+    '''
+    if budget is not None and budget < 0:
+        raise ValueError('The history budget should be positive!')
+    if depth is not None and depth < 0:
+        raise ValueError('The history depth should be positive!')
+    return {'budget': budget, 'depth': depth, 'path': path, 'temporary': path is None, 'sizes': [], 'bytes': 0,
+            'spilled': -1, 'compact_bytes': COMPACT_BYTES, 'stale': []}
+
+
+def is_spilled(change):
+    '''
+    Checks if an entry of the history stands for changes written to the spill file.
+    :param change: entry of the history
+    :return: True if the entry stands for spilled changes, False otherwise
+    '''
+    return change['operation'] == 'spilled'
+
+
+def count_spilled(history):
+    '''
+    Counts the spilled entries, which are always at the start of the history.
+    :param history: history of changes
+    :return: number of spilled entries
+    '''
+    count = 0
+    while count < len(history) and is_spilled(history[count]):
+        count += 1
+    return count
+
+
+def estimate_change_size(change):
+    '''
+    Estimates the memory used by a change. Removed transactions are counted, because only the history keeps them.
+    :param change: change to measure
+    :return: number of bytes
+    '''
+    size = sys.getsizeof(change)
+    if change['operation'] == 'batch':
+        return size + sys.getsizeof(change['changes']) + sum(map(estimate_change_size, change['changes']))
+    for value in change.values():
+        if isinstance(value, list):
+            size += sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+    if change['operation'] == 'remove':
+        size += sum(sys.getsizeof(transaction) for position, transaction in change['removed'])
+    return size
+
+
+def spill_changes(journal, history, start, count):
+    '''
+    Writes consecutive changes to the end of the spill file and replaces them in the history by one spilled entry.
+    :param journal: journal of the history
+    :param history: history of changes
+    :param start: position of the first change to spill
+    :param count: number of changes to spill
+    :return: -
+    '''
+    if journal['path'] is None:
+        descriptor, journal['path'] = tempfile.mkstemp(suffix='.history')
+        os.close(descriptor)
+    with open(journal['path'], 'ab') as file:
+        offset = file.tell()
+        pickle.dump(history[start:start + count], file, protocol=pickle.HIGHEST_PROTOCOL)
+        size = file.tell() - offset
+    history[start:start + count] = [{'operation': 'spilled', 'path': journal['path'], 'offset': offset, 'first': 0,
+                                     'count': count, 'size': size}]
+
+
+def load_spilled(change):
+    '''
+    Reads back the changes of a spilled entry.
+    :param change: spilled entry of the history
+    :return: list of the changes, oldest first
+    '''
+    try:
+        with open(change['path'], 'rb') as file:
+            file.seek(change['offset'])
+            return pickle.load(file)[change['first']:]
+    except (OSError, pickle.UnpicklingError, EOFError):
+        raise ValueError('The spilled history cannot be read!')
+
+
+def drop_changes(history, count):
+    '''
+    Drops the oldest changes of the history, spilled or not.
+    :param history: history of changes
+    :param count: number of changes to drop
+    :return: -
+    '''
+    while count > 0 and len(history) > 0:
+        if not is_spilled(history[0]):
+            del history[:count]
+            return
+        if history[0]['count'] <= count:
+            count -= history[0]['count']
+            del history[0]
+        else:
+            history[0]['first'] += count
+            history[0]['count'] -= count
+            count = 0
+
+
+def compact_spill_file(journal, history, spilled):
+    '''
+    Rewrites the changes still spilled to a new spill file, without the dead data of the old one. The old file is only
+    marked stale, because the last snapshot of the ledger may still refer to it (see release_spill_files).
+    :param journal: journal of the history
+    :param history: history of changes
+    :param spilled: number of spilled entries at the start of the history
+    :return: -
+    '''
+    loaded = [load_spilled(change) for change in history[:spilled]]
+    stale = set([journal['path']] + [change['path'] for change in history[:spilled]])
+    if journal['temporary']:
+        descriptor, path = tempfile.mkstemp(suffix='.history')
+    else:
+        directory, name = os.path.split(os.path.abspath(journal['path']))
+        descriptor, path = tempfile.mkstemp(prefix=name + '.', dir=directory)
+    journal['stale'].extend(stale)
+    journal['path'] = path
+    os.close(descriptor)
+    for position, changes in enumerate(loaded):
+        history[position:position + 1] = changes
+        spill_changes(journal, history, position, len(changes))
+
+
+def release_spill_files(journal):
+    '''
+    Removes the spill files left stale by compact_spill_file. With a ledger, a snapshot has to be written first, so
+    that no snapshot refers to them anymore.
+    :param journal: journal of the history
+    :return: -
+    '''
+    for path in journal['stale']:
+        if path != journal['path'] and os.path.exists(path):
+            os.remove(path)
+    journal['stale'] = []
+
+
+def update_journal(journal, history):
+    '''
+    Brings the history back within its budget and depth. It is called after every command, so the sizes of the changes
+    kept in memory are only measured once: a command adds or undoes at most one change, unless undo read spilled
+    changes back, in which case all are measured again. When most of the spill file is dead, the spilled changes are
+    rewritten (see compact_spill_file).
+    :param journal: journal of the history
+    :param history: history of changes
+    :return: True if the spill file was rewritten and the old one has to be released, False otherwise
+    '''
+    spilled = count_spilled(history)
+    if journal['spilled'] == -1 and spilled > 0:
+        journal['path'] = history[spilled - 1]['path']
+    sizes = journal['sizes']
+    kept = len(history) - spilled
+    if spilled != journal['spilled'] or abs(kept - len(sizes)) > 1:
+        sizes[:] = [estimate_change_size(change) for change in history[spilled:]]
+        journal['bytes'] = sum(sizes)
+    elif kept == len(sizes) + 1:
+        sizes.append(estimate_change_size(history[-1]))
+        journal['bytes'] += sizes[-1]
+    elif kept == len(sizes) - 1:
+        journal['bytes'] -= sizes.pop()
+    if journal['budget'] is not None and journal['bytes'] > journal['budget']:
+        count = 0
+        while journal['bytes'] > journal['budget'] // 2 and count < kept:
+            journal['bytes'] -= sizes[count]
+            count += 1
+        spill_changes(journal, history, spilled, count)
+        del sizes[:count]
+        spilled += 1
+        kept -= count
+    if journal['depth'] is not None:
+        depth = get_history_depth(history[:spilled]) + kept
+        if depth > journal['depth']:
+            drop_changes(history, depth - journal['depth'])
+            spilled = count_spilled(history)
+            dropped = len(sizes) - (len(history) - spilled)
+            journal['bytes'] -= sum(sizes[:dropped])
+            del sizes[:dropped]
+    journal['spilled'] = spilled
+    if journal['path'] is None or not os.path.exists(journal['path']):
+        return False
+    size = os.path.getsize(journal['path'])
+    if size <= journal['compact_bytes'] or size <= 2 * sum(change.get('size', 0) for change in history[:spilled]):
+        return False
+    compact_spill_file(journal, history, spilled)
+    return True
+
+
+def get_history_depth(history):
+    '''
+    Counts the changes that can be undone, spilled or not.
+    :param history: history of changes
+    :return: number of changes
+    '''
+    return sum(change['count'] if is_spilled(change) else 1 for change in history)
+
+
+def get_journal_report(journal, history):
+    '''
+    Reports the depth and the memory use of a bounded history.
+    :param journal: journal of the history
+    :param history: history of changes
+    :return: dictionary with the number of changes in memory and on disk, and the bytes they use
+    '''
+    spilled = count_spilled(history)
+    disk = 0
+    if journal['path'] is not None and os.path.exists(journal['path']):
+        disk = os.path.getsize(journal['path'])
+    return {'depth': get_history_depth(history), 'memory_changes': len(history) - spilled,
+            'disk_changes': get_history_depth(history[:spilled]), 'memory_bytes': journal['bytes'],
+            'disk_bytes': disk, 'budget': journal['budget'], 'max_depth': journal['depth']}
+
+
+def close_journal(journal, history):
+    '''
+    Removes the spill file when nothing refers to it anymore, and the stale ones. The storage has to be closed first,
+    so that its last snapshot holds the same history.
+    :param journal: journal of the history
+    :param history: history of changes
+    :return: -
+    '''
+    release_spill_files(journal)
+    if journal['path'] is not None and os.path.exists(journal['path']) \
+            and (journal['temporary'] or count_spilled(history) == 0):
+        os.remove(journal['path'])
+
+
+def test_update_journal():
+    history = [{'operation': 'insert', 'position': i} for i in range(10)]
+    size = estimate_change_size(history[0])
+    journal = create_journal(budget=4 * size, depth=8)
+    update_journal(journal, history)
+    assert get_history_depth(history) == 8
+    assert count_spilled(history) == 1 and len(history) == 3
+    assert journal['bytes'] <= 2 * size
+    assert [change['position'] for change in load_spilled(history[0])] == [2, 3, 4, 5, 6, 7]
+    history.append({'operation': 'insert', 'position': 10})
+    update_journal(journal, history)
+    assert get_history_depth(history) == 8
+    assert [change['position'] for change in load_spilled(history[0])] == [3, 4, 5, 6, 7]
+    report = get_journal_report(journal, history)
+    assert report['depth'] == 8 and report['memory_changes'] == 3 and report['disk_changes'] == 5
+    assert report['disk_bytes'] > 0
+    close_journal(journal, history)
+    assert not os.path.exists(journal['path'])
+
+
+def test_compact_spill_file():
+    history = []
+    journal = create_journal(budget=0, depth=4)
+    journal['compact_bytes'] = 0
+    sizes = []
+    compactions = 0
+    for i in range(200):
+        history.append({'operation': 'insert', 'position': i, 'padding': list(range(100))})
+        if update_journal(journal, history):
+            assert len(journal['stale']) == 1
+            release_spill_files(journal)
+            compactions += 1
+        assert journal['stale'] == []
+        sizes.append(os.path.getsize(journal['path']))
+        if i == 100:
+            history[-1:] = load_spilled(history[-1])
+            update_journal(journal, history)
+            release_spill_files(journal)
+    assert get_history_depth(history) == 4 and compactions > 10
+    assert max(sizes[10:]) <= 2 * max(sizes[:10])
+    assert [change['position'] for spilled in history for change in load_spilled(spilled)] == [196, 197, 198, 199]
+    path = journal['path']
+    close_journal(journal, history)
+    assert not os.path.exists(path)
+
+
+def journal_tests():
+    test_update_journal()
+    test_compact_spill_file()
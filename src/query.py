@@ -0,0 +1,306 @@
+#
+# Queries that combine several conditions on the transactions of the open month, e.g.
+# -type=in amount>100 day=5..10 desc~pizza-. The planner estimates, from the index, how many transactions each
+# condition lets through and reads only the transactions of the most selective one (a range of day buckets, a range
+# of the list sorted by amount, the buckets of a type or the buckets of the matching descriptions); the other
+# conditions are checked on those transactions only. There is no user interaction in this file.
+#
+import re
+from functions import *
+
+FIELDS = ['type', 'amount', 'day', 'desc']
+PREDICATE = re.compile(r'^(type|amount|day|desc)(=|<|>|~)(.*)$')
+
+
+def is_query(words):
+    '''
+    Checks if the parameters of a list command are a query, that is, any of them is a condition. The other forms of
+    the list command have no conditions.
+    :param words: parameters of the list command
+    :return: True if a parameter is a condition, False otherwise
+    '''
+    return any(PREDICATE.match(word) is not None for word in words)
+
+
+def parse_range(field, operator, value):
+    '''
+    Parses the value of a condition on the day or the amount into a range.
+    :param field: -day- or -amount-
+    :param operator: <, = or >
+    :param value: a number, or two numbers separated by .. for = (e.g. 5..10)
+    :return: (lowest, highest) pair of the values accepted, both included, None for no limit
+    '''
+    check = (lambda day: check_day(day, DAYS)) if field == 'day' else check_amount
+    if operator == '=' and '..' in value:
+        low, high = value.split('..', 1)
+        check(low)
+        check(high)
+        if int(low) > int(high):
+            raise ValueError('The start of a range should be smaller than its end!')
+        return int(low), int(high)
+    check(value)
+    if operator == '<':
+        return None, int(value) - 1
+    if operator == '>':
+        return int(value) + 1, None
+    return int(value), int(value)
+
+
+def parse_predicate(word):
+    '''
+    Parses a condition of a query.
+    :param word: condition, e.g. type=in, amount>100, day=5..10, desc=pizza, desc~izz or desc~piz*
+    :return: dictionary that represents the condition
+    '''
+    match = PREDICATE.match(word)
+    if match is None:
+        raise ValueError('Invalid condition ' + word + '!')
+    field, operator, value = match.groups()
+    predicate = {'field': field, 'operator': operator, 'text': word}
+    if field == 'type':
+        if operator != '=':
+            raise ValueError('The type can only be compared with =!')
+        check_type(value)
+        predicate['type'] = value
+    elif field == 'desc':
+        if operator != '=' and operator != '~':
+            raise ValueError('The description can only be compared with = or ~!')
+        predicate['prefix'] = operator == '~' and value.endswith('*')
+        predicate['description'] = value[:-1] if predicate['prefix'] else value
+        if predicate['description'] == '':
+            raise ValueError('The search text should not be empty!')
+    else:
+        if operator == '~':
+            raise ValueError('The ' + field + ' can only be compared with <, = or >!')
+        predicate['low'], predicate['high'] = parse_range(field, operator, value)
+    return predicate
+
+
+def parse_query(words):
+    '''
+    Parses the conditions of a query.
+    :param words: conditions
+    :return: list of conditions
+    '''
+    return [parse_predicate(word) for word in words]
+
+
+def check_predicate(transaction, predicate):
+    '''
+    Checks if a transaction satisfies a condition.
+    :param transaction: transaction to check
+    :param predicate: condition to check
+    :return: True if the condition holds, False otherwise
+    '''
+    field = predicate['field']
+    if field == 'type':
+        return get_type(transaction) == predicate['type']
+    if field == 'desc':
+        description = get_description(transaction)
+        if predicate['operator'] == '=':
+            return description == predicate['description']
+        if predicate['prefix']:
+            return description.startswith(predicate['description'])
+        return predicate['description'] in description
+    value = get_day(transaction) if field == 'day' else get_amount(transaction)
+    return (predicate['low'] is None or value >= predicate['low']) and \
+        (predicate['high'] is None or value <= predicate['high'])
+
+
+def get_predicate_descriptions(index, predicate):
+    '''
+    Finds the descriptions that satisfy a condition on the description.
+    :param index: index of the current transactions
+    :param predicate: condition on the description
+    :return: list of the descriptions found
+    '''
+    if predicate['operator'] == '=':
+        return [predicate['description']] if predicate['description'] in index['buckets']['descriptions'] else []
+    return find_descriptions(index, predicate['description'], predicate['prefix'])
+
+
+def get_amount_positions(index, predicate):
+    '''
+    Finds the transactions that satisfy a condition on the amount in the list sorted by amount.
+    :param index: index of the current transactions
+    :param predicate: condition on the amount
+    :return: start and end (exclusive) positions in the sorted list
+    '''
+    start = 0
+    end = len(get_sorted_amounts(index))
+    if predicate['low'] is not None:
+        start = get_amount_range(index, '<', predicate['low'])[1]
+    if predicate['high'] is not None:
+        end = get_amount_range(index, '>', predicate['high'])[0]
+    return start, max(start, end)
+
+
+def get_day_range(predicate):
+    '''
+    Gets the days accepted by a condition on the day.
+    :param predicate: condition on the day
+    :return: (first day, last day) pair, an empty range if no day is accepted
+    '''
+    low = 1 if predicate['low'] is None else max(predicate['low'], 1)
+    high = DAYS if predicate['high'] is None else min(predicate['high'], DAYS)
+    return low, high
+
+
+def estimate_rows(transactions, index, predicate):
+    '''
+    Counts, from the index, the transactions read when a condition is used to access them.
+    :param transactions: list of current transactions
+    :param index: index of the current transactions
+    :param predicate: condition used, None for reading all transactions
+    :return: number of transactions read
+    '''
+    if predicate is None:
+        return len(transactions)
+    field = predicate['field']
+    if field == 'type':
+        return count_type(transactions, predicate['type'], index)
+    if field == 'desc':
+        return sum(len(index['buckets']['descriptions'][description])
+                   for description in get_predicate_descriptions(index, predicate))
+    if field == 'amount':
+        start, end = get_amount_positions(index, predicate)
+        return end - start
+    low, high = get_day_range(predicate)
+    if low > high:
+        return 0
+    return fenwick_sum(index['balances']['counts'], high) - fenwick_sum(index['balances']['counts'], low - 1)
+
+
+def read_rows(transactions, index, predicate):
+    '''
+    Reads the transactions that satisfy the condition used to access them, counting them in the index (see
+    scan_transactions).
+    :param transactions: list of current transactions
+    :param index: index of the current transactions
+    :param predicate: condition used, None for reading all transactions
+    :return: iterable of the transactions read
+    '''
+    if predicate is None:
+        return scan_transactions(index, transactions)
+    field = predicate['field']
+    if field == 'type':
+        return scan_transactions(index, (transaction for key, bucket in index['buckets']['keys'].items()
+                                         if key[1] == predicate['type'] for transaction in bucket.values()))
+    if field == 'desc':
+        return scan_transactions(index, (transaction for description in get_predicate_descriptions(index, predicate)
+                                         for transaction in index['buckets']['descriptions'][description].values()))
+    if field == 'amount':
+        return get_amounts_between(index, *get_amount_positions(index, predicate))
+    low, high = get_day_range(predicate)
+    return scan_transactions(index, (transaction for day in range(low, high + 1)
+                                     for transaction in get_day_bucket(index, day).values()))
+
+
+def plan_query(transactions, predicates, index):
+    '''
+    Chooses how to run a query: every condition, and reading all transactions, is a way to access the transactions,
+    and the one that reads the fewest is chosen. The other conditions are checked on the transactions it reads.
+    :param transactions: list of current transactions
+    :param predicates: conditions of the query
+    :param index: index of the current transactions
+    :return: dictionary with the ways to access the transactions as (condition, rows) pairs, the position of the
+    chosen one and the conditions left to check
+    '''
+    paths = [(predicate, estimate_rows(transactions, index, predicate)) for predicate in predicates]
+    paths.append((None, len(transactions)))
+    chosen = min(range(len(paths)), key=lambda position: paths[position][1])
+    return {'paths': paths, 'chosen': chosen,
+            'filters': [predicate for position, predicate in enumerate(predicates) if position != chosen]}
+
+
+def run_query(transactions, plan, index):
+    '''
+    Runs a planned query.
+    :param transactions: list of current transactions
+    :param plan: plan returned by plan_query
+    :param index: index of the current transactions
+    :return: list of the transactions found, in order of day
+    '''
+    filters = plan['filters']
+    found = [transaction for transaction in read_rows(transactions, index, plan['paths'][plan['chosen']][0])
+             if all(check_predicate(transaction, predicate) for predicate in filters)]
+    found.sort(key=get_day)
+    return found
+
+
+def count_query(transactions, words, index):
+    '''
+    Counts the transactions that satisfy all conditions of a query.
+    :param transactions: list of current transactions
+    :param words: conditions of the query
+    :param index: index of the current transactions
+    :return: number of transactions found
+    '''
+    predicates = parse_query(words)
+    plan = plan_query(transactions, predicates, index)
+    if len(plan['filters']) == 0:
+        return plan['paths'][plan['chosen']][1]
+    return len(run_query(transactions, plan, index))
+
+
+def list_query(transactions, words, index):
+    '''
+    Lists the transactions that satisfy all conditions of a query.
+    :param transactions: list of current transactions
+    :param words: conditions of the query
+    :param index: index of the current transactions
+    :return: list of the transactions found, in order of day
+    '''
+    found = run_query(transactions, plan_query(transactions, parse_query(words), index), index)
+    if len(found) == 0:
+        raise ValueError('There are no transactions that satisfy the conditions!')
+    return found
+
+
+def explain_query(transactions, words, index):
+    '''
+    Plans a query without running it.
+    :param transactions: list of current transactions
+    :param words: conditions of the query
+    :param index: index of the current transactions
+    :return: plan of the query (see plan_query)
+    '''
+    return plan_query(transactions, parse_query(words), index)
+
+
+def test_query():
+    transactions = [{'day': 3, 'amount': 10, 'type': 'out', 'description': 'pizza'},
+                    {'day': 3, 'amount': 200, 'type': 'in', 'description': 'salary'},
+                    {'day': 5, 'amount': 40, 'type': 'out', 'description': 'pizzeria'},
+                    {'day': 9, 'amount': 150, 'type': 'in', 'description': 'gift'},
+                    {'day': 1, 'amount': 120, 'type': 'out', 'description': 'pizza'}]
+    index = create_index(transactions)
+    assert is_query(['type=in', 'amount>100']) and not is_query(['<', '100']) and not is_query([])
+    assert list_query(transactions, ['type=out', 'desc~pizz*'], index) == [transactions[4], transactions[0],
+                                                                          transactions[2]]
+    assert list_query(transactions, ['amount>100', 'day=2..10'], index) == [transactions[1], transactions[3]]
+    assert count_query(transactions, ['desc=pizza', 'amount<100'], index) == 1
+    assert count_query(transactions, ['type=in'], index) == 2
+    plan = explain_query(transactions, ['type=in', 'day=5', 'desc~izz'], index)
+    assert [rows for predicate, rows in plan['paths']] == [2, 1, 3, 5]
+    assert plan['chosen'] == 1 and [predicate['text'] for predicate in plan['filters']] == ['type=in', 'desc~izz']
+    assert count_query(transactions, ['amount=40..40', 'amount>39'], index) == 1
+    for words in [['type=in', 'foo'], ['type<in'], ['day=32'], ['amount=9..3'], ['desc>a'], ['desc~*']]:
+        try:
+            count_query(transactions, words, index)
+            assert False
+        except ValueError:
+            pass
+    try:
+        list_query(transactions, ['type=in', 'desc=pizza'], index)
+        assert False
+    except ValueError as ve:
+        assert str(ve) == 'There are no transactions that satisfy the conditions!'
+    transactions.append(create_transaction(DAYS, 5, 'in', 'tip'))
+    index = create_index(transactions)
+    assert list_query(transactions, ['day=31'], index) == [transactions[5]]
+    assert count_query(transactions, ['day>30', 'type=in'], index) == 1
+
+
+def query_tests():
+    test_query()
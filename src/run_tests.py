@@ -0,0 +1,25 @@
+#
+# This module runs every test of the program, including those that open network sockets or start worker processes,
+# which the program's start leaves out so that it does not depend on them.
+#
+from functions import tests
+from storage import storage_tests
+from stats import stats_tests
+from journal import journal_tests
+from server import server_tests
+from accounts import accounts_tests
+from query import query_tests
+from analytics import analytics_tests
+from archive import archive_tests
+
+
+tests()
+storage_tests()
+stats_tests()
+journal_tests()
+server_tests()
+accounts_tests()
+query_tests()
+analytics_tests()
+archive_tests()
+print('all tests passed')
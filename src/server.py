@@ -0,0 +1,208 @@
+#
+# Network access to the program: an asyncio TCP server that reads one command per line, with the same syntax as the
+# menu, and answers with what the command prints followed by a line -ok-, or with a line -error: <message>-.
+# Commands that modify the transactions go through a queue to a single writer task, so they are applied one at a time
+# in the order they arrived. Other commands run as soon as they are read, between two changes. Clients may send many
+# commands without waiting for the answers; the answers come back in the same order. Batches are refused: there is
+# one history for all clients, so a batch would take in the changes of the other clients too.
+#
+import asyncio
+import contextlib
+import io
+from functions import create_index, handle_insert, handle_undo, split_text
+from storage import MUTATING_COMMANDS
+
+# Longest command line accepted from a client, in bytes.
+LINE_LIMIT = 1 << 20
+BATCH_COMMANDS = ['begin', 'commit', 'rollback']
+
+
+def run_captured(execute, command, parameters):
+    '''
+    Runs a command and captures what it prints. Errors other than invalid commands are answered as well, so that they
+    never stop the writer task or the task serving the client.
+    :param execute: function that receives a command and its parameters and runs it
+    :param command: command to run
+    :param parameters: parameters of the command
+    :return: answer to send to the client
+    '''
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            execute(command, parameters)
+    except ValueError as ve:
+        return 'error: ' + str(ve) + '\n'
+    except Exception as error:
+        return 'error: ' + type(error).__name__ + ': ' + str(error) + '\n'
+    return output.getvalue() + 'ok\n'
+
+
+async def write_changes(queue, execute):
+    '''
+    Applies the commands that modify the transactions, one at a time, in the order they were queued.
+    :param queue: queue of (command, parameters, future) tuples; the answer is set as the result of the future
+    :param execute: function that receives a command and its parameters and runs it
+    :return: -
+    '''
+    while True:
+        command, parameters, future = await queue.get()
+        answer = run_captured(execute, command, parameters)
+        if not future.cancelled():
+            future.set_result(answer)
+
+
+async def serve_client(reader, writer, execute, queue, clients):
+    '''
+    Answers the commands of a client until it disconnects or sends -exit-.
+    :param reader: stream the commands are read from
+    :param writer: stream the answers are written to
+    :param execute: function that receives a command and its parameters and runs it
+    :param queue: queue of the writer task
+    :param clients: set of the tasks serving clients, this one is added to it while it runs
+    :return: -
+    '''
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    clients.add(task)
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                writer.write(b'error: The command is too long!\n')
+                break
+            if len(line) == 0:
+                break
+            command, parameters = split_text(line.decode(errors='replace'))
+            if command == '':
+                continue
+            if command == 'exit':
+                break
+            if command in BATCH_COMMANDS:
+                answer = 'error: Batches cannot be used by network clients!\n'
+            elif command in MUTATING_COMMANDS:
+                future = loop.create_future()
+                queue.put_nowait((command, parameters, future))
+                answer = await future
+            else:
+                answer = run_captured(execute, command, parameters)
+            writer.write(answer.encode())
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+        clients.discard(task)
+
+
+async def start_server(host, port, execute):
+    '''
+    Starts accepting clients.
+    :param host: address to listen on
+    :param port: port to listen on, 0 for any free port
+    :param execute: function that receives a command and its parameters and runs it
+    :return: dictionary with the asyncio server, the writer task and the set of tasks serving clients
+    '''
+    queue = asyncio.Queue()
+    clients = set()
+    changes = asyncio.create_task(write_changes(queue, execute))
+    server = await asyncio.start_server(lambda reader, writer: serve_client(reader, writer, execute, queue, clients),
+                                        host, port, limit=LINE_LIMIT)
+    return {'server': server, 'changes': changes, 'clients': clients}
+
+
+async def stop_server(running):
+    '''
+    Stops accepting clients, waits for the connected ones to leave and stops the writer task.
+    :param running: server returned by start_server
+    :return: -
+    '''
+    running['server'].close()
+    await running['server'].wait_closed()
+    await asyncio.gather(*running['clients'])
+    running['changes'].cancel()
+
+
+async def serve(host, port, execute):
+    '''
+    Accepts clients until the program is interrupted.
+    :param host: address to listen on
+    :param port: port to listen on
+    :param execute: function that receives a command and its parameters and runs it
+    :return: -
+    '''
+    running = await start_server(host, port, execute)
+    try:
+        async with running['server']:
+            await running['server'].serve_forever()
+    finally:
+        running['changes'].cancel()
+
+
+async def send_commands(host, port, commands):
+    '''
+    Sends commands to a server without waiting between them, then reads all answers and leaves.
+    :param host: address of the server
+    :param port: port of the server
+    :param commands: list of command lines
+    :return: list of answers, each a list of lines ending with the -ok- or -error- line
+    '''
+    reader, writer = await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+    writer.write(''.join(command + '\n' for command in commands + ['exit']).encode())
+    await writer.drain()
+    answers = []
+    answer = []
+    while len(answers) < len(commands):
+        line = (await reader.readline()).decode()
+        if line == '':
+            break
+        answer.append(line.rstrip('\n'))
+        if line == 'ok\n' or line.startswith('error: '):
+            answers.append(answer)
+            answer = []
+    writer.close()
+    await writer.wait_closed()
+    return answers
+
+
+def test_server():
+    transactions = []
+    history = []
+    index = create_index(transactions)
+
+    def execute(command, parameters):
+        if command == 'insert':
+            handle_insert(transactions, parameters, history, index)
+        elif command == 'undo':
+            handle_undo(transactions, parameters, history, index)
+        elif command == 'count':
+            print(len(transactions))
+        elif command == 'remove':
+            raise KeyError(parameters)
+        else:
+            raise ValueError('Invalid command!')
+
+    async def run():
+        running = await start_server('127.0.0.1', 0, execute)
+        port = running['server'].sockets[0].getsockname()[1]
+        first, second = await asyncio.gather(
+            send_commands('127.0.0.1', port, ['insert 5 10 in salary'] * 500 + ['count']),
+            send_commands('127.0.0.1', port, ['insert 6 20 out pizza'] * 500 + ['insert 40 1 in x', 'nothing']))
+        last = await send_commands('127.0.0.1', port, ['count', 'remove 7', 'undo', 'count'])
+        batch = await send_commands('127.0.0.1', port, ['begin', 'insert 5 10 in salary', 'insert 40 1 in x',
+                                                         'commit', 'rollback', 'count'])
+        await stop_server(running)
+        return first, second, last, batch
+
+    first, second, last, batch = asyncio.run(run())
+    assert first[:500] == [['ok']] * 500
+    assert len(first[500]) == 2 and first[500][1] == 'ok' and 500 <= int(first[500][0]) <= 1000
+    assert second[500] == ['error: Day should be between 1 and 30!']
+    assert second[501] == ['error: Invalid command!']
+    assert last == [['1000', 'ok'], ["error: KeyError: '7'"], ['ok'], ['999', 'ok']]
+    refused = ['error: Batches cannot be used by network clients!']
+    assert batch == [refused, ['ok'], ['error: Day should be between 1 and 30!'], refused, refused, ['1000', 'ok']]
+
+
+def server_tests():
+    test_server()
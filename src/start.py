@@ -1,9 +1,17 @@
 #
-# This module is used to invoke the program's UI and start it. It should not contain a lot of code.
+# This module is used to invoke the program's UI and start it. It should not contain a lot of code. The tests that need
+# the network or worker processes are left to run_tests.py.
 #
+import sys
 from ui import *
 from functions import *
 
 
 tests()
-start_program()
+storage_tests()
+stats_tests()
+journal_tests()
+query_tests()
+analytics_tests()
+archive_tests()
+start_program(sys.argv[1:])
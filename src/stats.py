@@ -0,0 +1,219 @@
+#
+# Statistics about the commands run by the program: number of calls, latency percentiles, number of transactions they
+# looked at, memory they allocated and size of the undo history. There is no user interaction in this file.
+#
+import json
+import math
+import sys
+import time
+import tracemalloc
+
+# Latencies are counted in buckets whose bounds grow by 5%, so percentiles are exact to within 5%.
+BUCKET_GROWTH = 1.05
+PERCENTILES = [50, 95, 99]
+
+
+def create_stats(memory=False):
+    '''
+    Creates empty statistics.
+    :param memory: True to also measure the memory allocated by every command, which makes commands slower
+    :return: dictionary that represents the statistics
+    '''
+    if memory:
+        tracemalloc.start()
+    return {'memory': memory, 'commands': {}}
+
+
+def create_command_stats():
+    '''
+    Creates empty statistics for a command.
+    :return: dictionary that represents the statistics of a command
+    '''
+    return {'calls': 0, 'errors': 0, 'seconds': 0.0, 'latencies': {}, 'scanned': 0, 'changed': 0, 'allocated': 0,
+            'peak': 0}
+
+
+def get_bucket(seconds):
+    '''
+    Gets the latency bucket of a duration.
+    :param seconds: duration to use
+    :return: number of the bucket
+    '''
+    return math.floor(math.log(max(seconds, 1e-9), BUCKET_GROWTH))
+
+
+def get_percentile(latencies, calls, percentile):
+    '''
+    Computes a percentile of the latencies counted in buckets.
+    :param latencies: dictionary from bucket to number of calls
+    :param calls: total number of calls
+    :param percentile: percentile to compute, between 0 and 100
+    :return: upper bound of the bucket that holds the percentile, in seconds
+    '''
+    needed = math.ceil(calls * percentile / 100)
+    counted = 0
+    for bucket in sorted(latencies):
+        counted += latencies[bucket]
+        if counted >= needed:
+            return BUCKET_GROWTH ** (bucket + 1)
+    return 0.0
+
+
+def count_changed(transactions, history, depth):
+    '''
+    Counts the transactions changed by the command that left the history at a certain depth.
+    :param transactions: list of current transactions
+    :param history: history of changes
+    :param depth: depth of the history before the command ran
+    :return: number of transactions changed, 0 if the command did not add to the history
+    '''
+    if len(history) <= depth:
+        return 0
+    return count_change(transactions, history[-1])
+
+
+def count_change(transactions, change):
+    '''
+    Counts the transactions changed by a change of the history.
+    :param transactions: list of current transactions
+    :param change: change to count
+    :return: number of transactions changed
+    '''
+    if change['operation'] == 'batch':
+        return sum(count_change(transactions, batch_change) for batch_change in change['changes'])
+    if change['operation'] == 'remove':
+        return len(change['removed'])
+    if change['operation'] == 'replace':
+        return len(change['amounts'])
+    if change['operation'] == 'append':
+        return len(transactions) - change['position']
+    return 1
+
+
+def measure_command(stats, command, function, transactions, history, index):
+    '''
+    Runs a command and records its statistics, also when it raises an exception. The transactions it looked at are
+    the ones counted in the index while it ran (see scan_transactions).
+    :param stats: statistics to add to
+    :param command: name of the command
+    :param function: function without parameters that runs the command
+    :param transactions: list of current transactions
+    :param history: history of changes
+    :param index: index of the current transactions
+    :return: -
+    '''
+    command_stats = stats['commands'].setdefault(command, create_command_stats())
+    command_stats['calls'] += 1
+    depth = len(history)
+    scanned = index['scanned']
+    if stats['memory']:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        function()
+    except ValueError:
+        command_stats['errors'] += 1
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        command_stats['seconds'] += seconds
+        bucket = get_bucket(seconds)
+        command_stats['latencies'][bucket] = command_stats['latencies'].get(bucket, 0) + 1
+        command_stats['scanned'] += index['scanned'] - scanned
+        command_stats['changed'] += count_changed(transactions, history, depth)
+        if stats['memory']:
+            current, peak = tracemalloc.get_traced_memory()
+            command_stats['allocated'] += max(current - before, 0)
+            command_stats['peak'] = max(command_stats['peak'], peak - before)
+
+
+def get_history_size(history):
+    '''
+    Measures the undo history. Transactions referenced by the history are counted, but their memory is not, because
+    they are shared with the list or with other history entries.
+    :param history: history of changes
+    :return: number of entries, number of transactions referenced and bytes used by the entries
+    '''
+    referenced = 0
+    size = sys.getsizeof(history)
+    for change in history:
+        size += sys.getsizeof(change)
+        for key in change:
+            if isinstance(change[key], list):
+                referenced += len(change[key])
+                size += sys.getsizeof(change[key]) + sum(sys.getsizeof(pair) for pair in change[key])
+    return len(history), referenced, size
+
+
+def get_report(stats, transactions, history):
+    '''
+    Builds a report of the statistics.
+    :param stats: statistics to report
+    :param transactions: list of current transactions
+    :param history: history of changes
+    :return: dictionary with the statistics of every command and of the undo history
+    '''
+    entries, referenced, size = get_history_size(history)
+    report = {'transactions': len(transactions),
+              'history': {'entries': entries, 'transactions': referenced, 'bytes': size}, 'commands': {}}
+    for command, command_stats in stats['commands'].items():
+        calls = command_stats['calls']
+        command_report = {'calls': calls, 'errors': command_stats['errors'],
+                          'mean_seconds': command_stats['seconds'] / calls,
+                          'scanned': command_stats['scanned'], 'mean_scanned': command_stats['scanned'] / calls,
+                          'changed': command_stats['changed']}
+        for percentile in PERCENTILES:
+            command_report['p' + str(percentile) + '_seconds'] = get_percentile(command_stats['latencies'], calls,
+                                                                                percentile)
+        if stats['memory']:
+            command_report['allocated_bytes'] = command_stats['allocated']
+            command_report['peak_bytes'] = command_stats['peak']
+        report['commands'][command] = command_report
+    return report
+
+
+def write_report(stats, transactions, history, path):
+    '''
+    Writes a report of the statistics to a JSON file.
+    :param stats: statistics to report
+    :param transactions: list of current transactions
+    :param history: history of changes
+    :param path: path of the file
+    :return: -
+    '''
+    with open(path, 'w') as file:
+        json.dump(get_report(stats, transactions, history), file, indent=1)
+
+
+def test_measure_command():
+    stats = create_stats()
+    history = []
+    transactions = [1, 2, 3]
+    index = {'scanned': 0}
+    measure_command(stats, 'insert', lambda: history.append({'operation': 'insert', 'position': 3}), transactions,
+                    history, index)
+    try:
+        measure_command(stats, 'insert', lambda: int('x'), transactions, history, index)
+        assert False
+    except ValueError:
+        pass
+    report = get_report(stats, transactions, history)
+    assert report['commands']['insert']['calls'] == 2
+    assert report['commands']['insert']['errors'] == 1
+    assert report['commands']['insert']['changed'] == 1
+    assert report['commands']['insert']['scanned'] == 0
+    assert report['commands']['insert']['p50_seconds'] <= report['commands']['insert']['p99_seconds']
+    assert report['history']['entries'] == 1
+
+
+def test_get_percentile():
+    latencies = {get_bucket(0.001): 98, get_bucket(1): 2}
+    assert 0.001 <= get_percentile(latencies, 100, 50) <= 0.001 * BUCKET_GROWTH
+    assert 0.001 <= get_percentile(latencies, 100, 95) <= 0.001 * BUCKET_GROWTH
+    assert 1 <= get_percentile(latencies, 100, 99) <= BUCKET_GROWTH
+
+
+def stats_tests():
+    test_measure_command()
+    test_get_percentile()
@@ -0,0 +1,564 @@
+#
+# Persistence of the program's data. Every command that modifies the transactions is appended to a write-ahead log and
+# the whole state is periodically written to a binary snapshot. At startup, the last snapshot is loaded and the commands
+# logged after it are replayed. Transactions can also be imported from and exported to CSV and JSON lines files. There
+# is no user interaction in this file.
+#
+import csv
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from functions import *
+
+SYNC_POLICIES = ['command', 'count', 'interval']
+FILE_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.json': 'jsonl'}
+FIELDS = ['day', 'amount', 'type', 'description']
+REPORTED_ERRORS = 10
+
+
+def check_description(description):
+    '''
+    Checks if description is a single non-empty word, otherwise raises exception.
+    :param description: description to check
+    :return: -
+    '''
+    if len(str(description).split()) != 1 or str(description) != str(description).strip():
+        raise ValueError('Description should be a single word!')
+
+
+def get_file_format(path):
+    '''
+    Gets the format of an import or export file from its extension, otherwise raises exception.
+    :param path: path of the file
+    :return: -csv- or -jsonl-
+    '''
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FILE_FORMATS:
+        raise ValueError('File should have the .csv, .jsonl or .json extension!')
+    return FILE_FORMATS[extension]
+
+
+def read_rows(file, format):
+    '''
+    Reads, one at a time, the rows of an import file. A first CSV row equal to the field names is skipped.
+    :param file: open file to read from
+    :param format: -csv- or -jsonl-
+    :return: generator of (line number, row) pairs, where a row is a list of fields, or None if it cannot be read
+    '''
+    if format == 'csv':
+        reader = csv.reader(file)
+        for row in reader:
+            if reader.line_num == 1 and row == FIELDS:
+                continue
+            if len(row) > 0:
+                yield reader.line_num, row
+    else:
+        for number, line in enumerate(file, 1):
+            if line.strip() == '':
+                continue
+            try:
+                record = json.loads(line)
+                yield number, [record[field] for field in FIELDS]
+            except (ValueError, TypeError, KeyError):
+                yield number, None
+
+
+def create_row_transaction(row, checked):
+    '''
+    Checks the fields of an imported row and creates its transaction, otherwise raises exception. Days, types and
+    descriptions repeat from row to row, so the combinations already found valid are not checked again.
+    :param row: list of fields read from the file
+    :param checked: set of the (day, type, description) combinations found valid so far, added to
+    :return: created transaction
+    '''
+    if row is None or len(row) != len(FIELDS):
+        raise ValueError('Row should contain a day, an amount, a type and a description!')
+    if any(isinstance(field, bool) or not isinstance(field, (str, int)) for field in row):
+        raise ValueError('Fields should be text or integers!')
+    day, amount, type, description = row
+    if (day, type, description) not in checked:
+        check_day(day, DAYS)
+        check_type(type)
+        check_description(description)
+        checked.add((day, type, description))
+    check_amount(amount)
+    return create_transaction(day, amount, type, str(description))
+
+
+def import_transactions(transactions, path, history, index):
+    '''
+    Imports all transactions from a CSV or JSON lines file as a single change. The file is read one row at a time,
+    and if any row is invalid, nothing is imported and the invalid rows are reported.
+    :param transactions: list of current transactions
+    :param path: path of the file
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: number of imported transactions
+    '''
+    format = get_file_format(path)
+    added = []
+    errors = []
+    error_count = 0
+    checked = set()
+    try:
+        with open(path, 'r', newline='') as file:
+            for number, row in read_rows(file, format):
+                try:
+                    transaction = create_row_transaction(row, checked)
+                    if error_count == 0:
+                        added.append(transaction)
+                except ValueError as ve:
+                    error_count += 1
+                    added = []
+                    if len(errors) < REPORTED_ERRORS:
+                        errors.append('row ' + str(number) + ': ' + str(ve))
+    except (OSError, UnicodeDecodeError, csv.Error) as error:
+        raise ValueError('Cannot read file: ' + str(error))
+    if error_count > 0:
+        if error_count > len(errors):
+            errors.append('and ' + str(error_count - len(errors)) + ' more invalid rows')
+        raise ValueError('Nothing was imported!\n' + '\n'.join(errors))
+    if len(added) == 0:
+        raise ValueError('There are no transactions to import!')
+    append_transactions(transactions, added, history, index)
+    return len(added)
+
+
+def export_transactions(transactions, path):
+    '''
+    Exports all transactions to a CSV or JSON lines file.
+    :param transactions: list of current transactions
+    :param path: path of the file
+    :return: number of exported transactions
+    '''
+    format = get_file_format(path)
+    try:
+        with open(path, 'w', newline='') as file:
+            if format == 'csv':
+                writer = csv.writer(file)
+                writer.writerow(FIELDS)
+                writer.writerows([get_day(transaction), get_amount(transaction), get_type(transaction),
+                                  get_description(transaction)] for transaction in transactions)
+            else:
+                file.writelines(json.dumps(transaction) + '\n' for transaction in transactions)
+    except OSError as error:
+        raise ValueError('Cannot write file: ' + str(error))
+    return len(transactions)
+
+
+def handle_import(transactions, parameters, history, index):
+    '''
+    Handles the import command.
+    :param transactions: list of current transactions
+    :param parameters: parameters for import command
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if parameters == '':
+        raise ValueError('Invalid number of parameters for import command!')
+    if index['batch'] is not None:
+        raise ValueError('Transactions cannot be imported in a batch!')
+    import_transactions(transactions, parameters, history, index)
+
+
+def handle_export(transactions, parameters, history, index):
+    '''
+    Handles the export command.
+    :param transactions: list of current transactions
+    :param parameters: parameters for export command
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if parameters == '':
+        raise ValueError('Invalid number of parameters for export command!')
+    export_transactions(transactions, parameters)
+
+
+MUTATING_COMMANDS = {'add': handle_add, 'insert': handle_insert, 'remove': handle_remove, 'replace': handle_replace,
+                     'filter': handle_filter, 'undo': handle_undo, 'import': handle_import, 'close': handle_close,
+                     'begin': handle_begin, 'commit': handle_commit, 'rollback': handle_rollback}
+
+
+def check_sync_policy(policy, every):
+    '''
+    Checks if the log synchronization policy is valid, otherwise raises exception.
+    :param policy: -command- (sync after every command), -count- (sync after every -every- commands) or -interval-
+    (sync at most -every- seconds after a command was logged)
+    :param every: number of commands or seconds, for the -count- and -interval- policies
+    :return: -
+    '''
+    if policy not in SYNC_POLICIES:
+        raise ValueError('Sync policy should be command, count or interval!')
+    if every <= 0:
+        raise ValueError('Sync frequency should be positive!')
+
+
+def get_snapshot_path(path):
+    return path + '.snapshot'
+
+
+def get_log_path(path):
+    return path + '.log'
+
+
+def load_snapshot(path):
+    '''
+    Loads the last snapshot of a ledger.
+    :param path: path of the ledger
+    :return: generation of the snapshot, list of transactions, history of changes (empty if there is no snapshot) and
+    dictionary with the open month and the partitions of the closed months (None if there is no snapshot, or it was
+    written before months were stored)
+    '''
+    if not os.path.exists(get_snapshot_path(path)):
+        return 0, [], [], None
+    with open(get_snapshot_path(path), 'rb') as file:
+        snapshot = pickle.load(file)
+    return snapshot['generation'], snapshot['transactions'], snapshot['history'], snapshot.get('months')
+
+
+def read_log(path, generation):
+    '''
+    Reads the commands logged after the snapshot of a certain generation. A log left over from an older generation
+    is already contained in the snapshot and is ignored, and so is a last line that was not completely written.
+    :param path: path of the ledger
+    :param generation: generation of the loaded snapshot
+    :return: list of (command, parameters) pairs
+    '''
+    if not os.path.exists(get_log_path(path)):
+        return []
+    with open(get_log_path(path), 'r') as file:
+        lines = file.read().split('\n')
+    if len(lines) == 0 or lines[0] != 'generation ' + str(generation):
+        return []
+    return [split_text(line) for line in lines[1:-1]]
+
+
+def truncate_log(path):
+    '''
+    Cuts off the last line of the log if it was not completely written, so that the next logged command starts on a
+    line of its own instead of being appended to the partial one.
+    :param path: path of the ledger
+    :return: -
+    '''
+    with open(get_log_path(path), 'rb+') as file:
+        content = file.read()
+        file.truncate(content.rfind(b'\n') + 1)
+
+
+def replay_command(transactions, command, parameters, history, index):
+    '''
+    Applies a logged command again. Logged -add- commands contain the day the transaction was added to.
+    :param transactions: list of current transactions
+    :param command: logged command
+    :param parameters: parameters of the logged command
+    :param history: history of changes to add to
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if command == 'add':
+        day, amount, type, description = parameters.split()
+        insert_to_day(transactions, day, amount, type, description, history, index)
+    else:
+        MUTATING_COMMANDS[command](transactions, parameters, history, index)
+
+
+def open_storage(path, policy='command', every=1, snapshot_every=10000):
+    '''
+    Opens the storage of a ledger, recovering its transactions from the last snapshot and the log. A new ledger starts
+    with a snapshot, so that its open month is stored before any command is logged. A batch left open by the log is
+    rolled back, as it was never committed.
+    :param path: path of the ledger, used as prefix for its snapshot and log files
+    :param policy: log synchronization policy (see check_sync_policy)
+    :param every: number of commands or seconds, for the -count- and -interval- policies
+    :param snapshot_every: number of logged commands after which a new snapshot is written
+    :return: storage, list of recovered transactions, recovered history of changes and index of the transactions
+    '''
+    check_sync_policy(policy, every)
+    generation, transactions, history, months = load_snapshot(path)
+    index = create_index(transactions)
+    if months is not None:
+        restore_months(index, months['open'], months['closed'])
+    logged = read_log(path, generation)
+    for command, parameters in logged:
+        replay_command(transactions, command, parameters, history, index)
+    storage = {'path': path, 'policy': policy, 'every': every, 'snapshot_every': snapshot_every,
+               'generation': generation, 'logged': len(logged), 'pending': 0, 'last_sync': time.monotonic(),
+               'log': None, 'lock': threading.RLock(), 'timer': None}
+    if len(logged) == 0 and months is None:
+        write_snapshot(storage, transactions, history, index)
+    elif len(logged) == 0:
+        start_log(storage)
+    else:
+        truncate_log(path)
+        storage['log'] = open(get_log_path(path), 'a')
+    if index['batch'] is not None:
+        rollback_batch(transactions, history, index)
+        log_command(storage, transactions, history, 'rollback', '', index)
+    return storage, transactions, history, index
+
+
+def start_log(storage):
+    '''
+    Starts an empty log for the current generation of the storage.
+    :param storage: storage of the ledger
+    :return: -
+    '''
+    with storage['lock']:
+        if storage['log'] is not None:
+            storage['log'].close()
+        storage['log'] = open(get_log_path(storage['path']), 'w')
+        storage['log'].write('generation ' + str(storage['generation']) + '\n')
+        sync_log(storage)
+        storage['logged'] = 0
+
+
+def sync_log(storage):
+    '''
+    Forces the commands written to the log onto the disk.
+    :param storage: storage of the ledger
+    :return: -
+    '''
+    with storage['lock']:
+        storage['log'].flush()
+        os.fsync(storage['log'].fileno())
+        storage['pending'] = 0
+        storage['last_sync'] = time.monotonic()
+
+
+def sync_pending(storage):
+    '''
+    Syncs the log when the timer of the -interval- policy runs out, unless it was synced or closed meanwhile.
+    :param storage: storage of the ledger
+    :return: -
+    '''
+    with storage['lock']:
+        storage['timer'] = None
+        if storage['pending'] > 0 and not storage['log'].closed:
+            sync_log(storage)
+
+
+def schedule_sync(storage):
+    '''
+    Starts the timer that syncs the log -every- seconds after the last sync, so that commands logged on an idle ledger
+    are not left unsynced until the next command arrives.
+    :param storage: storage of the ledger
+    :return: -
+    '''
+    with storage['lock']:
+        if storage['timer'] is None:
+            delay = max(0, storage['last_sync'] + storage['every'] - time.monotonic())
+            storage['timer'] = threading.Timer(delay, sync_pending, [storage])
+            storage['timer'].daemon = True
+            storage['timer'].start()
+
+
+def write_snapshot(storage, transactions, history, index):
+    '''
+    Writes a snapshot of the transactions, the history of changes and the months, and starts a new log. The snapshot
+    is written to a temporary file first, so a crash never leaves a partial snapshot behind. Closed months read from an
+    archive are left out, the archive keeps them.
+    :param storage: storage of the ledger
+    :param transactions: list of current transactions
+    :param history: history of changes
+    :param index: index of the current transactions, which holds the open month and the closed months
+    :return: -
+    '''
+    snapshot_path = get_snapshot_path(storage['path'])
+    descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(snapshot_path)))
+    with os.fdopen(descriptor, 'wb') as file:
+        pickle.dump({'generation': storage['generation'] + 1, 'transactions': transactions, 'history': history,
+                     'months': {'open': index['months']['open'],
+                                'closed': {month: partition for month, partition in index['months']['closed'].items()
+                                           if 'archive' not in partition}}},
+                    file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, snapshot_path)
+    storage['generation'] += 1
+    start_log(storage)
+
+
+def log_command(storage, transactions, history, command, parameters, index):
+    '''
+    Appends a command that modified the transactions to the log, syncing the log according to the storage's policy
+    and writing a snapshot when enough commands were logged, unless a batch is open. The log is flushed after every
+    command, so a crash of the program alone loses nothing; the policy decides when it is forced onto the disk. An
+    import is not logged, because the imported file may change before the log is replayed; a snapshot is written
+    instead.
+    :param storage: storage of the ledger
+    :param transactions: list of current transactions, already modified by the command
+    :param history: history of changes
+    :param command: command to log
+    :param parameters: parameters of the command
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if command == 'import':
+        write_snapshot(storage, transactions, history, index)
+        return
+    if command == 'add':
+        parameters = str(get_day(transactions[-1])) + ' ' + parameters
+    with storage['lock']:
+        storage['log'].write(command + ' ' + parameters + '\n')
+        storage['log'].flush()
+        storage['logged'] += 1
+        storage['pending'] += 1
+        policy = storage['policy']
+        if policy == 'command' or (policy == 'count' and storage['pending'] >= storage['every']) \
+                or (policy == 'interval' and time.monotonic() - storage['last_sync'] >= storage['every']):
+            sync_log(storage)
+        elif policy == 'interval':
+            schedule_sync(storage)
+    if storage['logged'] >= storage['snapshot_every'] and index['batch'] is None:
+        write_snapshot(storage, transactions, history, index)
+
+
+def close_storage(storage, transactions, history, index):
+    '''
+    Closes the storage of a ledger, writing a final snapshot so the next start does not have to replay the log. A batch
+    that is still open is rolled back first.
+    :param storage: storage of the ledger
+    :param transactions: list of current transactions
+    :param history: history of changes
+    :param index: index of the current transactions
+    :return: -
+    '''
+    if index['batch'] is not None:
+        rollback_batch(transactions, history, index)
+        log_command(storage, transactions, history, 'rollback', '', index)
+    if storage['logged'] > 0:
+        write_snapshot(storage, transactions, history, index)
+    with storage['lock']:
+        if storage['timer'] is not None:
+            storage['timer'].cancel()
+        storage['log'].close()
+
+
+def test_storage():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'ledger')
+        storage, transactions, history, index = open_storage(path, 'count', 2, 3)
+        assert transactions == [] and history == []
+        handle_insert(transactions, '5 100 in salary', history, index)
+        log_command(storage, transactions, history, 'insert', '5 100 in salary', index)
+        handle_add(transactions, '20 out pizza', history, index)
+        log_command(storage, transactions, history, 'add', '20 out pizza', index)
+        assert storage['generation'] == 1
+        handle_remove(transactions, 'in', history, index)
+        log_command(storage, transactions, history, 'remove', 'in', index)
+        assert storage['generation'] == 2
+        handle_undo(transactions, '', history, index)
+        log_command(storage, transactions, history, 'undo', '', index)
+        sync_log(storage)
+        expected = [dict(transaction) for transaction in transactions]
+        storage['log'].close()
+        storage, transactions, history, index = open_storage(path)
+        assert transactions == expected
+        assert len(history) == 2
+        handle_undo(transactions, '', history, index)
+        handle_undo(transactions, '', history, index)
+        assert transactions == []
+        close_storage(storage, transactions, history, index)
+        storage, transactions, history, index = open_storage(path)
+        assert transactions == [] and history == []
+        handle_insert(transactions, '5 100 in salary', history, index)
+        log_command(storage, transactions, history, 'insert', '5 100 in salary', index)
+        handle_close(transactions, '', history, index)
+        log_command(storage, transactions, history, 'close', '', index)
+        month = index['months']['open']
+        storage['log'].close()
+        storage, transactions, history, index = open_storage(path)
+        assert index['months']['open'] == month and transactions == []
+        assert list_balance_day(transactions, '1', index) == 100
+        handle_begin(transactions, '', history, index)
+        log_command(storage, transactions, history, 'begin', '', index)
+        handle_insert(transactions, '6 20 out pizza', history, index)
+        log_command(storage, transactions, history, 'insert', '6 20 out pizza', index)
+        storage['log'].close()
+        storage, transactions, history, index = open_storage(path)
+        assert transactions == [] and index['batch'] is None
+        handle_insert(transactions, '7 30 in gift', history, index)
+        log_command(storage, transactions, history, 'insert', '7 30 in gift', index)
+        storage['log'].write('remove 7')
+        storage['log'].close()
+        storage, transactions, history, index = open_storage(path)
+        assert transactions == [{'day': 7, 'amount': 30, 'type': 'in', 'description': 'gift'}]
+        handle_insert(transactions, '8 1 in x', history, index)
+        log_command(storage, transactions, history, 'insert', '8 1 in x', index)
+        storage['log'].close()
+        storage, transactions, history, index = open_storage(path)
+        assert len(transactions) == 2 and get_description(transactions[1]) == 'x'
+        storage['log'].close()
+        storage, transactions, history, index = open_storage(path, 'interval', 0.02)
+        handle_insert(transactions, '9 2 in y', history, index)
+        log_command(storage, transactions, history, 'insert', '9 2 in y', index)
+        with open(get_log_path(path), 'r') as file:
+            assert file.read().endswith('insert 9 2 in y\n')
+        waited = 0
+        while storage['pending'] > 0 and waited < 200:
+            time.sleep(0.01)
+            waited += 1
+        assert storage['pending'] == 0 and storage['timer'] is None
+        close_storage(storage, transactions, history, index)
+
+
+def test_import_transactions():
+    with tempfile.TemporaryDirectory() as directory:
+        transactions = [create_transaction('7', '23', 'out', 'pizza')]
+        history = []
+        index = create_index(transactions)
+        path = os.path.join(directory, 'valid.csv')
+        with open(path, 'w') as file:
+            file.write('day,amount,type,description\n4,50,in,salary\n7,12,out,coffee\n')
+        assert import_transactions(transactions, path, history, index) == 2
+        assert transactions[1:] == [{'day': 4, 'amount': 50, 'type': 'in', 'description': 'salary'},
+                                    {'day': 7, 'amount': 12, 'type': 'out', 'description': 'coffee'}]
+        assert len(history) == 1
+        path = os.path.join(directory, 'invalid.jsonl')
+        with open(path, 'w') as file:
+            file.write('{"day": 4, "amount": 5, "type": "in", "description": "gift"}\n{"day": 40}\n'
+                       '{"day": 40, "amount": 5, "type": "in", "description": "gift"}\n'
+                       '{"day": 4, "amount": 5, "type": "in", "description": 5}\n'
+                       '{"day": 4, "amount": 5.5, "type": "in", "description": "gift"}\n'
+                       '{"day": 4, "amount": 5, "type": "in", "description": ["gift"]}\n'
+                       '{"day": 4, "amount": true, "type": "in", "description": "gift"}\n')
+        try:
+            import_transactions(transactions, path, history, index)
+            assert False
+        except ValueError as ve:
+            assert str(ve) == 'Nothing was imported!\nrow 2: Row should contain a day, an amount, a type and a ' \
+                              'description!\nrow 3: Day should be between 1 and 31!\nrow 5: Fields should be text ' \
+                              'or integers!\nrow 6: Fields should be text or integers!\nrow 7: Fields should be ' \
+                              'text or integers!'
+        assert len(transactions) == 3
+        assert len(history) == 1
+        handle_undo(transactions, '', history, index)
+        assert transactions == [{'day': 7, 'amount': 23, 'type': 'out', 'description': 'pizza'}]
+        path = os.path.join(directory, 'numbers.jsonl')
+        with open(path, 'w') as file:
+            file.write('{"day": 4, "amount": 5, "type": "in", "description": 5}\n')
+        import_transactions(transactions, path, history, index)
+        assert transactions[1] == {'day': 4, 'amount': 5, 'type': 'in', 'description': '5'}
+
+
+def test_export_transactions():
+    with tempfile.TemporaryDirectory() as directory:
+        transactions = [create_transaction('7', '23', 'out', 'pizza'), create_transaction('4', '50', 'in', 'salary'),
+                        create_transaction(DAYS, '9', 'out', 'soda')]
+        for name in ['ledger.csv', 'ledger.jsonl']:
+            path = os.path.join(directory, name)
+            assert export_transactions(transactions, path) == 3
+            imported = []
+            import_transactions(imported, path, [], create_index(imported))
+            assert imported == transactions
+
+
+def storage_tests():
+    test_storage()
+    test_import_transactions()
+    test_export_transactions()
@@ -1,69 +1,615 @@
 #
 # This is the program's UI module. The user interface and all interaction with the user (print and input statements) are found here
 #
+import argparse
+import asyncio
+import itertools
+import sys
+from accounts import *
+from analytics import *
+from archive import *
 from functions import *
+from journal import *
+from query import *
+from server import *
+from storage import *
+from stats import *
 
 
-def print_transactions(transactions):
+PRINT_CHUNK = 4096
+
+
+def print_transactions(transactions, format=to_string):
+    lines = []
     for transaction in transactions:
-        print(to_string(transaction))
+        lines.append(format(transaction))
+        if len(lines) == PRINT_CHUNK:
+            sys.stdout.write('\n'.join(lines) + '\n')
+            lines = []
+    if len(lines) > 0:
+        sys.stdout.write('\n'.join(lines) + '\n')
+
+
+def print_page(transactions, offset, limit, format=to_string):
+    if limit is None:
+        print_transactions(itertools.islice(transactions, offset, None), format)
+    else:
+        print_transactions(itertools.islice(transactions, offset, offset + limit), format)
 
 
-def handle_list(transactions, parameters, history):
+def parse_paging(parameters):
+    offset = 0
+    limit = None
+    paged = False
+    while len(parameters) >= 2 and (parameters[-2] == 'limit' or parameters[-2] == 'offset'):
+        if not parameters[-1].isnumeric():
+            raise ValueError('Limit and offset should be positive integers!')
+        if parameters[-2] == 'limit':
+            limit = int(parameters[-1])
+        else:
+            offset = int(parameters[-1])
+        paged = True
+        parameters = parameters[:-2]
+    return parameters, offset, limit, paged
+
+
+def print_plan(plan):
+    for position, (predicate, rows) in enumerate(plan['paths']):
+        line = 'path: ' + ('scan' if predicate is None else predicate['text']) + '   estimated rows: ' + str(rows)
+        if position == plan['chosen']:
+            line += '   chosen'
+        print(line)
+    print('filter: ' + (' '.join(predicate['text'] for predicate in plan['filters']) or 'none'))
+
+
+def handle_list(transactions, parameters, history, index):
     parameters = parameters.split()
-    if len(parameters) == 0:
-        print_transactions(list_all(transactions))
+    if len(parameters) > 0 and parameters[0] == 'explain':
+        if not is_query(parameters[1:]):
+            raise ValueError('Only queries can be explained, e.g. list explain type=in amount>100!')
+        print_plan(explain_query(transactions, parameters[1:], index))
+        return
+    count = len(parameters) > 0 and parameters[0] == 'count'
+    if count:
+        parameters = parameters[1:]
+    parameters, offset, limit, paged = parse_paging(parameters)
+    if is_query(parameters):
+        if count:
+            print(count_query(transactions, parameters, index))
+        else:
+            print_page(list_query(transactions, parameters, index), offset, limit)
+    elif 4 <= len(parameters) <= 7 and parameters[0] == 'from' and parameters[2] == 'to':
+        start = parse_date(parameters[1], index)
+        end = parse_date(parameters[3], index)
+        type = None
+        if len(parameters) == 5 or len(parameters) == 7:
+            type = parameters[4]
+            check_type(type)
+        condition = None
+        amount = None
+        if len(parameters) >= 6:
+            condition = parameters[-2]
+            amount = parameters[-1]
+            if condition != '<' and condition != '=' and condition != '>':
+                raise ValueError('The condition on the amount should be <, = or >!')
+            check_amount(amount)
+        if count:
+            print(count_between_dates(transactions, start, end, index, type, condition, amount))
+        else:
+            print_page(list_between_dates(transactions, start, end, index, type, condition, amount), offset, limit,
+                       lambda found: to_date_string(*found))
+    elif len(parameters) == 0:
+        if count:
+            print(len(transactions))
+        else:
+            print_page(scan_transactions(index, list_all(transactions)), offset, limit)
     elif len(parameters) == 1:
-        type = parameters[0]
-        check_type(type)
-        print_transactions(list_type(transactions, type))
+        if parameters[0] == 'balances':
+            if count or paged:
+                raise ValueError('Balances cannot be counted or paged!')
+            for day, balance in list_balances(transactions, index):
+                print('day: ' + str(day) + '   balance: ' + str(balance))
+        elif parameters[0] == 'months':
+            if count or paged:
+                raise ValueError('Months cannot be counted or paged!')
+            for month, number, balance, closed in list_months(transactions, index):
+                print('month: ' + month + '   transactions: ' + str(number) + '   balance: ' + str(balance) + '   '
+                      + ('closed' if closed else 'open'))
+        else:
+            type = parameters[0]
+            check_type(type)
+            if count:
+                print(count_type(transactions, type, index))
+            else:
+                print_page(list_type(transactions, type, index), offset, limit)
     elif len(parameters) == 2:
         if parameters[0] == '<' or parameters[0] == '=' or parameters[0] == '>':
             condition = parameters[0]
             amount = parameters[1]
             check_amount(amount)
-            print_transactions(list_condition_amount(transactions, condition, amount))
+            if count:
+                print(count_condition_amount(transactions, condition, amount, index))
+            else:
+                print_page(list_condition_amount(transactions, condition, amount, index), offset, limit)
         elif parameters[0] == 'balance':
-            day = parameters[1]
-            check_day(day)
-            print(list_balance_day(transactions, day))
+            if count or paged:
+                raise ValueError('Balances cannot be counted or paged!')
+            month, day = parse_date(parameters[1], index)
+            print(list_balance_date(transactions, month, day, index))
         else:
             raise ValueError('-List- command should contain -[<|=|>]- or -balance- keyword!')
+    elif len(parameters) == 3:
+        if parameters[1] == 'to':
+            low = parameters[0]
+            check_amount(low)
+            high = parameters[2]
+            check_amount(high)
+            if int(low) > int(high):
+                raise ValueError('Low amount should be smaller than high amount!')
+            if count:
+                print(count_between_amounts(transactions, low, high, index))
+            else:
+                print_page(list_between_amounts(transactions, low, high, index), offset, limit)
+        else:
+            raise ValueError('-List- command should contain -to- keyword!')
     else:
         raise ValueError('Invalid number of parameters for any list command!')
 
 
+def handle_search(transactions, parameters, history, index):
+    parameters = parameters.split()
+    count = len(parameters) > 1 and parameters[0] == 'count'
+    if count:
+        parameters = parameters[1:]
+    parameters, offset, limit, paged = parse_paging(parameters)
+    if len(parameters) == 0:
+        raise ValueError('Invalid number of parameters for search command!')
+    text = parameters[0]
+    prefix = text.endswith('*')
+    if prefix:
+        text = text[:-1]
+    parameters = parameters[1:]
+    type = None
+    if len(parameters) > 0 and parameters[0] in TYPES:
+        type = parameters[0]
+        parameters = parameters[1:]
+    condition = None
+    amount = None
+    if len(parameters) == 2:
+        condition = parameters[0]
+        if condition != '<' and condition != '=' and condition != '>':
+            raise ValueError('-Search- command should contain -[<|=|>]- keyword!')
+        amount = parameters[1]
+        check_amount(amount)
+    elif len(parameters) != 0:
+        raise ValueError('Invalid number of parameters for search command!')
+    if count:
+        print(count_search(transactions, text, prefix, index, type, condition, amount))
+    else:
+        print_page(list_search(transactions, text, prefix, index, type, condition, amount), offset, limit)
+
+
+def to_aggregate_string(aggregate):
+    return 'in: ' + str(get_aggregate_total(aggregate, 'in')) + ' (' + str(get_aggregate_count(aggregate, 'in')) + \
+        ')   out: ' + str(get_aggregate_total(aggregate, 'out')) + ' (' + str(get_aggregate_count(aggregate, 'out')) + \
+        ')   net: ' + str(get_aggregate_net(aggregate))
+
+
+def handle_summary(transactions, parameters, history, index):
+    parameters = parameters.split()
+    if len(parameters) == 0:
+        aggregate, balance = get_summary(transactions, index)
+        print(to_aggregate_string(aggregate) + '   balance: ' + str(balance))
+    elif len(parameters) == 2 and parameters[0] == 'by':
+        if parameters[1] == 'day':
+            for day, aggregate in get_summary_by_day(transactions, index):
+                print('day: ' + str(day) + '   ' + to_aggregate_string(aggregate))
+        elif parameters[1] == 'description':
+            for description, aggregate in get_summary_by_description(transactions, index):
+                print('description: ' + description + '   ' + to_aggregate_string(aggregate))
+        else:
+            raise ValueError('Summaries are by -day- or by -description-!')
+    else:
+        raise ValueError('Invalid number of parameters for any summary command!')
+
+
+def print_month_report(report):
+    for day, balance in report['balances']:
+        print('day: ' + str(day) + '   balance: ' + str(balance))
+    print(to_aggregate_string(report['summary']))
+    for low, count in report['histogram']:
+        print('amounts from ' + str(low) + ': ' + str(count))
+
+
+def parse_report(parameters, index):
+    parameters = parameters.split()
+    month = index['months']['open']
+    if len(parameters) > 0 and not parameters[0].isnumeric():
+        month = parse_month(parameters[0])
+        parameters = parameters[1:]
+    if len(parameters) == 0:
+        return month, 100
+    if len(parameters) != 1:
+        raise ValueError('Invalid number of parameters for report command!')
+    check_amount(parameters[0])
+    if int(parameters[0]) == 0:
+        raise ValueError('The width of the amount ranges should be greater than 0!')
+    return month, int(parameters[0])
+
+
+def handle_report(transactions, parameters, history, index):
+    month, width = parse_report(parameters, index)
+    if month == index['months']['open']:
+        print_month_report(get_month_report(transactions, width, index))
+    else:
+        print_month_report(get_closed_month_report(index, month, width))
+
+
+def handle_vectorized_report(transactions, parameters, history, index):
+    month, width = parse_report(parameters, index)
+    if month == index['months']['open']:
+        print_month_report(get_month_report(transactions, width, index))
+    else:
+        print_month_report(get_vectorized_closed_month_report(index, month, width))
+
+
+def handle_ranking(transactions, parameters, index, largest):
+    parameters = parameters.split()
+    if len(parameters) == 0 or not parameters[0].isnumeric() or int(parameters[0]) == 0:
+        raise ValueError('Count should be a positive integer!')
+    count = parameters[0]
+    if parameters[1:] == ['descriptions', 'by', 'spend']:
+        for description, spend in list_top_descriptions(transactions, count, largest, index):
+            print('description: ' + description + '   spend: ' + str(spend))
+    elif len(parameters) <= 2:
+        type = None
+        if len(parameters) == 2:
+            type = parameters[1]
+            check_type(type)
+        print_transactions(list_top(transactions, count, type, largest, index))
+    else:
+        raise ValueError('Invalid parameters for top and bottom commands!')
+
+
+def handle_top(transactions, parameters, history, index):
+    handle_ranking(transactions, parameters, index, True)
+
+
+def handle_bottom(transactions, parameters, history, index):
+    handle_ranking(transactions, parameters, index, False)
+
+
 def print_menu():
     print("\n     add <value> <type> <description>")
-    print("     insert <day> <value> <type> <description>")
-    print("     remove <day>")
-    print("     remove <start day> to <end day>")
+    print("     insert <date> <value> <type> <description>")
+    print("     remove <date>")
+    print("     remove <start date> to <end date>")
     print("     remove <type>")
-    print("     replace <day> <type> <description> with <value>")
+    print("     replace <date> <type> <description> with <value>")
+    print("     replace all <date> <type> <description> with <value>")
     print("     list")
     print("     list <type>")
     print("     list [ < | = | > ] <value>")
-    print("     list balance <day>")
+    print("     list <low value> to <high value>")
+    print("     list balance <date>")
+    print("     list balances")
+    print("     list from <start date> to <end date> [<type>] [ < | = | > <value>]")
+    print("     list months")
+    print("     list [type=<type>] [amount[<|=|>]<value>] [day=<day>[..<day>]] [desc[=|~]<text>[*]]")
+    print("     list explain <conditions>")
+    print("     list count ...")
+    print("     list ... limit <count> offset <count>")
+    print("     search <text>[*] [<type>] [ [ < | = | > ] <value>]")
+    print("     search count ...")
+    print("     summary")
+    print("     summary by day")
+    print("     summary by description")
+    print("     report [<month>] [<amount range width>]")
+    print("     top <count> [<type>]")
+    print("     bottom <count> [<type>]")
+    print("     top <count> descriptions by spend")
+    print("     bottom <count> descriptions by spend")
     print("     filter <type>")
     print("     filter <type> <value>")
-    print("     undo\n")
+    print("     undo")
+    print("     close")
+    print("     begin")
+    print("     commit")
+    print("     rollback")
+    print("     import <file>")
+    print("     export <file>")
+    print("     archive <file>")
+    print("     history")
+    print("     use <account>")
+    print("     accounts")
+    print("     accounts balances")
+    print("     accounts below <value>")
+    print("     accounts largest <count>")
+    print("     stats\n")
+
+
+COMMANDS = {'add': handle_add, 'insert': handle_insert, 'remove': handle_remove, 'replace': handle_replace,
+            'list': handle_list, 'search': handle_search, 'summary': handle_summary, 'filter': handle_filter,
+            'undo': handle_undo, 'import': handle_import, 'export': handle_export, 'close': handle_close,
+            'begin': handle_begin, 'commit': handle_commit, 'rollback': handle_rollback, 'report': handle_report,
+            'top': handle_top, 'bottom': handle_bottom, 'archive': handle_archive}
+ANALYTICS_COMMANDS = {'filter': handle_vectorized_filter, 'report': handle_vectorized_report}
+
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description='Bank account management.')
+    parser.add_argument('--ledger', help='keep the transactions in this ledger (snapshot and log files with this prefix)')
+    parser.add_argument('--sync', choices=SYNC_POLICIES, default='command',
+                        help='sync the log after every command, after every N commands or every N seconds')
+    parser.add_argument('--sync-every', type=float, default=1, help='N for the count and interval sync policies')
+    parser.add_argument('--snapshot-every', type=int, default=10000, help='write a snapshot every N logged commands')
+    parser.add_argument('--batch', metavar='FILE', help='run the commands from this file (- for standard input)')
+    parser.add_argument('--stop-on-error', action='store_true', help='stop the batch at the first invalid command')
+    parser.add_argument('--serve', metavar='PORT', type=int, help='answer the commands of network clients on this port')
+    parser.add_argument('--host', default='127.0.0.1', help='address the server listens on')
+    parser.add_argument('--accounts', metavar='SHARDS', type=int,
+                        help='manage several accounts, spread over this many worker processes')
+    parser.add_argument('--analytics', action='store_true',
+                        help='compute reports and filters on NumPy arrays (needs NumPy)')
+    parser.add_argument('--archive', metavar='FILE', help='read closed months from this archive (see archive command)')
+    parser.add_argument('--drop-archived', action='store_true',
+                        help='drop from the ledger the closed months that the archive holds')
+    parser.add_argument('--stats', action='store_true', help='measure every command (shown by the stats command)')
+    parser.add_argument('--stats-memory', action='store_true', help='also measure the memory allocated by commands')
+    parser.add_argument('--stats-file', help='write the statistics to this JSON file at exit')
+    parser.add_argument('--history-budget', type=int, help='keep at most this many bytes of undo history in memory')
+    parser.add_argument('--history-depth', type=int, help='keep at most this many changes that can be undone')
+    parser.add_argument('--history-file', help='spill older undo history to this file (default: next to the ledger)')
+    return parser.parse_args(arguments)
+
+
+def print_stats(stats, transactions, history):
+    report = get_report(stats, transactions, history)
+    print('transactions: ' + str(report['transactions']) + '   history entries: ' + str(report['history']['entries'])
+          + '   history transactions: ' + str(report['history']['transactions']) + '   history bytes: '
+          + str(report['history']['bytes']))
+    for command, command_report in report['commands'].items():
+        line = command + ': calls: ' + str(command_report['calls']) + '   errors: ' + str(command_report['errors'])
+        for percentile in PERCENTILES:
+            line += '   p' + str(percentile) + ': ' + '%.6f' % command_report['p' + str(percentile) + '_seconds'] + 's'
+        line += '   mean scanned: ' + str(round(command_report['mean_scanned'])) + '   changed: ' \
+                + str(command_report['changed'])
+        if stats['memory']:
+            line += '   allocated bytes: ' + str(command_report['allocated_bytes']) + '   peak bytes: ' \
+                    + str(command_report['peak_bytes'])
+        print(line)
+
+
+def print_history(journal, history):
+    report = get_journal_report(journal, history)
+    print('history depth: ' + str(report['depth']) + '   in memory: ' + str(report['memory_changes'])
+          + '   on disk: ' + str(report['disk_changes']) + '   memory bytes: ' + str(report['memory_bytes'])
+          + '   disk bytes: ' + str(report['disk_bytes']))
+    print('budget: ' + ('none' if report['budget'] is None else str(report['budget']) + ' bytes') + '   max depth: '
+          + ('none' if report['max_depth'] is None else str(report['max_depth'])))
+
+
+def update_history(transactions, history, index, journal, storage):
+    if update_journal(journal, history):
+        if storage is not None:
+            write_snapshot(storage, transactions, history, index)
+        release_spill_files(journal)
+
+
+def run_command(transactions, command, parameters, history, index, journal, storage, stats):
+    if command == 'history':
+        if parameters != '':
+            raise ValueError('Invalid number of parameters for history command!')
+        print_history(journal, history)
+        return
+    if command == 'stats':
+        if stats is None:
+            raise ValueError('Statistics are not measured, start the program with --stats!')
+        if parameters != '':
+            raise ValueError('Invalid number of parameters for stats command!')
+        print_stats(stats, transactions, history)
+        return
+    if command not in COMMANDS:
+        raise ValueError('Invalid command!')
+    try:
+        if stats is None:
+            COMMANDS[command](transactions, parameters, history, index)
+        else:
+            measure_command(stats, command, lambda: COMMANDS[command](transactions, parameters, history, index),
+                            transactions, history, index)
+    except ValueError as ve:
+        if command not in MUTATING_COMMANDS or index['batch'] is None:
+            raise
+        error = rollback_failed_batch(transactions, history, index, ve)
+        if storage is not None:
+            log_command(storage, transactions, history, 'rollback', '', index)
+        raise error
+    if storage is not None and command in MUTATING_COMMANDS:
+        log_command(storage, transactions, history, command, parameters, index)
+    if index['batch'] is None:
+        update_history(transactions, history, index, journal, storage)
 
 
-def start_program():
-    transactions = startup_transactions()
-    commands = {'add': handle_add, 'insert': handle_insert, 'remove': handle_remove, 'replace': handle_replace,
-                'list': handle_list, 'filter': handle_filter, 'undo': handle_undo}
-    history = []
+def handle_accounts(accounts, parameters):
+    parameters = parameters.split()
+    if len(parameters) == 0:
+        for name, count in list_accounts(accounts):
+            print('account: ' + name + '   transactions: ' + str(count))
+    elif len(parameters) == 1 and parameters[0] == 'balances':
+        for day, balance in get_total_balances(accounts):
+            print('day: ' + str(day) + '   balance: ' + str(balance))
+    elif len(parameters) == 2 and parameters[0] == 'below':
+        if not parameters[1].lstrip('-').isnumeric():
+            raise ValueError('Amount should be of type integer!')
+        for name, balance in get_accounts_below(accounts, parameters[1]):
+            print('account: ' + name + '   balance: ' + str(balance))
+    elif len(parameters) == 2 and parameters[0] == 'largest':
+        if not parameters[1].isnumeric():
+            raise ValueError('Count should be a positive integer!')
+        for name, transaction in get_largest_out(accounts, parameters[1]):
+            print('account: ' + name + '   ' + to_string(transaction))
+    else:
+        raise ValueError('Invalid parameters for accounts command!')
+
+
+def run_account_command(accounts, command, parameters):
+    if command == 'use':
+        use_account(accounts, parameters.strip())
+    elif command == 'accounts':
+        handle_accounts(accounts, parameters)
+    else:
+        sys.stdout.write(run_in_account(accounts, command, parameters))
+
+
+def run_batch(file, execute, stop_on_error):
+    errors = 0
+    for number, text in enumerate(file, 1):
+        command, parameters = split_text(text)
+        if command == '' or command.startswith('#'):
+            continue
+        if command == 'exit':
+            break
+        try:
+            execute(command, parameters)
+        except ValueError as ve:
+            errors += 1
+            print('line ' + str(number) + ': ' + str(ve), file=sys.stderr)
+            if stop_on_error:
+                break
+    return errors
+
+
+def run_interactive(execute):
     while True:
         print_menu()
         text = input("input: ")
         command, parameters = split_text(text)
-        if command in commands:
-            try:
-                commands[command](transactions, parameters, history)
-            except ValueError as ve:
-                print(str(ve))
-        elif command == 'exit':
+        if command == 'exit':
             break
-        else:
-            print("Invalid command!")
+        try:
+            execute(command, parameters)
+        except ValueError as ve:
+            print(str(ve))
+
+
+def run_session(arguments, execute):
+    if arguments.serve is not None:
+        print('serving on ' + arguments.host + ':' + str(arguments.serve))
+        try:
+            asyncio.run(serve(arguments.host, arguments.serve, execute))
+        except KeyboardInterrupt:
+            pass
+        except OSError as error:
+            print(str(error))
+    elif arguments.batch is None:
+        run_interactive(execute)
+    else:
+        sys.stdout.reconfigure(line_buffering=False)
+        try:
+            if arguments.batch == '-':
+                run_batch(sys.stdin, execute, arguments.stop_on_error)
+            else:
+                with open(arguments.batch, 'r') as file:
+                    run_batch(file, execute, arguments.stop_on_error)
+        except OSError as error:
+            print(str(error), file=sys.stderr)
+        sys.stdout.flush()
+
+
+def start_accounts(arguments):
+    if arguments.ledger is not None or arguments.serve is not None:
+        print('Accounts are kept in memory only, they cannot be used with --ledger or --serve!')
+        return
+    try:
+        accounts = start_shards(arguments.accounts, COMMANDS)
+    except ValueError as ve:
+        print(str(ve))
+        return
+    try:
+        run_session(arguments, lambda command, parameters: run_account_command(accounts, command, parameters))
+    finally:
+        stop_shards(accounts)
+
+
+def start_program(arguments=()):
+    arguments = parse_arguments(arguments)
+    if arguments.analytics:
+        try:
+            check_analytics()
+        except ValueError as ve:
+            print(str(ve))
+            return
+        COMMANDS.update(ANALYTICS_COMMANDS)
+    if arguments.drop_archived and arguments.archive is None:
+        print('Only the months of an archive can be dropped, --drop-archived needs --archive!')
+        return
+    if arguments.accounts is not None:
+        if arguments.archive is not None:
+            print('Accounts have no closed months, they cannot be used with --archive!')
+            return
+        if arguments.stats or arguments.stats_memory or arguments.stats_file is not None:
+            print('The commands of accounts run in worker processes, they cannot be measured with --stats!')
+            return
+        start_accounts(arguments)
+        return
+    storage = None
+    if arguments.ledger is None:
+        transactions = startup_transactions()
+        history = []
+        index = create_index(transactions)
+    else:
+        try:
+            storage, transactions, history, index = open_storage(arguments.ledger, arguments.sync,
+                                                                 arguments.sync_every, arguments.snapshot_every)
+        except (ValueError, OSError) as error:
+            print(str(error))
+            return
+    archive = None
+    if arguments.archive is not None:
+        try:
+            archive = open_archive(arguments.archive)
+            shared = attach_archive(index, archive, arguments.drop_archived)
+            if shared > 0 and arguments.drop_archived:
+                if storage is not None:
+                    write_snapshot(storage, transactions, history, index)
+            elif shared > 0:
+                print(str(shared) + ' closed months are kept by the ledger as well as by the archive, start with '
+                      '--drop-archived to keep them in the archive only')
+        except (ValueError, OSError) as error:
+            print(str(error))
+            if archive is not None:
+                close_archive(index, archive)
+            if storage is not None:
+                close_storage(storage, transactions, history, index)
+            return
+    history_file = arguments.history_file
+    if history_file is None and arguments.ledger is not None:
+        history_file = arguments.ledger + '.history'
+    journal = None
+    try:
+        journal = create_journal(arguments.history_budget, arguments.history_depth, history_file)
+        update_history(transactions, history, index, journal, storage)
+    except (ValueError, OSError) as error:
+        print(str(error))
+        if archive is not None:
+            close_archive(index, archive)
+        if storage is not None:
+            close_storage(storage, transactions, history, index)
+        if journal is not None:
+            close_journal(journal, history)
+        return
+    stats = None
+    if arguments.stats or arguments.stats_memory or arguments.stats_file is not None:
+        stats = create_stats(arguments.stats_memory)
+    run_session(arguments, lambda command, parameters: run_command(transactions, command, parameters, history, index,
+                                                                   journal, storage, stats))
+    if storage is not None:
+        close_storage(storage, transactions, history, index)
+    if archive is not None:
+        close_archive(index, archive)
+    close_journal(journal, history)
+    if stats is not None and arguments.stats_file is not None:
+        try:
+            write_report(stats, transactions, history, arguments.stats_file)
+        except OSError as error:
+            print(str(error))